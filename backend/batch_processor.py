@@ -1,20 +1,23 @@
 import logging
 import sys
 import os
+import time
 from datetime import datetime
-from fetch_stock_data import fetch_stock_data
-from firebase_utils import initialize_firebase, batch_update_stocks
-
-# Import stock lists from existing file
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from js.dti_stock_lists import (
-    nifty50Stocks, 
-    niftyNext50Stocks, 
-    ftse100Stocks, 
-    usStocks
+import requests
+from fetch_stock_data import stream_history_bulk, BULK_CHUNK_SIZE
+from firebase_utils import (
+    initialize_firebase, batch_update_stocks, get_stock_ref,
+    get_update_metadata, is_update_needed
 )
+from price_chunks import CHUNK_COLLECTION, read_heads, chunks_to_merge, plan_writes
+import shared  # noqa: F401  (adds python/ to sys.path)
+from pipeline import buffered, batched
+import metrics
+import symbol_registry
+
 
-# Configure logging
+# Configure logging (the FileHandler needs the logs directory)
+os.makedirs(os.path.join(os.path.dirname(__file__), 'logs'), exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -24,22 +27,41 @@ logging.basicConfig(
     ]
 )
 
-# Ensure logs directory exists
-os.makedirs(os.path.join(os.path.dirname(__file__), 'logs'), exist_ok=True)
+# Symbols whose writes are planned and committed together; for an
+# incremental refresh 249 x (chunk + head) + one metadata write fills one
+# 500-write commit
+WRITE_BATCH_SYMBOLS = 249
+
+# Bars held for one write group: full-history rewrites are committed in
+# groups of a few dozen symbols instead of 249
+WRITE_BATCH_ROWS = 50000
+
+# Converted symbols queued between the download and write stages; downloads
+# pause while the queue is full, so memory does not grow with the universe
+IN_FLIGHT_SYMBOLS = BULK_CHUNK_SIZE
+
+# Run reports (JSON + Prometheus text)
+METRICS_DIR = os.path.join(os.path.dirname(__file__), 'logs', 'metrics')
+
+# Prometheus prefix of the backend's run reports (python/ runs report as bt88_ingest)
+BACKEND_METRICS_PREFIX = "bt88_backend"
 
 def get_stock_list(index_name):
-    """Get the list of stocks for a given index"""
-    stock_lists = {
-        'nifty50': nifty50Stocks,
-        'niftyNext50': niftyNext50Stocks,
-        'ftse100': ftse100Stocks,
-        'us_stocks': usStocks
-    }
-    
-    return stock_lists.get(index_name, [])
+    """Get the list of stocks for a stock list id or a collection name"""
+    return symbol_registry.index_symbols(index_name)
 
 def process_batch(index_name, force_update=False, period="5y", interval="1d"):
-    """Process all stocks in an index and store in Firestore"""
+    """Process all stocks in an index and store in Firestore.
+
+    Symbols are downloaded with multi-ticker requests and Firestore traffic
+    is batched: all head documents and the update metadata are read once up
+    front. Downloading runs on a background thread and streams converted
+    symbols through a queue of IN_FLIGHT_SYMBOLS to the writer, which reads
+    the chunks a group of symbols needs in one call and commits their
+    writes through batch_update_stocks. A group is at most
+    WRITE_BATCH_SYMBOLS symbols and WRITE_BATCH_ROWS bars, and is released
+    once committed, so memory stays flat however many symbols are loaded.
+    """
     logging.info(f"Starting batch process for {index_name}")
     print(f"Starting batch process for {index_name}")
     
@@ -54,26 +76,57 @@ def process_batch(index_name, force_update=False, period="5y", interval="1d"):
     
     results = {
         'success': [],
-        'failed': []
+        'failed': [],
+        'commits': 0,
+        'requests': 0
     }
     
     total = len(stocks)
     logging.info(f"Processing {total} stocks from {index_name}")
     print(f"Processing {total} stocks from {index_name}")
     
-    for i, symbol in enumerate(stocks):
-        print(f"Processing [{i+1}/{total}]: {symbol}")
-        success = fetch_stock_data(
-            symbol=symbol, 
-            period=period, 
-            interval=interval, 
-            force_update=force_update
-        )
-        
-        if success:
+    refs = {symbol: get_stock_ref(db, symbol) for symbol in stocks}
+    with metrics.stage('firestore_read'):
+        heads = read_heads(db, refs.values())
+        metadata = get_update_metadata(db)
+    session = requests.Session()
+    
+    to_update = []
+    for symbol in stocks:
+        if not force_update and not is_update_needed(db, symbol, metadata):
+            print(f"Skipping {symbol}: Data is up-to-date")
             results['success'].append(symbol)
+            metrics.count('symbols_skipped')
         else:
-            results['failed'].append(symbol)
+            to_update.append(symbol)
+    
+    last_dates = {symbol: (heads.get(symbol) or {}).get('last_date') for symbol in to_update}
+    stats = {'requests': 0}
+    downloads = buffered(stream_history_bulk(last_dates, period, interval, session, stats=stats),
+                         IN_FLIGHT_SYMBOLS, 'download')
+    done = 0
+    started = time.perf_counter()
+    for group in batched(downloads, WRITE_BATCH_SYMBOLS, WRITE_BATCH_ROWS, weight=_bars):
+        pending = []
+        for symbol, columns, replace, error in group:
+            if error:
+                print(f"Error fetching {symbol}: {error}")
+                logging.error(f"Error fetching {symbol}: {error}")
+                results['failed'].append(symbol)
+            else:
+                pending.append((symbol, columns, replace, heads.pop(symbol, None)))
+        flush_writes(db, refs, pending, interval, results)
+        
+        done += len(group)
+        print(f"Processed [{done}/{len(to_update)}]")
+        # Per-symbol latency: an equal share of the group's download and write time
+        share = (time.perf_counter() - started) / len(group)
+        for symbol in group:
+            metrics.observe('symbol_seconds', share)
+        # Release the committed group before the next one is collected
+        group = pending = None
+        started = time.perf_counter()
+    results['requests'] = stats['requests']
     
     # Store batch results in Firestore
     batch_ref = db.collection('batch_results').document()
@@ -83,33 +136,96 @@ def process_batch(index_name, force_update=False, period="5y", interval="1d"):
         'total': total,
         'success_count': len(results['success']),
         'failed_count': len(results['failed']),
-        'failed_symbols': results['failed']
+        'failed_symbols': results['failed'],
+        'commits': results['commits'],
+        'requests': results['requests']
     })
     
-    logging.info(f"Batch process completed. Success: {len(results['success'])}, Failed: {len(results['failed'])}")
-    print(f"Batch process completed. Success: {len(results['success'])}, Failed: {len(results['failed'])}")
+    summary = (f"Batch process completed. Success: {len(results['success'])}, Failed: {len(results['failed'])}, "
+               f"Downloads: {results['requests']}, Commits: {results['commits']}")
+    logging.info(summary)
+    print(summary)
     
     return results
 
+def _bars(download):
+    """Write-group weight of a streamed download: its number of bars"""
+    columns = download[1]
+    return len(columns['date']) if columns else 0
+
+def flush_writes(db, refs, pending, interval, results):
+    """Plan and commit the writes of downloaded symbols, recording outcomes in `results`.
+
+    `pending` holds (symbol, columns, replace, head); columns None means no
+    new bars, so only the metadata timestamp is written.
+    """
+    if not pending:
+        return
+    
+    # One read for every existing chunk that new bars must be merged into
+    merge_refs = []
+    for symbol, columns, replace, head in pending:
+        if columns:
+            merge_refs.extend(chunks_to_merge(refs[symbol], head, columns, interval, replace))
+    existing = {}
+    if merge_refs:
+        with metrics.stage('firestore_read'):
+            for snapshot in db.get_all(merge_refs):
+                if snapshot.exists:
+                    existing[snapshot.reference.path] = (snapshot.to_dict() or {}).get('rows', [])
+    
+    symbols_data = {}
+    for symbol, columns, replace, head in pending:
+        try:
+            chunks_path = f"{refs[symbol].path}/{CHUNK_COLLECTION}/"
+            symbol_existing = {path[len(chunks_path):]: chunk_rows for path, chunk_rows in existing.items()
+                               if path.startswith(chunks_path)}
+            # No new bars: only the metadata timestamp is written
+            with metrics.stage('plan_writes'):
+                symbols_data[symbol] = plan_writes(refs[symbol], symbol, columns, interval, replace,
+                                                   head, symbol_existing) if columns else []
+        except Exception as e:
+            logging.error(f"Error preparing writes for {symbol}: {e}")
+            results['failed'].append(symbol)
+    
+    committed = batch_update_stocks(db, symbols_data)
+    results['success'].extend(committed['success'])
+    results['failed'].extend(committed['failed'])
+    results['commits'] += committed['commits']
+    print(f"Committed {len(committed['success'])} symbols in {committed['commits']} batched writes")
+
 # Command line interface
 if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description='Process stocks in batch and store in Firestore')
-    parser.add_argument('index', choices=['nifty50', 'niftyNext50', 'ftse100', 'us_stocks'],
-                        help='Index to process')
+    registry = symbol_registry.load_registry()
+    parser.add_argument('index', choices=sorted(set(registry['indices']) | set(registry['folders'])),
+                        help='Stock list id or collection to process')
     parser.add_argument('--period', default='5y', help='Data period (default: 5y)')
     parser.add_argument('--interval', default='1d', help='Data interval (default: 1d)')
     parser.add_argument('--force', action='store_true', help='Force update regardless of last update time')
+    parser.add_argument('--metrics-dir', default=METRICS_DIR, help='Directory for the run report')
+    parser.add_argument('--profile', metavar='FILE', help='Write a cProfile capture of the run to FILE')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the peak memory of every stage (tracemalloc; slows the run down)')
     
     args = parser.parse_args()
     
-    results = process_batch(
-        index_name=args.index,
-        period=args.period,
-        interval=args.interval,
-        force_update=args.force
-    )
+    with metrics.profile(args.profile), metrics.trace_memory(args.trace_memory):
+        results = process_batch(
+            index_name=args.index,
+            period=args.period,
+            interval=args.interval,
+            force_update=args.force
+        )
+    
+    summary = {key: len(value) if isinstance(value, list) else value for key, value in results.items()}
+    json_path, prom_path = metrics.write_report(args.metrics_dir, name=f"batch-{args.index}",
+                                                extra={'command': sys.argv, 'results': summary},
+                                                prefix=BACKEND_METRICS_PREFIX)
+    print(metrics.summary(metrics.METRICS.report()))
+    print(f"Run report: {json_path} (Prometheus: {prom_path})")
     
     # Exit with error code if any failures
     sys.exit(0 if not results['failed'] else 1)
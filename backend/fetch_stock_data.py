@@ -1,7 +1,8 @@
 import os
 import yfinance as yf
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
 import time
 import logging
 import sys
@@ -9,8 +10,13 @@ from firebase_utils import (
     initialize_firebase, get_stock_ref, 
     update_metadata, is_update_needed, get_index_collection
 )
+from price_chunks import write_columns
+import shared  # noqa: F401  (adds python/ to sys.path)
+import metrics
+from bulk_frames import iter_bulk_frames
 
-# Configure logging
+# Configure logging (the FileHandler needs the logs directory)
+os.makedirs(os.path.join(os.path.dirname(__file__), 'logs'), exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -20,11 +26,27 @@ logging.basicConfig(
     ]
 )
 
-# Ensure logs directory exists
-os.makedirs(os.path.join(os.path.dirname(__file__), 'logs'), exist_ok=True)
+# Columns whose non-zero values mean yfinance has re-adjusted the whole history
+CORPORATE_ACTION_COLUMNS = ['Dividends', 'Stock Splits']
+
+# Symbols per multi-ticker yf.download request
+BULK_CHUNK_SIZE = 100
+
+# yfinance column -> stored field
+COLUMN_NAMES = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
 
-def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False):
-    """Fetch stock data and save to Firestore"""
+def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False, incremental=True,
+                     session=None):
+    """Fetch stock data and save to Firestore.
+
+    History is stored in chunk documents (see price_chunks). With
+    incremental=True only bars after the head's `last_date` are fetched and
+    merged into their chunks; a split or dividend in those bars (or a
+    document without `last_date`) falls back to a full `period` rewrite.
+
+    `session` is an optional requests.Session reused across calls to keep
+    HTTP connections to Yahoo open.
+    """
     logging.info(f"Processing symbol: {symbol}")
     
     # Initialize Firestore
@@ -37,50 +59,29 @@ def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False):
         return True
             
     # Fetch data
+    started = time.perf_counter()
     try:
         logging.info(f"Fetching data for {symbol}...")
         print(f"Fetching data for {symbol}...")
         
-        try:
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period, interval=interval)
-        except Exception as ticker_error:
-            logging.error(f"Error in yfinance API for {symbol}: {str(ticker_error)}")
-            raise
-        
-        if data.empty:
-            logging.error(f"No data received for {symbol}")
-            raise Exception(f"No data received for {symbol}")
-            
-        # Format data for Firestore
-        data = data.reset_index()
+        stock_ref = get_stock_ref(db, symbol)
+        last_date = get_last_stored_date(stock_ref) if incremental else None
         
-        # Convert DataFrame to a list of dictionaries for Firestore
-        # Format dates to strings to ensure serialization
-        data_dict = data.rename(columns={
-            'Date': 'date',
-            'Open': 'open', 
-            'High': 'high',
-            'Low': 'low',
-            'Close': 'close',
-            'Volume': 'volume'
-        }).to_dict('records')
+        columns, replace = download_history(symbol, last_date, period, interval, session)
         
-        # Process dates for JSON serialization
-        for record in data_dict:
-            if isinstance(record['date'], pd.Timestamp):
-                record['date'] = record['date'].isoformat()
+        if not columns:
+            logging.info(f"No new bars for {symbol} since {last_date}")
+            update_metadata(db, symbol)
+            print(f"✓ {symbol} already has the latest bar")
+            return True
         
-        # Write to Firestore
-        stock_ref = get_stock_ref(db, symbol)
-        stock_ref.set({
-            'symbol': symbol,
-            'data': data_dict,
-            'updated_at': datetime.now().isoformat()
-        })
+        # Write to Firestore; new bars only rewrite the chunks they fall in
+        with metrics.stage('firestore_write'):
+            write_columns(db, stock_ref, symbol, columns, interval=interval, replace=replace)
         
         # Update metadata
-        update_metadata(db, symbol)
+        with metrics.stage('metadata'):
+            update_metadata(db, symbol)
         
         print(f"✓ Successfully saved data for {symbol} to Firestore")
         return True
@@ -89,6 +90,159 @@ def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False):
         print(f"Error fetching {symbol}: {str(e)}")
         logging.error(f"Error fetching {symbol}: {str(e)}")
         return False
+    finally:
+        metrics.observe('symbol_seconds', time.perf_counter() - started)
+
+def download_history(symbol, last_date=None, period="5y", interval="1d", session=None):
+    """Download bars for a symbol, only those after `last_date` when given.
+
+    Returns (columns, replace), columns as built by to_columns: replace is
+    True when they hold the full `period` history, i.e. without last_date or
+    when a split or dividend in the new bars forced a full re-pull. columns
+    is None if nothing is new.
+    """
+    try:
+        ticker = yf.Ticker(symbol, session=session)
+        with metrics.stage('download'):
+            if last_date:
+                start = (pd.Timestamp(last_date) + timedelta(days=1)).strftime('%Y-%m-%d')
+                data = ticker.history(start=start, interval=interval)
+            else:
+                data = ticker.history(period=period, interval=interval)
+        record_fetch(data)
+        if last_date and not data.empty:
+            data = data[data.index > pd.Timestamp(last_date)]
+    except Exception as ticker_error:
+        logging.error(f"Error in yfinance API for {symbol}: {str(ticker_error)}")
+        raise
+    
+    if last_date and has_corporate_action(data):
+        logging.info(f"Split/dividend in new bars for {symbol}, re-pulling full history")
+        with metrics.stage('download'):
+            data = ticker.history(period=period, interval=interval)
+        record_fetch(data)
+        last_date = None
+    
+    if data.empty:
+        if last_date:
+            return None, False
+        logging.error(f"No data received for {symbol}")
+        raise Exception(f"No data received for {symbol}")
+    
+    with metrics.stage('reshape'):
+        return to_columns(data), not last_date
+
+def stream_history_bulk(last_dates, period="5y", interval="1d", session=None,
+                        chunk_size=BULK_CHUNK_SIZE, stats=None):
+    """Download many symbols with multi-ticker yf.download requests, one symbol at a time.
+
+    `last_dates` maps symbol -> stored last_date (None for full history).
+    Symbols are grouped by collection and download start, one request per
+    `chunk_size` symbols; symbols missing from a bulk response fall back to
+    download_history. Yields (symbol, columns, replace, error) as each
+    symbol is converted, so only one request's frame is held at a time;
+    columns is None (without error) when there are no new bars.
+    `stats['requests']` counts the download requests made.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('requests', 0)
+    groups = {}
+    for symbol, last_date in last_dates.items():
+        start = (pd.Timestamp(last_date) + timedelta(days=1)).strftime('%Y-%m-%d') if last_date else None
+        groups.setdefault((get_index_collection(symbol), start), []).append(symbol)
+    
+    for (collection, start), group in groups.items():
+        for i in range(0, len(group), chunk_size):
+            chunk = group[i:i + chunk_size]
+            stats['requests'] += 1
+            range_args = {'start': start} if start else {'period': period}
+            try:
+                with metrics.stage('download'):
+                    wide = yf.download(chunk, interval=interval, group_by='ticker', auto_adjust=True,
+                                       actions=True, ignore_tz=False, threads=False, progress=False,
+                                       session=session, **range_args)
+                record_fetch(wide)
+            except Exception as e:
+                logging.error(f"Bulk download failed for {len(chunk)} symbols: {e}")
+                wide = None
+            # Nobody in an incremental group has a bar since `start`
+            empty = wide is not None and wide.empty
+            
+            for symbol, data in iter_bulk_frames(wide, chunk):
+                last_date = last_dates[symbol]
+                columns, replace, error = None, False, None
+                try:
+                    if data is not None and last_date:
+                        data = data[data.index > pd.Timestamp(last_date)]
+                    if data is not None and not data.empty:
+                        if last_date and has_corporate_action(data):
+                            logging.info(f"Split/dividend in new bars for {symbol}, re-pulling full history")
+                            stats['requests'] += 1
+                            columns, replace = download_history(symbol, None, period, interval, session)
+                        else:
+                            with metrics.stage('reshape'):
+                                columns, replace = to_columns(data), not last_date
+                    elif not (empty and last_date):
+                        logging.info(f"{symbol} missing from bulk response, fetching it alone")
+                        stats['requests'] += 1
+                        columns, replace = download_history(symbol, last_date, period, interval, session)
+                except Exception as e:
+                    error = str(e)
+                data = None
+                yield symbol, columns, replace, error
+            wide = None
+
+def record_fetch(data):
+    """Count one download request and the rows and bytes it returned.
+
+    yfinance does not expose the HTTP payload, so bytes are the in-memory
+    size of the returned frame.
+    """
+    metrics.count('requests')
+    if data is not None and not data.empty:
+        metrics.count('rows_fetched', len(data))
+        metrics.count('bytes_fetched', int(data.memory_usage(index=True).sum()))
+
+def to_columns(data):
+    """Convert a yfinance history frame to Firestore-serializable column lists.
+
+    Returns {'date': [ISO strings], 'open': [...], ...} in date order; rows
+    are only assembled per chunk document when they are written (see
+    price_chunks.plan_writes).
+    """
+    columns = {'date': iso_dates(data.index)}
+    for name in data.columns:
+        columns[COLUMN_NAMES.get(name, name)] = data[name].tolist()
+    return columns
+
+def iso_dates(index):
+    """Timestamp.isoformat() of every entry of a DatetimeIndex, without a per-row Timestamp"""
+    if not isinstance(index, pd.DatetimeIndex):
+        # Mixed-offset or padded indexes come back as object dtype
+        return [value.isoformat() if isinstance(value, pd.Timestamp) else value for value in index]
+    wall = index.tz_localize(None) if index.tz is not None else index
+    local = np.datetime_as_string(wall.to_numpy(dtype='datetime64[s]'), unit='s').tolist()
+    if index.tz is None:
+        return local
+    # UTC offset in minutes; only a handful of distinct values (DST) per series
+    offsets = ((wall - index.tz_convert('UTC').tz_localize(None)) // pd.Timedelta(minutes=1)).tolist()
+    suffixes = {offset: f"{'+' if offset >= 0 else '-'}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+                for offset in set(offsets)}
+    return [day + suffixes[offset] for day, offset in zip(local, offsets)]
+
+def get_last_stored_date(stock_ref):
+    """Read only the `last_date` field of a stock head document (None if absent)"""
+    snapshot = stock_ref.get(field_paths=['last_date'])
+    if not snapshot.exists:
+        return None
+    return (snapshot.to_dict() or {}).get('last_date')
+
+def has_corporate_action(data):
+    """Check whether any fetched bar carries a split or dividend"""
+    for column in CORPORATE_ACTION_COLUMNS:
+        if column in data.columns and (data[column].fillna(0) != 0).any():
+            return True
+    return False
 
 # Command line interface
 if __name__ == "__main__":
@@ -99,6 +253,7 @@ if __name__ == "__main__":
     parser.add_argument('--period', default='5y', help='Data period (default: 5y)')
     parser.add_argument('--interval', default='1d', help='Data interval (default: 1d)')
     parser.add_argument('--force', action='store_true', help='Force update regardless of last update time')
+    parser.add_argument('--full', action='store_true', help='Re-download the full period instead of only new bars')
     
     args = parser.parse_args()
     
@@ -106,7 +261,8 @@ if __name__ == "__main__":
         symbol=args.symbol,
         period=args.period,
         interval=args.interval,
-        force_update=args.force
+        force_update=args.force,
+        incremental=not args.full
     )
     
     sys.exit(0 if success else 1)
@@ -2,16 +2,28 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 import json
+import logging
+import time
 from datetime import datetime, timedelta
+import shared  # noqa: F401  (adds python/ to sys.path)
+import market_calendar
+import metrics
+import symbol_registry
+
+# Firestore client shared by every caller in this process
+_db = None
 
 # Initialize Firebase
 def initialize_firebase():
-    """Initialize Firebase Admin SDK with service account credentials"""
-    cred_path = os.path.join(os.path.dirname(__file__), "serviceAccountKey.json")
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-    return firestore.client()
+    """Initialize Firebase Admin SDK and return the process-wide Firestore client"""
+    global _db
+    if _db is None:
+        cred_path = os.path.join(os.path.dirname(__file__), "serviceAccountKey.json")
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+        _db = firestore.client()
+    return _db
 
 # Get Firestore document reference for a stock
 def get_stock_ref(db, symbol):
@@ -22,43 +34,53 @@ def get_stock_ref(db, symbol):
 # Determine which collection a symbol belongs to
 def get_index_collection(symbol):
     """Determine which collection the symbol belongs to (equivalent to get_index_folder)"""
-    if symbol.endswith('.NS'):
-        collection = "nifty50"  # Or other Indian indices
-    elif symbol.endswith('.L'):
-        collection = "ftse100"  # Or ftse250
-    else:
-        collection = "us_stocks"  # Default for US stocks
-    return collection
+    return symbol_registry.index_folder(symbol)
+
+# Firestore limits per commit: 500 writes and a 10 MiB request
+MAX_BATCH_OPS = 500
+MAX_BATCH_BYTES = 9 * 1024 * 1024
+MAX_RETRIES = 3
+RETRY_BACKOFF = 2  # seconds, doubled per attempt
+
+def metadata_entry():
+    """Metadata value recorded for a successfully updated symbol"""
+    return {
+        'last_updated': datetime.now().isoformat(),
+        'status': 'success'
+    }
 
 # Update metadata
 def update_metadata(db, symbol):
     """Update the last update time in metadata collection"""
     try:
         metadata_ref = db.collection('metadata').document('symbols')
-        metadata_ref.set({
-            symbol: {
-                'last_updated': datetime.now().isoformat(),
-                'status': 'success'
-            }
-        }, merge=True)
+        metadata_ref.set({symbol: metadata_entry()}, merge=True)
     except Exception as e:
         print(f"Error updating metadata: {e}")
 
+def get_update_metadata(db):
+    """Read the whole symbols metadata document once: {symbol: {'last_updated', 'status'}}"""
+    metadata_doc = db.collection('metadata').document('symbols').get()
+    if not metadata_doc.exists:
+        return {}
+    metadata_dict = metadata_doc.to_dict() or {}
+    # Entries are written at the top level; older documents nest them under 'symbols'
+    symbols = dict(metadata_dict.get('symbols', {}))
+    symbols.update((key, value) for key, value in metadata_dict.items()
+                   if key != 'symbols' and isinstance(value, dict))
+    return symbols
+
 # Check if update is needed
-def is_update_needed(db, symbol):
-    """Check if symbol needs updating based on metadata and market hours"""
+def is_update_needed(db, symbol, metadata=None):
+    """Check if symbol needs updating based on metadata and market hours.
+
+    Pass `metadata` from get_update_metadata to avoid a read per symbol.
+    """
     try:
-        metadata_ref = db.collection('metadata').document('symbols')
-        metadata_doc = metadata_ref.get()
-        
-        if not metadata_doc.exists:
-            return True
+        if metadata is None:
+            metadata = get_update_metadata(db)
             
-        metadata_dict = metadata_doc.to_dict() or {}
-        if 'symbols' not in metadata_dict or symbol not in metadata_dict.get('symbols', {}):
-            return True
-            
-        symbol_data = metadata_dict.get('symbols', {}).get(symbol, {})
+        symbol_data = metadata.get(symbol, {})
         if 'last_updated' not in symbol_data:
             return True
             
@@ -69,33 +91,100 @@ def is_update_needed(db, symbol):
         if now - last_updated < timedelta(minutes=30):
             return False
         
-        # Check market hours for US stocks
-        if not symbol.endswith('.L') and not symbol.endswith('.NS'):  # US stock
-            # Convert to Eastern Time
-            # This is a simplified check. For more accurate results, 
-            # you might want to use pytz or dateutil libraries.
-            et_hour = (now.hour - 5) % 24  # Approximate ET conversion
-            
-            # If it's a US stock and it's before 5 PM ET, don't update
-            # unless the data is from yesterday or earlier
-            if et_hour < 17 and last_updated.date() == now.date():
-                return False
-        
-        # Data needs updating
-        return True
+        # Stale once the symbol's exchange has finished a session since the last update
+        exchange = market_calendar.exchange_for_symbol(symbol)
+        return market_calendar.to_aware(last_updated) < market_calendar.last_refresh_due(exchange, now)
         
     except Exception as e:
         print(f"Error checking if update needed: {e}")
         return True
-        
+
+def _write_size(data):
+    """Approximate encoded size of a document write"""
+    return len(json.dumps(data, default=str).encode('utf-8')) if data is not None else 0
+
+def _commit(db, groups, metadata):
+    """Commit the writes of some symbols plus one merged metadata write, with retries"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            batch = db.batch()
+            for symbol, writes in groups:
+                for reference, data in writes:
+                    if data is None:
+                        batch.delete(reference)
+                    else:
+                        batch.set(reference, data)
+            if metadata:
+                batch.set(db.collection('metadata').document('symbols'),
+                          {symbol: metadata_entry() for symbol, _ in groups}, merge=True)
+            with metrics.stage('firestore_commit'):
+                batch.commit()
+            metrics.count('commits')
+            metrics.count('documents_written', sum(len(writes) for _, writes in groups) + int(bool(metadata)))
+            metrics.count('bytes_written', sum(_write_size(data) for _, writes in groups for _, data in writes))
+            return
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            wait = RETRY_BACKOFF * (2 ** attempt)
+            logging.warning(f"Batch commit failed ({e}), retrying in {wait}s")
+            metrics.count('retries')
+            with metrics.stage('retry_backoff'):
+                time.sleep(wait)
+
 # Batch operations for efficient updates
-def batch_update_stocks(db, symbols_data):
-    """Update multiple stocks in a batch operation"""
-    batch = db.batch()
-    
-    for symbol, data in symbols_data.items():
-        stock_ref = get_stock_ref(db, symbol)
-        batch.set(stock_ref, data)
-    
-    # Commit the batch
-    batch.commit()
+def batch_update_stocks(db, symbols_data, metadata=True):
+    """Commit many symbols' document writes in as few batched commits as possible.
+
+    `symbols_data` maps symbol -> list of (reference, data) writes, data None
+    meaning delete (see price_chunks.plan_writes); an empty list only records
+    metadata. A symbol's writes stay in one commit so it is updated
+    atomically, commits respect the 500-write and request size limits, and
+    each commit carries a single merged metadata write for its symbols.
+
+    A commit that still fails after retries is split into per-symbol commits
+    so one bad symbol cannot fail the rest. Returns {'success', 'failed',
+    'commits'}.
+    """
+    reserved = 1 if metadata else 0
+    batches = []
+    current, ops, size = [], 0, 0
+    for symbol, writes in symbols_data.items():
+        writes = list(writes)
+        write_ops = len(writes)
+        write_size = sum(_write_size(data) for _, data in writes)
+        if current and (ops + write_ops + reserved > MAX_BATCH_OPS or size + write_size > MAX_BATCH_BYTES):
+            batches.append(current)
+            current, ops, size = [], 0, 0
+        # A symbol larger than one commit is written in pieces
+        while write_ops + reserved > MAX_BATCH_OPS:
+            batches.append([(symbol, writes[:MAX_BATCH_OPS - reserved])])
+            writes = writes[MAX_BATCH_OPS - reserved:]
+            write_ops = len(writes)
+        current.append((symbol, writes))
+        ops += write_ops
+        size += write_size
+    if current:
+        batches.append(current)
+
+    results = {'success': [], 'failed': [], 'commits': 0}
+    for groups in batches:
+        try:
+            _commit(db, groups, metadata)
+            results['commits'] += 1
+            results['success'].extend(symbol for symbol, _ in groups)
+        except Exception as e:
+            logging.error(f"Batch of {len(groups)} symbols failed ({e}), committing them one by one")
+            for group in groups:
+                try:
+                    _commit(db, [group], metadata)
+                    results['commits'] += 1
+                    results['success'].append(group[0])
+                except Exception as symbol_error:
+                    logging.error(f"Failed to write {group[0]}: {symbol_error}")
+                    results['failed'].append(group[0])
+
+    # A symbol split across commits is only successful if every piece was
+    results['success'] = [s for s in dict.fromkeys(results['success']) if s not in results['failed']]
+    results['failed'] = list(dict.fromkeys(results['failed']))
+    return results
@@ -0,0 +1,158 @@
+"""In-memory stand-in for the parts of the Firestore client the backend uses.
+
+Lets price_chunks and fetch_stock_data run without credentials or network.
+For end-to-end checks point the real client at the Firestore emulator
+instead (set FIRESTORE_EMULATOR_HOST=localhost:8080 before starting).
+
+    db = FakeFirestore()
+    ref = db.collection('us_stocks').document('AAPL')
+    ref.set({'symbol': 'AAPL'})
+    db.stats  # {'reads': 0, 'writes': 1, 'deletes': 0, 'bytes_written': ...}
+"""
+import copy
+import json
+import uuid
+
+# Firestore rejects documents larger than 1 MiB and batches over 500 writes
+MAX_DOCUMENT_BYTES = 1024 * 1024
+MAX_BATCH_WRITES = 500
+
+
+def _document_size(data):
+    return len(json.dumps(data, default=str).encode('utf-8'))
+
+
+def _deep_merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None):
+        self._db.stats['reads'] += 1
+        data = self._db._docs.get(self.path)
+        if data is not None and field_paths is not None:
+            data = {key: data[key] for key in field_paths if key in data}
+        return FakeSnapshot(self, data)
+
+    def set(self, data, merge=False):
+        if merge and self.path in self._db._docs:
+            merged = copy.deepcopy(self._db._docs[self.path])
+            _deep_merge(merged, data)
+            data = merged
+        self._db._write(self.path, copy.deepcopy(data))
+
+    def update(self, data):
+        if self.path not in self._db._docs:
+            raise KeyError(f"No document to update: {self.path}")
+        updated = copy.deepcopy(self._db._docs[self.path])
+        for key, value in data.items():
+            # Dotted keys address nested map fields, as in Firestore
+            target = updated
+            *parents, leaf = key.split('.')
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = copy.deepcopy(value)
+        self._db._write(self.path, updated)
+
+    def delete(self):
+        self._db.stats['deletes'] += 1
+        self._db._docs.pop(self.path, None)
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, doc_id=None):
+        # Firestore generates a 20-character id when none is given
+        doc_id = doc_id or uuid.uuid4().hex[:20]
+        return FakeDocument(self._db, f"{self.path}/{doc_id}")
+
+    def stream(self):
+        prefix = self.path + '/'
+        for path in sorted(self._db._docs):
+            if path.startswith(prefix) and '/' not in path[len(prefix):]:
+                yield self.document(path[len(prefix):]).get()
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def _add(self, op):
+        if len(self._ops) >= MAX_BATCH_WRITES:
+            raise ValueError(f"Batch exceeds {MAX_BATCH_WRITES} writes")
+        self._ops.append(op)
+
+    def set(self, reference, data, merge=False):
+        self._add(lambda: reference.set(data, merge=merge))
+
+    def update(self, reference, data):
+        self._add(lambda: reference.update(data))
+
+    def delete(self, reference):
+        self._add(reference.delete)
+
+    def commit(self):
+        self._db.stats['commits'] += 1
+        for op in self._ops:
+            op()
+        self._ops = []
+
+
+class FakeFirestore:
+    """Dict-backed Firestore client with read/write counters"""
+
+    def __init__(self):
+        self._docs = {}
+        self.stats = {'reads': 0, 'writes': 0, 'deletes': 0, 'commits': 0, 'bytes_written': 0}
+
+    def _write(self, path, data):
+        size = _document_size(data)
+        if size > MAX_DOCUMENT_BYTES:
+            raise ValueError(f"Document {path} is {size} bytes, over the 1 MiB limit")
+        self.stats['writes'] += 1
+        self.stats['bytes_written'] += size
+        self._docs[path] = data
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, references):
+        for reference in references:
+            yield reference.get()
@@ -0,0 +1,249 @@
+"""Chunked Firestore layout for price history.
+
+Instead of one document holding every bar in a `data` array, a symbol is
+stored as a small head document plus one chunk document per period:
+
+    <collection>/<symbol>                 head: symbol, layout, interval,
+                                          chunk_period, chunks {key: rows},
+                                          first_date, last_date, row_count
+    <collection>/<symbol>/chunks/<key>    rows of one year (daily bars),
+                                          month (hourly) or day (minute bars)
+
+Chunk keys are date prefixes ("2024", "2024-05", "2024-05-06"), so they sort
+chronologically and a "since" date maps directly to the first chunk to read.
+Appending new bars rewrites only the chunks they fall in plus the head.
+Heads without `layout` are the old single-document format and are read
+from their `data` array, then converted on the next write.
+
+Writes take bars as columns ({'date': [...], 'close': [...]}, in date
+order, see fetch_stock_data.to_columns); the row maps Firestore stores are
+only assembled for the chunk being planned.
+"""
+from datetime import datetime
+
+LAYOUT = 'chunked-v1'
+CHUNK_COLLECTION = 'chunks'
+
+# Chunk key = first N characters of the ISO date
+CHUNK_KEY_LENGTHS = {'year': 4, 'month': 7, 'day': 10}
+
+# Keep chunks well under Firestore's 1 MiB document limit
+HOURLY_INTERVALS = {'60m', '90m', '1h'}
+MINUTE_INTERVALS = {'1m', '2m', '5m', '15m', '30m'}
+
+
+def chunk_period(interval):
+    """Chunk size for a yfinance interval"""
+    if interval in MINUTE_INTERVALS:
+        return 'day'
+    if interval in HOURLY_INTERVALS:
+        return 'month'
+    return 'year'
+
+
+def chunk_key(date, period):
+    """Chunk a row with this ISO date string belongs to"""
+    return date[:CHUNK_KEY_LENGTHS[period]]
+
+
+def chunk_ranges(dates, period):
+    """[(chunk key, start, end)] of date-ordered ISO date strings"""
+    ranges = []
+    for i, date in enumerate(dates):
+        key = chunk_key(date, period)
+        if ranges and ranges[-1][0] == key:
+            ranges[-1][2] = i + 1
+        else:
+            ranges.append([key, i, i + 1])
+    return [tuple(entry) for entry in ranges]
+
+
+def rows_from_columns(columns, start=0, end=None):
+    """Row maps of columns[start:end]"""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name][start:end] for name in names))]
+
+
+def columns_from_rows(rows):
+    """Columns of a list of row maps (the union of their fields)"""
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def merge_rows(existing, new):
+    """Merge two row lists by date; new rows replace existing ones with the same date"""
+    by_date = {row['date']: row for row in existing}
+    by_date.update((row['date'], row) for row in new)
+    return [by_date[date] for date in sorted(by_date)]
+
+
+def read_heads(db, stock_refs):
+    """Head documents of many symbols in one round trip: {document id: head or None}"""
+    return {snapshot.id: (snapshot.to_dict() or {}) if snapshot.exists else None
+            for snapshot in db.get_all(list(stock_refs))}
+
+
+def chunks_to_merge(stock_ref, head, columns, interval='1d', replace=False):
+    """References of existing chunks the new bars must be merged into"""
+    if replace or not head or head.get('layout') != LAYOUT:
+        return []
+    existing = head.get('chunks', {})
+    keys = [key for key, _, _ in chunk_ranges(columns['date'], chunk_period(interval))]
+    return [stock_ref.collection(CHUNK_COLLECTION).document(key) for key in sorted(keys) if key in existing]
+
+
+def plan_writes(stock_ref, symbol, columns, interval='1d', replace=False, head=None, existing=None):
+    """Document writes that store the bars in `columns` for a symbol, without committing them.
+
+    `head` is the symbol's current head document (None if not stored) and
+    `existing` maps chunk keys to the stored rows of the chunks listed by
+    chunks_to_merge. Returns a list of (reference, data) pairs where data
+    None means delete; the head write comes last.
+    """
+    period = chunk_period(interval)
+    head = head or {}
+    existing = existing or {}
+    if head and head.get('layout') != LAYOUT:
+        # Convert an old single-document symbol on its first write
+        if not replace:
+            columns = columns_from_rows(merge_rows(head.get('data', []), rows_from_columns(columns)))
+        replace = True
+    elif not replace and head.get('chunk_period', period) != period:
+        raise ValueError(f"{symbol} is stored in {head['chunk_period']} chunks, not {period}")
+
+    old_chunks = dict(head.get('chunks', {})) if head.get('layout') == LAYOUT else {}
+    chunks_ref = stock_ref.collection(CHUNK_COLLECTION)
+    writes = []
+    counts = {}
+    for key, start, end in chunk_ranges(columns['date'], period):
+        chunk_rows = rows_from_columns(columns, start, end)
+        if not replace and key in existing:
+            chunk_rows = merge_rows(existing[key], chunk_rows)
+        writes.append((chunks_ref.document(key), {'key': key, 'rows': chunk_rows, 'count': len(chunk_rows)}))
+        counts[key] = len(chunk_rows)
+
+    if replace:
+        for key in sorted(set(old_chunks) - set(counts)):
+            writes.append((chunks_ref.document(key), None))
+        chunks = counts
+    else:
+        chunks = dict(old_chunks, **counts)
+
+    dates = columns['date']
+    first_date = min(dates) if dates else head.get('first_date')
+    if not replace and head.get('first_date'):
+        first_date = min(first_date, head['first_date'])
+    last_date = max(dates) if dates else head.get('last_date')
+    if not replace and head.get('last_date'):
+        last_date = max(last_date, head['last_date'])
+
+    writes.append((stock_ref, {
+        'symbol': symbol,
+        'layout': LAYOUT,
+        'interval': interval,
+        'chunk_period': period,
+        'chunks': chunks,
+        'first_date': first_date,
+        'last_date': last_date,
+        'row_count': sum(chunks.values()),
+        'updated_at': datetime.now().isoformat(),
+    }))
+    return writes
+
+
+def read_chunk_rows(db, chunk_refs):
+    """Rows of the given chunk documents in one round trip: {chunk key: rows}"""
+    return {snapshot.id: (snapshot.to_dict() or {}).get('rows', [])
+            for snapshot in db.get_all(list(chunk_refs)) if snapshot.exists}
+
+
+def write_columns(db, stock_ref, symbol, columns, interval='1d', replace=False):
+    """Store bars for a symbol, touching only the chunks they fall in.
+
+    With replace=True the bars are the symbol's whole history and chunks
+    outside it are deleted. Returns the chunk keys written.
+    """
+    snapshot = stock_ref.get()
+    head = (snapshot.to_dict() or {}) if snapshot.exists else None
+    merge_refs = chunks_to_merge(stock_ref, head, columns, interval, replace)
+    existing = read_chunk_rows(db, merge_refs) if merge_refs else {}
+    writes = plan_writes(stock_ref, symbol, columns, interval, replace, head, existing)
+
+    batch = db.batch()
+    for reference, data in writes:
+        if data is None:
+            batch.delete(reference)
+        else:
+            batch.set(reference, data)
+    batch.commit()
+    return sorted(reference.id for reference, data in writes[:-1] if data is not None)
+
+
+def select_chunks(chunks, last_n=None, since=None):
+    """Chunk keys needed to answer a "last N bars" and/or "since date" read"""
+    keys = sorted(chunks)
+    if since:
+        keys = [key for key in keys if key >= since[:len(key)]]
+    if last_n:
+        count = 0
+        start = len(keys)
+        while start > 0 and count < last_n:
+            start -= 1
+            count += chunks[keys[start]]
+        keys = keys[start:]
+    return keys
+
+
+def read_rows(db, stock_ref, last_n=None, since=None):
+    """Read a symbol's history, or only its last N bars / bars since a date.
+
+    Returns the head fields plus `data` (rows in date order), in the shape
+    of the old single document, or None if the symbol is not stored.
+    """
+    snapshot = stock_ref.get()
+    if not snapshot.exists:
+        return None
+    head = snapshot.to_dict() or {}
+
+    if head.get('layout') != LAYOUT:
+        rows = head.pop('data', [])
+    else:
+        keys = select_chunks(head.pop('chunks', {}), last_n, since)
+        chunks_ref = stock_ref.collection(CHUNK_COLLECTION)
+        rows = []
+        for chunk in db.get_all([chunks_ref.document(key) for key in keys]):
+            if chunk.exists:
+                rows.extend(chunk.to_dict().get('rows', []))
+        rows.sort(key=lambda row: row['date'])
+
+    if since:
+        rows = [row for row in rows if row['date'] >= since]
+    if last_n:
+        rows = rows[-last_n:]
+    head['data'] = rows
+    return head
+
+
+if __name__ == "__main__":
+    import random
+    from firestore_fake import FakeFirestore
+
+    # Round-trip five years of synthetic daily bars through the in-memory fake
+    db = FakeFirestore()
+    ref = db.collection('us_stocks').document('TEST')
+    days = [f"{year}-{month:02d}-{day:02d}T00:00:00-05:00"
+            for year in range(2020, 2025) for month in range(1, 13) for day in range(1, 22)]
+    rows = [{'date': d, 'close': random.uniform(90, 110)} for d in days]
+    columns = columns_from_rows(rows)
+
+    write_columns(db, ref, 'TEST', {name: values[:-5] for name, values in columns.items()}, replace=True)
+    full = dict(db.stats)
+    written = write_columns(db, ref, 'TEST', {name: values[-5:] for name, values in columns.items()})
+    print(f"Full write: {full['writes']} documents, {full['bytes_written'] / 1024:.0f} KiB")
+    print(f"Append of 5 bars: chunks {written}, "
+          f"{db.stats['bytes_written'] - full['bytes_written']} bytes written")
+
+    assert read_rows(db, ref)['data'] == rows
+    assert read_rows(db, ref, last_n=30)['data'] == rows[-30:]
+    assert read_rows(db, ref, since='2024-06-01')['data'] == [r for r in rows if r['date'] >= '2024-06-01']
+    print(f"✓ Round trip of {len(rows)} rows, last-N and since reads match")
@@ -0,0 +1,175 @@
+"""Latest-price quotes for open trades, shared by every client of the backend.
+
+One call answers a whole list of symbols:
+
+    cache = QuoteCache()
+    cache.get_quotes(['AAPL', 'BP.L', 'TCS.NS'])
+    # {'AAPL': {'symbol': 'AAPL', 'price': 189.3, 'time': '...', 'cached': False, 'ageMs': 0.0}, ...}
+
+Quotes stay in an in-process LRU cache for a per-exchange TTL. Symbols not
+in the cache are fetched with one multi-ticker yf.download request per
+exchange, and a symbol that another caller is already fetching is not
+requested again: the second caller waits for the first one's result.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import yfinance as yf
+import shared  # noqa: F401  (adds python/ to sys.path)
+import symbol_registry
+from bulk_frames import split_bulk_frame
+
+# Seconds a quote is served from the cache. Yahoo's LSE and NSE prices are
+# already delayed by 15 minutes, so refreshing them more often gains nothing.
+QUOTE_TTLS = {
+    'NYSE': 15,
+    'LSE': 60,
+    'NSE': 60,
+}
+DEFAULT_QUOTE_TTL = 30
+
+MAX_CACHED_QUOTES = 2000
+
+# Longest time a caller waits for a fetch started by another caller
+INFLIGHT_TIMEOUT = 30
+
+
+def quote_ttl(symbol):
+    """Cache lifetime of a symbol's quote in seconds"""
+    return QUOTE_TTLS.get(symbol_registry.exchange(symbol), DEFAULT_QUOTE_TTL)
+
+
+def fetch_quotes(symbols, session=None):
+    """Latest 1-minute close of each symbol: {symbol: quote}.
+
+    Mirrors the browser's chart request (range=1d, interval=1m, last valid
+    close). Symbols are grouped by exchange so every request has a single
+    timezone; symbols without a bar today are left out.
+    """
+    groups = {}
+    for symbol in symbols:
+        groups.setdefault(symbol_registry.exchange(symbol), []).append(symbol)
+
+    quotes = {}
+    for group in groups.values():
+        wide = yf.download(group, period='1d', interval='1m', group_by='ticker', auto_adjust=False,
+                           ignore_tz=False, threads=False, progress=False, session=session)
+        for symbol, frame in split_bulk_frame(wide, group).items():
+            last = frame['Close'].dropna()
+            if last.empty:
+                continue
+            timestamp = last.index[-1]
+            quotes[symbol] = {
+                'symbol': symbol,
+                'price': float(last.iloc[-1]),
+                'time': timestamp.isoformat() if isinstance(timestamp, pd.Timestamp) else str(timestamp),
+            }
+    return quotes
+
+
+class _Flight:
+    """One upstream fetch that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.quotes = {}
+        self.error = None
+
+
+class QuoteCache:
+    """TTL + LRU quote cache that collapses concurrent fetches of the same symbol"""
+
+    def __init__(self, fetcher=fetch_quotes, max_entries=MAX_CACHED_QUOTES, ttl=quote_ttl,
+                 clock=time.monotonic):
+        self.fetcher = fetcher
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # symbol -> (expires_at, fetched_at, quote)
+        self.inflight = {}  # symbol -> _Flight
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'symbols': 0, 'hits': 0, 'misses': 0, 'shared': 0,
+                      'fetches': 0, 'fetchErrors': 0, 'evictions': 0}
+
+    def _store(self, quotes, fetched_at):
+        for symbol, quote in quotes.items():
+            self.entries[symbol] = (fetched_at + self.ttl(symbol), fetched_at, quote)
+            self.entries.move_to_end(symbol)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _answer(self, quote, fetched_at, now, cached):
+        return dict(quote, cached=cached, ageMs=round((now - fetched_at) * 1000, 1))
+
+    def get_quotes(self, symbols, **fetch_args):
+        """Quotes for `symbols`; symbols without a price map to None"""
+        symbols = list(dict.fromkeys(symbols))
+        results = {}
+        own, waiting = [], {}
+        flight = _Flight()
+        with self.lock:
+            now = self.clock()
+            self.stats['requests'] += 1
+            self.stats['symbols'] += len(symbols)
+            for symbol in symbols:
+                entry = self.entries.get(symbol)
+                if entry and entry[0] > now:
+                    self.entries.move_to_end(symbol)
+                    results[symbol] = self._answer(entry[2], entry[1], now, True)
+                    self.stats['hits'] += 1
+                elif symbol in self.inflight:
+                    waiting[symbol] = self.inflight[symbol]
+                    self.stats['shared'] += 1
+                else:
+                    own.append(symbol)
+                    self.inflight[symbol] = flight
+                    self.stats['misses'] += 1
+
+        if own:
+            try:
+                flight.quotes = self.fetcher(own, **fetch_args)
+            except Exception as e:
+                logging.error(f"Quote fetch failed for {len(own)} symbols: {e}")
+                flight.error = str(e)
+            fetched_at = self.clock()
+            with self.lock:
+                self.stats['fetches'] += 1
+                if flight.error:
+                    self.stats['fetchErrors'] += 1
+                self._store(flight.quotes, fetched_at)
+                for symbol in own:
+                    if self.inflight.get(symbol) is flight:
+                        del self.inflight[symbol]
+            flight.done.set()
+            for symbol in own:
+                quote = flight.quotes.get(symbol)
+                results[symbol] = self._answer(quote, fetched_at, fetched_at, False) if quote else None
+
+        for symbol, other in waiting.items():
+            other.done.wait(INFLIGHT_TIMEOUT)
+            quote = other.quotes.get(symbol)
+            results[symbol] = self._answer(quote, 0.0, 0.0, False) if quote else None
+
+        return {symbol: results.get(symbol) for symbol in symbols}
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['cached'] = len(self.entries)
+            stats['inflight'] = len(self.inflight)
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Print latest quotes for symbols')
+    parser.add_argument('symbols', nargs='+', help='Stock symbols')
+    args = parser.parse_args()
+
+    print(json.dumps(QuoteCache().get_quotes(args.symbols), indent=2))
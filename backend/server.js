@@ -4,13 +4,16 @@ const admin = require('firebase-admin');
 const { PythonShell } = require('python-shell');
 const path = require('path');
 const fs = require('fs');
+const crypto = require('crypto');
+const zlib = require('zlib');
 
 // Initialize Express app
 const app = express();
 
 // Middleware
 app.use(cors());
-app.use(express.json());
+// Trade journals posted to /api/portfolio/analytics run to a few MB
+app.use(express.json({ limit: '10mb' }));
 
 // Check if serviceAccountKey.json exists, if not create a placeholder
 const serviceAccountPath = path.join(__dirname, 'serviceAccountKey.json');
@@ -44,8 +47,31 @@ try {
   console.error('Error initializing Firebase:', error);
 }
 
-// Helper function to determine collection for a symbol
+// Symbol -> collection from the registry compiled by symbol_registry.py
+// (js/stock-lists/registry.compiled.json); re-read when the file changes
+const SYMBOL_REGISTRY_FILE = process.env.SYMBOL_REGISTRY_FILE ||
+  path.join(__dirname, '..', 'js', 'stock-lists', 'registry.compiled.json');
+let registryCache = { mtimeMs: 0, symbols: null };
+
+function loadSymbolRegistry() {
+  try {
+    const { mtimeMs } = fs.statSync(SYMBOL_REGISTRY_FILE);
+    if (!registryCache.symbols || registryCache.mtimeMs !== mtimeMs) {
+      registryCache = { mtimeMs, symbols: JSON.parse(fs.readFileSync(SYMBOL_REGISTRY_FILE, 'utf8')).symbols };
+    }
+  } catch (error) {
+    // Not compiled yet: symbols fall back to their exchange's collection
+    registryCache = { mtimeMs: 0, symbols: registryCache.symbols || {} };
+  }
+  return registryCache.symbols;
+}
+
+// Same defaults as symbol_registry.EXCHANGE_FOLDERS for symbols in no list
 function getCollectionForSymbol(symbol) {
+  const info = loadSymbolRegistry()[symbol];
+  if (info) {
+    return info.folder;
+  }
   if (symbol.endsWith('.NS')) {
     return 'nifty50';
   } else if (symbol.endsWith('.L')) {
@@ -55,54 +81,201 @@ function getCollectionForSymbol(symbol) {
   }
 }
 
+// Price history is stored as a head document plus yearly/monthly chunk
+// documents (see price_chunks.py); old symbols still hold one `data` array
+const CHUNKED_LAYOUT = 'chunked-v1';
+const CHUNK_COLLECTION = 'chunks';
+
+// Chunk keys needed for a "last N bars" and/or "since date" read
+function selectChunks(chunks, last, since) {
+  let keys = Object.keys(chunks).sort();
+  if (since) {
+    keys = keys.filter(key => key >= since.slice(0, key.length));
+  }
+  if (last) {
+    let count = 0;
+    let start = keys.length;
+    while (start > 0 && count < last) {
+      start--;
+      count += chunks[keys[start]];
+    }
+    keys = keys.slice(start);
+  }
+  return keys;
+}
+
+// Read a symbol's history (optionally only the last N bars or bars since a
+// date) in the shape of the old single document: head fields plus `data`
+async function readStockHistory(symbol, { last, since } = {}, head = null) {
+  const stockRef = db.collection(getCollectionForSymbol(symbol)).doc(symbol);
+  head = head || await stockRef.get();
+  if (!head.exists) {
+    return null;
+  }
+  
+  const { data, chunks, ...info } = head.data();
+  let rows;
+  if (info.layout !== CHUNKED_LAYOUT) {
+    rows = data || [];
+  } else {
+    const keys = selectChunks(chunks || {}, last, since);
+    const chunkRefs = keys.map(key => stockRef.collection(CHUNK_COLLECTION).doc(key));
+    const snapshots = chunkRefs.length ? await db.getAll(...chunkRefs) : [];
+    rows = snapshots.flatMap(snapshot => (snapshot.exists ? snapshot.data().rows : []));
+    rows.sort((a, b) => (a.date < b.date ? -1 : a.date > b.date ? 1 : 0));
+  }
+  
+  if (since) {
+    rows = rows.filter(row => row.date >= since);
+  }
+  if (last) {
+    rows = rows.slice(-last);
+  }
+  return { ...info, data: rows };
+}
+
+// Range options from ?last=N&since=YYYY-MM-DD
+function getRangeOptions(query) {
+  const last = parseInt(query.last, 10);
+  return {
+    last: last > 0 ? last : undefined,
+    since: typeof query.since === 'string' && query.since ? query.since : undefined
+  };
+}
+
+// Resident Python worker for update jobs (see update_worker.py). It keeps
+// pandas/yfinance/firebase_admin imported and the Firestore client warm, so
+// an update no longer pays Python startup on every request.
+let updateWorker = null;
+let nextJobId = 1;
+const pendingJobs = new Map();
+
+function startUpdateWorker() {
+  const worker = new PythonShell('update_worker.py', { mode: 'json', scriptPath: __dirname });
+  updateWorker = worker;
+  
+  worker.on('message', message => {
+    const job = pendingJobs.get(message.id);
+    if (!job) {
+      console.warn('Unexpected update worker message:', message);
+      return;
+    }
+    pendingJobs.delete(message.id);
+    if (message.error) {
+      job.reject(new Error(message.error.message));
+    } else {
+      job.resolve(message.result);
+    }
+  });
+  worker.on('stderr', line => console.log(`[update worker] ${line}`));
+  worker.on('error', err => console.error('Update worker error:', err));
+  worker.on('pythonError', err => console.error('Update worker crashed:', err.message));
+  worker.on('close', () => {
+    if (updateWorker !== worker) return;
+    updateWorker = null;
+    for (const job of pendingJobs.values()) {
+      job.reject(new Error('Update worker exited'));
+    }
+    pendingJobs.clear();
+    console.warn('Update worker exited, restarting in 1s');
+    setTimeout(startUpdateWorker, 1000);
+  });
+}
+
+function callUpdateWorker(method, params = {}) {
+  if (!updateWorker) {
+    return Promise.reject(new Error('Update worker is not running'));
+  }
+  const id = nextJobId++;
+  return new Promise((resolve, reject) => {
+    pendingJobs.set(id, { resolve, reject });
+    updateWorker.send({ id, method, params });
+  });
+}
+
+startUpdateWorker();
+
 // API Routes
 
-// Get stock data by symbol
+// Get stock data by symbol (?last=N for the latest bars, ?since=YYYY-MM-DD)
 app.get('/api/stocks/:symbol', async (req, res) => {
   try {
     const symbol = req.params.symbol;
-    const collection = getCollectionForSymbol(symbol);
     
     if (!db) {
       return res.status(500).json({ error: 'Firebase not initialized' });
     }
     
-    const doc = await db.collection(collection).doc(symbol).get();
-    if (!doc.exists) {
+    const stockData = await readStockHistory(symbol, getRangeOptions(req.query));
+    if (!stockData) {
       return res.status(404).json({ error: 'Stock data not found' });
     }
     
-    res.json(doc.data());
+    res.json(stockData);
   } catch (error) {
     console.error('Error fetching stock data:', error);
     res.status(500).json({ error: error.message });
   }
 });
 
-// Get stock data in CSV format (for compatibility with existing code)
+// Responses smaller than this are sent uncompressed
+const COMPRESS_MIN_BYTES = 1024;
+
+// Send a text body with the br/gzip encoding the client accepts
+function sendCompressed(req, res, body) {
+  res.vary('Accept-Encoding');
+  const encoding = body.length >= COMPRESS_MIN_BYTES ? req.acceptsEncodings('br', 'gzip') : false;
+  if (encoding === 'br') {
+    res.set('Content-Encoding', 'br');
+    return res.send(zlib.brotliCompressSync(body, {
+      params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 5, [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT }
+    }));
+  }
+  if (encoding === 'gzip') {
+    res.set('Content-Encoding', 'gzip');
+    return res.send(zlib.gzipSync(body));
+  }
+  res.send(body);
+}
+
+// Get stock data in CSV format (for compatibility with existing code).
+// Chunked symbols get an ETag from their head document (updated on every
+// write), so a revalidation costs one document read and answers 304.
 app.get('/api/stocks/:symbol/csv', async (req, res) => {
   try {
     const symbol = req.params.symbol;
-    const collection = getCollectionForSymbol(symbol);
     
     if (!db) {
       return res.status(500).json({ error: 'Firebase not initialized' });
     }
     
-    const doc = await db.collection(collection).doc(symbol).get();
-    if (!doc.exists) {
+    const rangeOptions = getRangeOptions(req.query);
+    const head = await db.collection(getCollectionForSymbol(symbol)).doc(symbol).get();
+    if (!head.exists) {
       return res.status(404).json({ error: 'Stock data not found' });
     }
     
+    res.set('Content-Type', 'text/csv');
+    res.set('Cache-Control', 'no-cache');
+    const { updated_at: updatedAt, row_count: rowCount } = head.data();
+    if (updatedAt) {
+      const version = [symbol, updatedAt, rowCount, rangeOptions.last, rangeOptions.since].join('|');
+      res.set('ETag', `W/"${crypto.createHash('sha1').update(version).digest('hex')}"`);
+      if (req.fresh) {
+        return res.status(304).end();
+      }
+    }
+    
+    const stockData = await readStockHistory(symbol, rangeOptions, head);
+    
     // Convert Firestore data to CSV
-    const stockData = doc.data();
     const csvHeader = 'date,open,high,low,close,volume\n';
     const csvRows = stockData.data.map(row => 
       `${row.date},${row.open},${row.high},${row.low},${row.close},${row.volume}`
     ).join('\n');
     
-    res.set('Content-Type', 'text/csv');
-    res.send(csvHeader + csvRows);
+    // Old single-document symbols fall back to Express's ETag of the body
+    sendCompressed(req, res, csvHeader + csvRows);
   } catch (error) {
     console.error('Error fetching stock data as CSV:', error);
     res.status(500).json({ error: error.message });
@@ -133,26 +306,138 @@ app.post('/api/update/:symbol', (req, res) => {
   const symbol = req.params.symbol;
   const forceUpdate = req.body.forceUpdate === true;
   
-  const options = {
-    scriptPath: __dirname,
-    args: [symbol]
-  };
-  
-  if (forceUpdate) {
-    options.args.push('--force');
-  }
-  
-  PythonShell.run('fetch_stock_data.py', options)
-    .then(results => {
-      console.log('Python script results:', results);
-      res.json({ success: true, message: `Stock ${symbol} updated successfully`, results });
+  callUpdateWorker('update', { symbol, forceUpdate })
+    .then(result => {
+      console.log(`Updated ${symbol} in ${result.totalMs} ms (fetch ${result.runMs} ms, merged ${result.merged})`);
+      if (!result.success) {
+        return res.status(500).json({ error: result.error || `Failed to update ${symbol}`, result });
+      }
+      res.json({ success: true, message: `Stock ${symbol} updated successfully`, result });
     })
     .catch(err => {
-      console.error('Error running Python script:', err);
+      console.error('Error running update worker job:', err);
+      res.status(500).json({ error: err.message });
+    });
+});
+
+// Latest prices for many symbols in one round trip (?symbols=AAPL,BP.L,TCS.NS).
+// Served by the update worker's shared quote cache, so concurrent clients
+// asking for the same symbols trigger a single upstream request.
+app.get('/api/quotes', (req, res) => {
+  const symbols = [...new Set(String(req.query.symbols || '')
+    .split(',')
+    .map(symbol => symbol.trim().toUpperCase())
+    .filter(Boolean))];
+
+  if (symbols.length === 0) {
+    return res.status(400).json({ error: 'No symbols given' });
+  }
+
+  callUpdateWorker('quotes', { symbols })
+    .then(result => res.json({ ...result, timestamp: new Date().toISOString() }))
+    .catch(err => {
+      console.error('Error fetching quotes:', err);
       res.status(500).json({ error: err.message });
     });
 });
 
+// Latest-signals table exported by the Python pipeline (python/signals_store.py).
+// The file is re-read only when it changes, so a screen is an in-memory filter.
+const SIGNALS_FILE = process.env.SIGNALS_FILE || path.join(__dirname, '..', 'DATA', 'signals.json');
+let signalsCache = { mtimeMs: 0, data: null };
+
+function loadSignals() {
+  const { mtimeMs } = fs.statSync(SIGNALS_FILE);
+  if (!signalsCache.data || signalsCache.mtimeMs !== mtimeMs) {
+    signalsCache = { mtimeMs, data: JSON.parse(fs.readFileSync(SIGNALS_FILE, 'utf8')) };
+  }
+  return signalsCache.data;
+}
+
+// Same screens as signals_store.query_signals
+function matchesSignal(row, query, threshold) {
+  if (query.signal === 'entry') {
+    const sevenDayRising = row.prevDti7Day === undefined || row.dti7Day > row.prevDti7Day;
+    if (!(row.dti < threshold && row.dti > row.prevDti && sevenDayRising)) return false;
+  } else if (query.signal === 'crossAbove') {
+    if (!(row.prevDti < threshold && row.dti >= threshold)) return false;
+  }
+  if (query.index && row.indexFolder !== query.index && !row.indices.includes(query.index)) return false;
+  if (query.region && row.region !== query.region) return false;
+  if (query.active !== undefined && row.active !== (query.active === 'true')) return false;
+  if (query.positive7Day === 'true' && !(row.dti7Day > 0)) return false;
+  return true;
+}
+
+// Screen every symbol's latest DTI state
+// (?signal=entry|crossAbove&threshold=0&index=ftse100&region=UK&active=true&positive7Day=true)
+app.get('/api/signals', (req, res) => {
+  if (req.query.signal && !['entry', 'crossAbove'].includes(req.query.signal)) {
+    return res.status(400).json({ error: `Unknown signal '${req.query.signal}'` });
+  }
+  const threshold = req.query.threshold !== undefined ? parseFloat(req.query.threshold) : 0;
+  if (Number.isNaN(threshold)) {
+    return res.status(400).json({ error: 'Invalid threshold' });
+  }
+
+  try {
+    const { generatedAt, params, signals } = loadSignals();
+    const matches = signals.filter(row => matchesSignal(row, req.query, threshold));
+    res.json({ generatedAt, params, total: signals.length, count: matches.length, signals: matches });
+  } catch (error) {
+    if (error.code === 'ENOENT') {
+      return res.status(404).json({ error: 'No signals exported yet' });
+    }
+    console.error('Error reading signals:', error);
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Precompressed, content-hashed price bundles written by python/export_bundles.py.
+// A bundle's name changes with its content, so it can be cached for a year;
+// only the manifest is revalidated (ETag / If-None-Match -> 304).
+const BUNDLES_DIR = process.env.BUNDLES_DIR || path.join(__dirname, '..', 'DATA', 'bundles');
+const BUNDLE_MAX_AGE = 365 * 24 * 60 * 60 * 1000;
+
+// Send a bundle file, preferring the .br / .gz variant the client accepts
+function sendBundle(req, res, relativePath) {
+  const filePath = path.resolve(BUNDLES_DIR, relativePath);
+  if (!filePath.startsWith(path.resolve(BUNDLES_DIR) + path.sep) || !fs.existsSync(filePath)) {
+    return res.status(404).json({ error: 'Bundle not found' });
+  }
+  const encodings = [['br', '.br'], ['gzip', '.gz']];
+  const accepted = req.acceptsEncodings(...encodings.map(([name]) => name));
+  const match = encodings.find(([name, ext]) => name === accepted && fs.existsSync(filePath + ext));
+
+  res.type(path.extname(filePath));
+  res.vary('Accept-Encoding');
+  if (match) {
+    res.set('Content-Encoding', match[0]);
+  }
+  res.sendFile(match ? filePath + match[1] : filePath, {
+    maxAge: BUNDLE_MAX_AGE,
+    immutable: true,
+  });
+}
+
+app.get('/bundles/manifest.json', (req, res) => {
+  res.type('json');
+  res.sendFile(path.join(BUNDLES_DIR, 'manifest.json'), { maxAge: 0 }, error => {
+    if (error && !res.headersSent) {
+      res.status(404).json({ error: 'No bundles exported yet' });
+    }
+  });
+});
+
+app.get('/bundles/*', (req, res) => sendBundle(req, res, req.params[0]));
+
+// Update worker queue and latency statistics
+app.get('/api/update-worker/stats', (req, res) => {
+  callUpdateWorker('stats')
+    .then(stats => res.json(stats))
+    .catch(err => res.status(500).json({ error: err.message }));
+});
+
 // Update an entire index
 app.post('/api/update/index/:indexName', (req, res) => {
   const indexName = req.params.indexName;
@@ -178,6 +463,35 @@ app.post('/api/update/index/:indexName', (req, res) => {
     });
 });
 
+// Mark-to-market analytics of a trade journal (python/portfolio.py, run in the
+// update worker). The body is exportAllTradesJSON's object; results are cached
+// per trade set in DATA/portfolio.
+app.post('/api/portfolio/analytics', (req, res) => {
+  if (!req.body || !Array.isArray(req.body.trades)) {
+    return res.status(400).json({ error: 'Expected an exported trade history ({ trades: [...] })' });
+  }
+  const params = { trades: req.body.trades };
+  if (req.query.capital !== undefined) {
+    params.capital = parseFloat(req.query.capital);
+    if (!(params.capital > 0)) {
+      return res.status(400).json({ error: 'Invalid capital' });
+    }
+  }
+  if (req.query.riskFree !== undefined) {
+    params.riskFree = parseFloat(req.query.riskFree);
+    if (Number.isNaN(params.riskFree)) {
+      return res.status(400).json({ error: 'Invalid riskFree' });
+    }
+  }
+  
+  callUpdateWorker('portfolio', params)
+    .then(result => res.json(result))
+    .catch(err => {
+      console.error('Error computing portfolio analytics:', err);
+      res.status(500).json({ error: err.message });
+    });
+});
+
 // Health check endpoint
 app.get('/api/health', (req, res) => {
   res.json({ status: 'ok', timestamp: new Date().toISOString() });
@@ -0,0 +1,20 @@
+"""Modules shared with the python/ pipeline.
+
+Stage metrics, the bounded pipeline stages, the market calendar, the
+symbol registry and the multi-ticker frame splitting exist once, in
+python/. Importing this module appends that directory to sys.path, so
+the backend imports them from there:
+
+    import shared
+    import metrics
+
+The directory is appended, not prepended, so backend modules that share a
+name with a python/ one (fetch_stock_data, batch_processor) still win.
+"""
+import os
+import sys
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python")
+
+if PYTHON_DIR not in sys.path:
+    sys.path.append(PYTHON_DIR)
@@ -0,0 +1,249 @@
+"""Resident update worker driven by server.js.
+
+Reads one JSON request per line on stdin and writes one JSON response per
+line on stdout:
+
+    {"id": 1, "method": "update", "params": {"symbol": "AAPL", "forceUpdate": false}}
+    {"id": 1, "result": {"symbol": "AAPL", "success": true, "merged": 1,
+                         "queueMs": 0.2, "runMs": 640.5, "totalMs": 640.7}}
+
+Imports, the Firestore client and the Yahoo HTTP session stay warm between
+jobs, so an update costs only the fetch itself. A request for a symbol that
+is already queued (or running, unless the new request forces an update the
+running one does not) is merged into that job and answered with its result.
+
+"quotes" returns latest prices for a list of symbols from the shared
+quote cache (see quote_service):
+
+    {"id": 2, "method": "quotes", "params": {"symbols": ["AAPL", "BP.L"]}}
+    {"id": 2, "result": {"quotes": {"AAPL": {"symbol": "AAPL", "price": 189.3, ...},
+                                    "BP.L": null}, "totalMs": 412.0}}
+
+"portfolio" marks a trade-history export to market against the stored
+daily prices (python/portfolio.py), with its imports already warm:
+
+    {"id": 3, "method": "portfolio", "params": {"trades": [...], "capital": null, "riskFree": 0.02}}
+    {"id": 3, "result": {"cacheKey": "...", "currencies": {"$": {...}}, "cached": false, "totalMs": 180.2}}
+
+Other methods: "ping", "stats" and "shutdown".
+"""
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Responses own the real stdout; prints and log output of the fetch code
+# are sent to stderr, which server.js forwards to its own log
+PROTOCOL_OUT = sys.stdout
+sys.stdout = sys.stderr
+
+import requests
+from fetch_stock_data import fetch_stock_data
+from firebase_utils import initialize_firebase
+from quote_service import QuoteCache
+import shared  # noqa: F401  (adds python/ to sys.path)
+import metrics
+import portfolio
+
+WORKER_THREADS = 4
+QUOTE_THREADS = 4
+MAX_QUOTE_SYMBOLS = 200
+PORTFOLIO_THREADS = 2
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class UpdateWorker:
+    """Job queue with per-symbol request merging and a pool of fetch threads"""
+
+    def __init__(self, threads=WORKER_THREADS, out=PROTOCOL_OUT, fetcher=fetch_stock_data, session=None,
+                 quotes=None):
+        self.out = out
+        self.fetcher = fetcher
+        self.session = session if session is not None else requests.Session()
+        self.jobs = queue.Queue()
+        self.pending = {}  # symbol -> job queued or running
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.stats = {'requests': 0, 'jobs': 0, 'completed': 0, 'merged': 0, 'failed': 0,
+                      'runMs': 0.0, 'maxRunMs': 0.0}
+        for _ in range(threads):
+            threading.Thread(target=self._run, daemon=True).start()
+        # Quote requests run beside update jobs so a long download never delays them
+        self.quotes = quotes if quotes is not None else QuoteCache()
+        self.quote_pool = ThreadPoolExecutor(max_workers=QUOTE_THREADS)
+        self.portfolio_pool = ThreadPoolExecutor(max_workers=PORTFOLIO_THREADS)
+
+    def respond(self, request_id, result=None, error=None):
+        message = {'id': request_id}
+        if error is not None:
+            message['error'] = {'message': error}
+        else:
+            message['result'] = result
+        line = json.dumps(message)
+        with self.write_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def submit(self, request_id, symbol, force_update=False):
+        """Queue an update, or attach the request to a pending job for the symbol"""
+        with self.lock:
+            self.stats['requests'] += 1
+            job = self.pending.get(symbol)
+            if job and not (force_update and job['started'] and not job['force_update']):
+                job['ids'].append(request_id)
+                job['force_update'] = job['force_update'] or force_update
+                self.stats['merged'] += 1
+                return
+            job = {
+                'symbol': symbol,
+                'force_update': force_update,
+                'ids': [request_id],
+                'queued_at': time.monotonic(),
+                'started': False,
+            }
+            self.pending[symbol] = job
+            self.stats['jobs'] += 1
+        self.jobs.put(job)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            with self.lock:
+                job['started'] = True
+                force_update = job['force_update']
+            started_at = time.monotonic()
+            error = None
+            try:
+                success = bool(self.fetcher(job['symbol'], force_update=force_update, session=self.session))
+            except Exception as e:
+                logging.error(f"Update worker error for {job['symbol']}: {e}")
+                success, error = False, str(e)
+            finished_at = time.monotonic()
+
+            with self.lock:
+                if self.pending.get(job['symbol']) is job:
+                    del self.pending[job['symbol']]
+                ids = list(job['ids'])
+                run_ms = _ms(finished_at - started_at)
+                self.stats['completed'] += 1
+                self.stats['runMs'] += run_ms
+                self.stats['maxRunMs'] = max(self.stats['maxRunMs'], run_ms)
+                if not success:
+                    self.stats['failed'] += 1
+
+            result = {
+                'symbol': job['symbol'],
+                'success': success,
+                'merged': len(ids),
+                'queueMs': _ms(started_at - job['queued_at']),
+                'runMs': run_ms,
+                'totalMs': _ms(finished_at - job['queued_at']),
+            }
+            if error:
+                result['error'] = error
+            for request_id in ids:
+                self.respond(request_id, result)
+            self.jobs.task_done()
+
+    def _quotes(self, request_id, symbols):
+        started_at = time.monotonic()
+        try:
+            quotes = self.quotes.get_quotes(symbols, session=self.session)
+        except Exception as e:
+            logging.error(f"Quote request failed: {e}")
+            self.respond(request_id, error=str(e))
+            return
+        self.respond(request_id, {'quotes': quotes, 'totalMs': _ms(time.monotonic() - started_at)})
+
+    def _portfolio(self, request_id, params):
+        started_at = time.monotonic()
+        try:
+            result = portfolio.analyze({'trades': params['trades']}, params.get('capital'),
+                                       params.get('riskFree', portfolio.RISK_FREE_RATE))
+        except Exception as e:
+            logging.error(f"Portfolio analytics failed: {e}")
+            self.respond(request_id, error=str(e))
+            return
+        self.respond(request_id, dict(result, totalMs=_ms(time.monotonic() - started_at)))
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['queued'] = self.jobs.qsize()
+            stats['pending'] = len(self.pending)
+        stats['avgRunMs'] = round(stats['runMs'] / stats['completed'], 1) if stats['completed'] else 0
+        stats['uptimeSeconds'] = round(time.monotonic() - self.started_at, 1)
+        stats['quotes'] = self.quotes.get_stats()
+        # Stage timers of the fetch code since the worker started
+        stats['pipeline'] = metrics.METRICS.report()
+        return stats
+
+    def handle(self, request):
+        """Dispatch one decoded request; returns False on shutdown"""
+        request_id = request.get('id')
+        method = request.get('method')
+        params = request.get('params') or {}
+        if method == 'update':
+            symbol = params.get('symbol')
+            if not symbol:
+                self.respond(request_id, error="Missing 'symbol'")
+            else:
+                self.submit(request_id, symbol, params.get('forceUpdate') is True)
+        elif method == 'quotes':
+            symbols = params.get('symbols')
+            if not isinstance(symbols, list) or not symbols:
+                self.respond(request_id, error="Missing 'symbols'")
+            elif len(symbols) > MAX_QUOTE_SYMBOLS:
+                self.respond(request_id, error=f"At most {MAX_QUOTE_SYMBOLS} symbols per request")
+            else:
+                self.quote_pool.submit(self._quotes, request_id, [str(s) for s in symbols])
+        elif method == 'portfolio':
+            if not isinstance(params.get('trades'), list):
+                self.respond(request_id, error="Missing 'trades'")
+            else:
+                self.portfolio_pool.submit(self._portfolio, request_id, params)
+        elif method == 'ping':
+            self.respond(request_id, {'pong': True})
+        elif method == 'stats':
+            self.respond(request_id, self.get_stats())
+        elif method == 'shutdown':
+            self.respond(request_id, {'shutdown': True})
+            return False
+        else:
+            self.respond(request_id, error=f"Unknown method '{method}'")
+        return True
+
+    def serve(self, lines):
+        """Handle requests until `lines` ends or a shutdown arrives, then drain the queue"""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self.respond(None, error=f"Invalid JSON: {e}")
+                continue
+            if not self.handle(request):
+                break
+        self.jobs.join()
+        self.quote_pool.shutdown(wait=True)
+        self.portfolio_pool.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    try:
+        initialize_firebase()
+    except Exception as e:
+        logging.error(f"Firebase initialization failed, will retry per job: {e}")
+
+    worker = UpdateWorker()
+    print(f"Update worker ready ({WORKER_THREADS} threads)")
+    worker.serve(sys.stdin)
@@ -0,0 +1,78 @@
+"""Compare per-symbol and multi-ticker downloads offline: requests and wall time per 100 symbols.
+
+Usage: python benchmarks/bench_bulk_download.py [--symbols N] [--latency S] [--chunk-size N]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_fetcher import fixture_symbols
+from fake_yahoo import FakeYahoo
+
+
+def run_per_symbol(fsd, symbols):
+    """One Ticker.history request per symbol, as fetch_stock_data does"""
+    frames = {}
+    for symbol in symbols:
+        data = fsd.yf.Ticker(symbol).history(period="5y", interval="1d")
+        if not data.empty:
+            frames[symbol] = fsd.format_history(data)
+    return frames
+
+
+def run_bulk(fsd, symbols, chunk_size):
+    """One multi-ticker request per chunk, split into per-symbol frames"""
+    frames = {}
+    for i in range(0, len(symbols), chunk_size):
+        for symbol, data in fsd.download_bulk(symbols[i:i + chunk_size], period="5y").items():
+            frames[symbol] = fsd.format_history(data)
+    return frames
+
+
+def measure(yahoo, run, symbols):
+    yahoo.requests = 0
+    start = time.perf_counter()
+    frames = run()
+    elapsed = time.perf_counter() - start
+    per_100 = 100 / len(symbols)
+    return frames, {"requests_per_100": yahoo.requests * per_100, "seconds_per_100": elapsed * per_100}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=300, help="Number of fixture symbols to download")
+    parser.add_argument("--latency", type=float, default=0.15, help="Simulated request latency (s)")
+    parser.add_argument("--per-symbol", type=float, default=0.002, help="Simulated transfer time per symbol (s)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Symbols per bulk request")
+    args = parser.parse_args()
+
+    # Keep fetch_stock_data from configuring its file log handler
+    logging.basicConfig(level=logging.WARNING)
+    yahoo = FakeYahoo(latency=args.latency, per_symbol=args.per_symbol)
+    sys.modules["yfinance"] = yahoo
+    import fetch_stock_data as fsd
+
+    symbols = fixture_symbols(("us_stocks",))[:args.symbols]
+    for symbol in symbols:
+        yahoo._history(symbol)  # parse fixtures up front so only the fetch paths are timed
+
+    single, single_stats = measure(yahoo, lambda: run_per_symbol(fsd, symbols), symbols)
+    bulk, bulk_stats = measure(yahoo, lambda: run_bulk(fsd, symbols, args.chunk_size), symbols)
+
+    mismatched = [s for s in single if s not in bulk or not single[s].equals(bulk[s])]
+    print(f"{len(symbols)} symbols, {args.latency * 1000:.0f} ms latency per request")
+    for name, stats in (("per-symbol", single_stats), ("bulk", bulk_stats)):
+        print(f"  {name:<11} {stats['requests_per_100']:6.1f} requests / 100 symbols   "
+              f"{stats['seconds_per_100']:6.2f} s / 100 symbols")
+    print(f"  speedup     {single_stats['seconds_per_100'] / bulk_stats['seconds_per_100']:.1f}x, "
+          f"{len(mismatched)} symbols differ between paths" + (f": {', '.join(mismatched[:10])}" if mismatched else ""))
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
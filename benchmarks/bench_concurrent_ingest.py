@@ -0,0 +1,60 @@
+"""Measure symbols/second of the sequential and concurrent ingest paths offline.
+
+Usage: python benchmarks/bench_concurrent_ingest.py [--symbols N] [--workers N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from concurrent_ingest import process_symbols_concurrent
+from rate_limiter import TokenBucket
+from fake_fetcher import FakeFetcher, fixture_symbols
+
+
+def run_sequential(symbols, fetcher, delay):
+    """Mirror of the original process_batch loop: one fetch, then a fixed sleep"""
+    start = time.monotonic()
+    success = 0
+    for i, symbol in enumerate(symbols):
+        if i > 0:
+            time.sleep(delay)
+        success += bool(fetcher(symbol))
+    elapsed = time.monotonic() - start
+    return {"total": len(symbols), "success": success, "elapsed": elapsed,
+            "symbols_per_second": len(symbols) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=200, help="Number of fixture symbols to ingest")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=50.0, help="Token bucket requests per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated request latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--sequential-delay", type=float, default=0.0,
+                        help="Fixed sleep of the sequential path (production uses 1s)")
+    args = parser.parse_args()
+
+    symbols = fixture_symbols()[:args.symbols]
+
+    sequential = run_sequential(symbols, FakeFetcher(args.latency, failure_rate=args.failure_rate),
+                                args.sequential_delay)
+    print(f"sequential: {sequential['symbols_per_second']:.1f} symbols/s "
+          f"({sequential['success']}/{sequential['total']} ok, {sequential['elapsed']:.2f}s)")
+
+    fetcher = FakeFetcher(args.latency, failure_rate=args.failure_rate)
+    concurrent = process_symbols_concurrent(
+        symbols, fetcher, max_workers=args.workers,
+        limiter=TokenBucket(args.rate, args.workers), backoff=0.01, verbose=False
+    )
+    print(f"concurrent: {concurrent['symbols_per_second']:.1f} symbols/s "
+          f"({concurrent['success']}/{concurrent['total']} ok, {concurrent['retries']} retries, "
+          f"{fetcher.calls} requests, {concurrent['elapsed']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
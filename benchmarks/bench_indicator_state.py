@@ -0,0 +1,109 @@
+"""Check incremental DTI updates against a full recompute and time both.
+
+For every fixture symbol the series is built from a truncated copy of its
+CSV, then extended one daily download at a time (each download re-sends the
+last stored bar, as fetch_stock_data does). The stored series must equal
+indicators.dti / seven_day_dti over the whole history.
+
+Usage: python benchmarks/bench_indicator_state.py [--symbols N] [--new-bars N]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_fetcher import FIXTURE_DIR, fixture_symbols
+import indicators
+import indicator_state
+
+PARAMS = (14, 10, 5)
+
+
+def max_difference(stored, expected):
+    """Largest absolute difference, with NaN only allowed where both are NaN"""
+    stored = np.asarray(stored, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    if stored.shape != expected.shape or not np.array_equal(np.isnan(stored), np.isnan(expected)):
+        return np.inf
+    valid = ~np.isnan(expected)
+    return float(np.max(np.abs(stored[valid] - expected[valid]), initial=0.0))
+
+
+def check_symbol(symbol, folder, data_dir, new_bars, rng):
+    frame = pd.read_csv(os.path.join(FIXTURE_DIR, folder, f"{symbol}.csv"))
+    cut = len(frame) - new_bars
+    target = os.path.join(data_dir, folder, f"{symbol}.csv")
+    frame.iloc[:cut].to_csv(target, index=False)
+    indicator_state.rebuild_symbol(symbol, folder, PARAMS, data_dir)
+
+    # Daily downloads: each starts at the last stored bar, sometimes with a few bars at once
+    bars = list(zip(frame['date'].astype(str), frame['high'].astype(float), frame['low'].astype(float)))
+    position = cut
+    update_seconds = 0.0
+    updates = 0
+    while position < len(frame):
+        step = min(rng.choice((1, 1, 1, 2, 3)), len(frame) - position)
+        since = bars[position - 1][0]
+        start = time.perf_counter()
+        indicator_state.update_symbol(symbol, folder, bars[position - 1:position + step], since, PARAMS, data_dir)
+        update_seconds += time.perf_counter() - start
+        updates += 1
+        position += step
+
+    frame.to_csv(target, index=False)
+    start = time.perf_counter()
+    high, low = frame['high'].to_numpy(), frame['low'].to_numpy()
+    expected_dti = indicators.dti(high, low, *PARAMS)
+    weekly = indicators.seven_day_dti(high, low, *PARAMS)
+    full_seconds = time.perf_counter() - start
+
+    stored = indicator_state.read_series(symbol, folder, PARAMS, data_dir)
+    if list(stored['date']) != list(frame['date'].astype(str)):
+        return np.inf, full_seconds, update_seconds / max(updates, 1)
+    difference = max(max_difference(stored['dti'], expected_dti),
+                     max_difference(stored['daily_7day_dti'], weekly['daily_7day_dti']),
+                     max_difference(stored['previous_7day_dti'], weekly['previous_7day_dti']))
+    return difference, full_seconds, update_seconds / max(updates, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=100, help="Number of fixture symbols to check")
+    parser.add_argument("--new-bars", type=int, default=30, help="Bars appended through incremental updates")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data_dir = tempfile.mkdtemp(prefix="bt_indicators_")
+    try:
+        results = []
+        for folder in ("us_stocks", "ftse100"):
+            os.makedirs(os.path.join(data_dir, folder))
+            for symbol in fixture_symbols((folder,))[:args.symbols // 2]:
+                results.append((symbol,) + check_symbol(symbol, folder, data_dir, args.new_bars, rng))
+    finally:
+        shutil.rmtree(data_dir)
+
+    mismatched = [symbol for symbol, difference, _, _ in results if difference > 1e-9]
+    worst = max(difference for _, difference, _, _ in results)
+    full = np.mean([seconds for _, _, seconds, _ in results]) * 1000
+    update = np.mean([seconds for _, _, _, seconds in results]) * 1000
+    print(f"{len(results)} symbols, {args.new_bars} bars appended each through incremental updates")
+    print(f"  max |incremental - full recompute|  {worst:.3g}")
+    print(f"  full recompute (vectorized)         {full:7.3f} ms / symbol")
+    print(f"  incremental update incl. file I/O   {update:7.3f} ms / symbol")
+    print(f"  {len(mismatched)} symbols differ" + (f": {', '.join(mismatched[:10])}" if mismatched else ""))
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
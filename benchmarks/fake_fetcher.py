@@ -0,0 +1,41 @@
+"""Offline stand-in for fetch_stock_data used by the benchmarks.
+
+Simulates per-request network latency and transient failures so the ingest
+engines can be timed without touching Yahoo Finance.
+"""
+import os
+import random
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(REPO_DIR, "DATA")
+
+
+def fixture_symbols(index_folders=("ftse100", "us_stocks")):
+    """Symbols of the CSVs checked in under DATA/"""
+    symbols = []
+    for folder in index_folders:
+        path = os.path.join(FIXTURE_DIR, folder)
+        symbols.extend(sorted(name[:-4] for name in os.listdir(path) if name.endswith(".csv")))
+    return symbols
+
+
+class FakeFetcher:
+    """Callable with the fetch_stock_data signature that sleeps instead of fetching"""
+
+    def __init__(self, latency=0.05, jitter=0.02, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, force_update=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        return not fail
@@ -0,0 +1,75 @@
+"""Offline stand-in for the yfinance module used by the benchmarks.
+
+Serves the fixture CSVs under DATA/ through `Ticker(symbol).history(...)` and
+the multi-ticker `download(..., group_by='ticker')`, in the frame layout
+yfinance returns, and sleeps to simulate per-request network latency.
+
+    yahoo = FakeYahoo(latency=0.15)
+    sys.modules['yfinance'] = yahoo   # before importing fetch_stock_data
+"""
+import os
+import threading
+import time
+import pandas as pd
+from fake_fetcher import FIXTURE_DIR
+
+FOLDER_TIMEZONES = {"us_stocks": "America/New_York", "ftse100": "Europe/London", "nifty50": "Asia/Kolkata"}
+COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+
+def load_fixture(symbol):
+    """Fixture history of a symbol as a Ticker.history frame, or an empty frame"""
+    for folder, tz in FOLDER_TIMEZONES.items():
+        path = os.path.join(FIXTURE_DIR, folder, f"{symbol}.csv")
+        if os.path.exists(path):
+            frame = pd.read_csv(path).rename(columns=COLUMNS)
+            frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop('date'), utc=True).dt.tz_convert(tz),
+                                           name='Date')
+            return frame
+    return pd.DataFrame()
+
+
+class FakeYahoo:
+    """Module-like object with yfinance's Ticker and download entry points"""
+
+    def __init__(self, latency=0.15, per_symbol=0.002):
+        self.latency = latency
+        self.per_symbol = per_symbol
+        self.requests = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _request(self, symbols):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency + self.per_symbol * len(symbols))
+
+    def _history(self, symbol, start=None):
+        if symbol not in self._cache:
+            self._cache[symbol] = load_fixture(symbol)
+        frame = self._cache[symbol]
+        if start is not None and not frame.empty:
+            frame = frame[frame.index >= pd.Timestamp(start).tz_localize(frame.index.tz)]
+        return frame.copy()
+
+    def Ticker(self, symbol, session=None):
+        yahoo = self
+
+        class _Ticker:
+            def history(self, period="5y", interval="1d", start=None, **kwargs):
+                yahoo._request([symbol])
+                return yahoo._history(symbol, start)
+
+        return _Ticker()
+
+    def download(self, tickers, period="5y", interval="1d", start=None, group_by='column', **kwargs):
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        self._request(symbols)
+        frames = {symbol: self._history(symbol, start) for symbol in symbols}
+        columns = next((f.columns for f in frames.values() if not f.empty), pd.Index(list(COLUMNS.values())))
+        frames = {symbol: f if not f.empty else pd.DataFrame(columns=columns, dtype=float)
+                  for symbol, f in frames.items()}
+        if len(symbols) == 1:
+            return frames[symbols[0]]
+        # Union of all dates, NaN where a symbol has no bar
+        return pd.concat(frames, axis=1)
@@ -0,0 +1,460 @@
+"""Reproducible benchmark suite over the DATA/ fixtures, with a compare mode.
+
+Times the hot paths of the python/ pipeline against the checked-in
+DATA/ftse100 and DATA/us_stocks CSVs: CSV load, metadata lookups, indicator
+computation, single-symbol backtest, full-index scan, parameter sweeps,
+bootstrap and walk-forward robustness runs, portfolio mark-to-market of a
+synthetic trade journal, CLI start-up and module import times in a fresh
+interpreter, and the ingest path (per-symbol and bulk) against an offline FakeYahoo with no simulated latency, so every
+case measures our own code.
+
+Everything runs in a temporary workspace (fixture CSVs are symlinked, the
+ingest cases write copies), so DATA/ is never modified. Each case runs once
+to warm up and then --repeat times; the median is what compare mode uses.
+
+    python benchmarks/run_benchmarks.py                       # all cases -> benchmarks/results/<stamp>.json
+    python benchmarks/run_benchmarks.py --only backtest scan  # cases whose name contains a word
+    python benchmarks/run_benchmarks.py --compare base.json   # run, then flag regressions against base.json
+    python benchmarks/run_benchmarks.py --compare base.json new.json   # compare two saved results
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "python"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_fetcher import FIXTURE_DIR, fixture_symbols
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+FIXTURE_FOLDERS = ("ftse100", "us_stocks")
+REGRESSION_THRESHOLD = 0.10  # median slower than the baseline by more than this fraction
+INGEST_NEW_BARS = 5          # bars cut from each ingest CSV and fetched back
+
+
+def make_workspace(limit=None):
+    """Temporary DATA dir with the fixture CSVs symlinked in; config is pointed at it.
+
+    Only the first `limit` symbols of each folder are linked, so the cases
+    that walk a whole folder run on the same subset as the others. Must run
+    before any pipeline module is imported, since their default paths are
+    bound from config at import time. Returns (root, data_dir, {folder: symbols}).
+    """
+    root = tempfile.mkdtemp(prefix="bt_bench_")
+    data_dir = os.path.join(root, "DATA")
+    symbols = {folder: fixture_symbols((folder,))[:limit] for folder in FIXTURE_FOLDERS}
+    for folder in FIXTURE_FOLDERS:
+        os.makedirs(os.path.join(data_dir, folder))
+        for symbol in symbols[folder]:
+            name = f"{symbol}.csv"
+            os.symlink(os.path.join(FIXTURE_DIR, folder, name), os.path.join(data_dir, folder, name))
+    os.makedirs(os.path.join(root, "logs"))
+
+    import config
+    config.DATA_DIR = data_dir
+    config.METADATA_FILE = os.path.join(data_dir, "metadata.json")
+    config.LOG_DIR = os.path.join(root, "logs")
+    config.STOCK_LISTS_DIR = os.path.join(REPO_DIR, "js", "stock-lists")
+    return root, data_dir, symbols
+
+
+# --- Cases ---------------------------------------------------------------
+# Each case function gets the shared context and returns a dict with `run`
+# (timed), optional `prepare` (untimed, before every run), `items` and `unit`.
+
+def case_csv_load(ctx):
+    from price_store import read_csv_columns
+    paths = [os.path.join(ctx['data_dir'], folder, f"{symbol}.csv")
+             for folder in FIXTURE_FOLDERS for symbol in ctx['symbols'][folder]]
+    return {'run': lambda: [read_csv_columns(path) for path in paths], 'items': len(paths), 'unit': 'symbol'}
+
+
+def case_metadata_bulk(ctx):
+    import metadata_store
+    symbols = ctx['all_symbols']
+    return {'run': lambda: metadata_store.symbols_needing_update(symbols), 'items': len(symbols), 'unit': 'symbol'}
+
+
+def case_metadata_single(ctx):
+    import metadata_store
+    symbols = ctx['all_symbols'][:500]
+    return {'run': lambda: [metadata_store.get_symbol(symbol) for symbol in symbols],
+            'items': len(symbols), 'unit': 'lookup'}
+
+
+def case_indicators_symbol(ctx):
+    import indicators
+    series = ctx['series']
+
+    def run():
+        for columns in series:
+            indicators.dti(columns['high'], columns['low'], 14, 10, 5)
+            indicators.seven_day_dti(columns['high'], columns['low'], 14, 10, 5)
+    return {'run': run, 'items': len(series), 'unit': 'symbol'}
+
+
+def case_indicators_index(ctx):
+    import indicators
+    store = ctx['stores']['us_stocks']
+    return {'run': lambda: indicators.index_indicators(store), 'items': len(store), 'unit': 'symbol'}
+
+
+def case_backtest_symbol(ctx):
+    from backtest import run_backtest
+    columns = ctx['series'][0]
+    return {'run': lambda: run_backtest(columns['date'], columns['high'], columns['low'], columns['close']),
+            'items': 1, 'unit': 'symbol'}
+
+
+def case_scan_index(ctx):
+    import scanner
+    return {'run': lambda: scanner.scan_index('ftse100', workers=ctx['workers'], data_dir=ctx['data_dir']),
+            'items': len(ctx['stores']['ftse100']), 'unit': 'symbol'}
+
+
+def case_sweep_symbol(ctx):
+    from optimizer import find_optimal_parameters
+    columns = ctx['series'][0]
+    return {'run': lambda: find_optimal_parameters(columns['date'], columns['high'], columns['low'],
+                                                   columns['close']),
+            'items': 1, 'unit': 'symbol'}
+
+
+def case_sweep_index(ctx):
+    import optimizer
+    # One (r, s, u) with every exit combination keeps this under a minute on one core
+    ranges = {'r': [14], 's': [10], 'u': [5]}
+    return {'run': lambda: optimizer.optimize_index('ftse100', ranges, workers=ctx['workers'],
+                                                    data_dir=ctx['data_dir']),
+            'items': len(ctx['stores']['ftse100']), 'unit': 'symbol'}
+
+
+def case_bootstrap(ctx):
+    import numpy as np
+    import robustness
+    from backtest import run_backtest
+    returns = [np.array([t['plPercent'] for t in run_backtest(c['date'], c['high'], c['low'], c['close'])
+                         ['completedTrades']], dtype=np.float64) for c in ctx['series']]
+    return {'run': lambda: robustness.bootstrap_block(returns, robustness.RESAMPLES),
+            'items': len(returns), 'unit': 'symbol'}
+
+
+def case_walk_forward_index(ctx):
+    import robustness
+    ranges = {'r': [14], 's': [10], 'u': [5]}
+    return {'run': lambda: robustness.walk_forward_index('ftse100', ranges, workers=ctx['workers'],
+                                                         data_dir=ctx['data_dir']),
+            'items': len(ctx['stores']['ftse100']), 'unit': 'symbol'}
+
+
+def case_price_store_build(ctx):
+    from price_store import build_index_store, store_path
+
+    def prepare():
+        os.remove(store_path('ftse100', ctx['data_dir']))
+    def run():
+        with redirect_stdout(io.StringIO()):
+            build_index_store('ftse100', ctx['data_dir'])
+    return {'prepare': prepare, 'run': run, 'items': len(ctx['stores']['ftse100']), 'unit': 'symbol'}
+
+
+def _synthetic_trades(ctx, count):
+    """`count` trades of 1000 on random fixture symbols, a fifth of them still open (seeded)"""
+    import numpy as np
+    rng = np.random.default_rng(0)
+    trades = []
+    for folder, currency in (('us_stocks', '$'), ('ftse100', '£')):
+        store = ctx['stores'][folder]
+        symbols = [symbol for symbol in ctx['symbols'][folder] if store.header['symbols'][symbol]['count'] > 300]
+        for i in range(count // 2):
+            symbol = symbols[rng.integers(len(symbols))]
+            bars = store.get(symbol, ['date', 'close'])
+            entry = int(rng.integers(len(bars['date']) - 250, len(bars['date']) - 5))
+            exit_ = min(len(bars['date']) - 1, entry + int(rng.integers(1, 40)))
+            dates = np.datetime_as_string(bars['date'][[entry, exit_]].astype('datetime64[s]'))
+            trade = {'id': f"{folder}-{i}", 'symbol': symbol, 'status': 'active', 'currencySymbol': currency,
+                     'entryDate': f"{dates[0]}.000Z", 'entryPrice': float(bars['close'][entry]),
+                     'investmentAmount': 1000.0}
+            if rng.random() < 0.8:
+                exit_price = float(bars['close'][exit_])
+                trade.update(status='closed', exitDate=f"{dates[1]}.000Z", exitPrice=exit_price,
+                             plPercent=(exit_price / trade['entryPrice'] - 1) * 100,
+                             plValue=1000.0 * (exit_price / trade['entryPrice'] - 1))
+            trades.append(trade)
+    return trades
+
+
+def case_portfolio(ctx):
+    import portfolio
+    payload = {'trades': _synthetic_trades(ctx, 5000)}
+    return {'run': lambda: portfolio.analyze(payload, data_dir=ctx['data_dir'], use_cache=False),
+            'items': len(payload['trades']), 'unit': 'trade'}
+
+
+def _fresh_interpreter(ctx, args):
+    """Run python with `args` in a new process pointed at the workspace (start-up cost included)"""
+    env = dict(os.environ, BT_DATA_DIR=ctx['data_dir'], BT_LOG_DIR=ctx['log_dir'],
+               BT_STOCK_LISTS_DIR=os.path.join(REPO_DIR, "js", "stock-lists"))
+    def run():
+        subprocess.run([sys.executable] + args, cwd=os.path.join(REPO_DIR, "python"), env=env,
+                       stdout=subprocess.DEVNULL, check=False)
+    return run
+
+
+def case_cli_stale(ctx):
+    return {'run': _fresh_interpreter(ctx, ['cli.py', 'stale']), 'items': 1, 'unit': 'run'}
+
+
+def case_cli_status(ctx):
+    return {'run': _fresh_interpreter(ctx, ['cli.py', 'status']), 'items': 1, 'unit': 'run'}
+
+
+def case_import_pipeline(ctx):
+    # What `cli.py update` pays once there is something to fetch
+    return {'run': _fresh_interpreter(ctx, ['-c', 'import batch_processor']), 'items': 1, 'unit': 'run'}
+
+
+def _ingest_symbols(ctx):
+    count = ctx['ingest_symbols']
+    return ctx['symbols']['ftse100'][:count // 2] + ctx['symbols']['us_stocks'][:count - count // 2]
+
+
+def _truncate(ctx, symbols):
+    """Replace each symbol's CSV with a real copy missing its last bars"""
+    import symbol_registry
+    for symbol in symbols:
+        folder = symbol_registry.index_folder(symbol)
+        path = os.path.join(ctx['data_dir'], folder, f"{symbol}.csv")
+        with open(os.path.join(FIXTURE_DIR, folder, f"{symbol}.csv"), 'r') as f:
+            lines = f.readlines()
+        os.remove(path)
+        with open(path, 'w') as f:
+            f.writelines(lines[:-INGEST_NEW_BARS])
+
+
+def case_ingest_per_symbol(ctx):
+    import fetch_stock_data as fsd
+    symbols = _ingest_symbols(ctx)
+
+    def run():
+        with redirect_stdout(io.StringIO()):
+            ok = [fsd.fetch_stock_data(symbol, force_update=True, update_store=False) for symbol in symbols]
+        if not all(ok):
+            raise RuntimeError(f"Ingest failed for {ok.count(False)} symbols")
+    return {'prepare': lambda: _truncate(ctx, symbols), 'run': run, 'items': len(symbols), 'unit': 'symbol'}
+
+
+def case_ingest_bulk(ctx):
+    import fetch_stock_data as fsd
+    symbols = _ingest_symbols(ctx)
+
+    def run():
+        with redirect_stdout(io.StringIO()):
+            result = fsd.fetch_stock_data_bulk(symbols, force_update=True, update_store=False)
+        if result['failed']:
+            raise RuntimeError(f"Bulk ingest failed for {', '.join(result['failed'])}")
+    return {'prepare': lambda: _truncate(ctx, symbols), 'run': run, 'items': len(symbols), 'unit': 'symbol'}
+
+
+CASES = {
+    'csv_load': case_csv_load,
+    'metadata_bulk': case_metadata_bulk,
+    'metadata_single': case_metadata_single,
+    'indicators_symbol': case_indicators_symbol,
+    'indicators_index': case_indicators_index,
+    'backtest_symbol': case_backtest_symbol,
+    'scan_index': case_scan_index,
+    'sweep_symbol': case_sweep_symbol,
+    'sweep_index': case_sweep_index,
+    'bootstrap': case_bootstrap,
+    'walk_forward_index': case_walk_forward_index,
+    'price_store_build': case_price_store_build,
+    'portfolio': case_portfolio,
+    'cli_stale': case_cli_stale,
+    'cli_status': case_cli_status,
+    'import_pipeline': case_import_pipeline,
+    'ingest_per_symbol': case_ingest_per_symbol,
+    'ingest_bulk': case_ingest_bulk,
+}
+
+
+def build_context(data_dir, symbols, args):
+    """Shared fixtures: symbol lists, parsed series, price stores and seeded metadata"""
+    import config
+    import metadata_store
+    from price_store import build_index_store, open_store, read_csv_columns
+
+    all_symbols = [symbol for folder in FIXTURE_FOLDERS for symbol in symbols[folder]]
+
+    # Every symbol updated yesterday, so update checks go through the market-hours logic
+    yesterday = datetime.fromtimestamp(time.time() - 86400).isoformat()
+    metadata_store.set_symbols([(symbol, yesterday, 'success') for symbol in all_symbols])
+
+    series = [read_csv_columns(os.path.join(data_dir, "us_stocks", f"{symbol}.csv"))
+              for symbol in symbols['us_stocks'][:100]]
+    with redirect_stdout(io.StringIO()):
+        for folder in FIXTURE_FOLDERS:
+            build_index_store(folder, data_dir)
+    stores = {folder: open_store(folder, data_dir) for folder in FIXTURE_FOLDERS}
+    return {
+        'data_dir': data_dir,
+        'log_dir': config.LOG_DIR,
+        'symbols': symbols,
+        'all_symbols': all_symbols,
+        'series': series,
+        'stores': stores,
+        'workers': args.workers,
+        'ingest_symbols': args.ingest_symbols,
+    }
+
+
+def time_case(case, repeat):
+    """Warm-up run plus `repeat` timed runs; returns the stats saved in the results file"""
+    runs = []
+    for i in range(repeat + 1):
+        if case.get('prepare'):
+            case['prepare']()
+        start = time.perf_counter()
+        case['run']()
+        elapsed = time.perf_counter() - start
+        if i > 0:
+            runs.append(elapsed)
+    median = statistics.median(runs)
+    return {
+        'runs': [round(r, 6) for r in runs],
+        'min': round(min(runs), 6),
+        'median': round(median, 6),
+        'mean': round(statistics.mean(runs), 6),
+        'stdev': round(statistics.stdev(runs), 6) if len(runs) > 1 else 0.0,
+        'items': case['items'],
+        'unit': case['unit'],
+        'msPerItem': round(median * 1000 / case['items'], 4),
+    }
+
+
+def environment():
+    import numpy as np
+    import pandas as pd
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_suite(args):
+    root, data_dir, symbols = make_workspace(args.symbols or None)
+    # Keep fetch_stock_data from configuring its file log handler
+    logging.basicConfig(level=logging.CRITICAL)
+    from fake_yahoo import FakeYahoo
+    sys.modules['yfinance'] = FakeYahoo(latency=0, per_symbol=0)
+
+    names = [name for name in CASES if not args.only or any(word in name for word in args.only)]
+    results = {}
+    try:
+        start = time.perf_counter()
+        ctx = build_context(data_dir, symbols, args)
+        print(f"Fixtures ready in {time.perf_counter() - start:.1f}s "
+              f"({len(ctx['all_symbols'])} symbols, workspace {root})")
+        for name in names:
+            results[name] = time_case(CASES[name](ctx), args.repeat)
+            stats = results[name]
+            print(f"  {name:<20} median {stats['median'] * 1000:10.1f} ms   "
+                  f"{stats['msPerItem']:9.3f} ms/{stats['unit']}   (±{stats['stdev'] * 1000:.1f} ms)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        'generatedAt': datetime.now().isoformat(),
+        'environment': environment(),
+        'options': {'repeat': args.repeat, 'symbols': args.symbols, 'workers': args.workers,
+                    'ingestSymbols': args.ingest_symbols},
+        'cases': results,
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print the median change of every shared case; returns the names that regressed"""
+    regressions = []
+    print(f"{'case':<20} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name, stats in current['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            print(f"{name:<20} {'-':>12} {stats['median'] * 1000:12.1f}      new")
+            continue
+        if base['items'] != stats['items']:
+            print(f"{name:<20} skipped: {base['items']} vs {stats['items']} {stats['unit']}s")
+            continue
+        change = stats['median'] / base['median'] - 1 if base['median'] > 0 else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<20} {base['median'] * 1000:12.1f} {stats['median'] * 1000:12.1f} {change:+7.1%}{flag}")
+    if baseline.get('environment') != current.get('environment'):
+        print("Note: environments differ (" + ", ".join(
+            f"{key} {baseline.get('environment', {}).get(key)} -> {value}"
+            for key, value in current.get('environment', {}).items()
+            if baseline.get('environment', {}).get(key) != value) + ")")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", metavar="WORD", help="Run only cases whose name contains a word")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (after one warm-up)")
+    parser.add_argument("--symbols", type=int, help="Limit each fixture folder to its first N symbols")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Process-pool size for scan/sweep")
+    parser.add_argument("--ingest-symbols", type=int, default=50, help="Symbols refreshed by the ingest cases")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="FILE",
+                        help="Baseline results; with a second file, compare the two without running")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Median slowdown that counts as a regression (fraction)")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 1:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+    else:
+        baseline = None
+        if args.compare:
+            with open(args.compare[0]) as f:
+                baseline = json.load(f)
+        current = run_suite(args)
+        output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, current, args.threshold)
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}"
+              + (f": {', '.join(regressions)}" if regressions else ""))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
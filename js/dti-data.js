@@ -144,6 +144,22 @@ window.DTIData = (function() {
         return uniqueStocks;
     }
     
+    // Content-hashed bundles written by python/export_bundles.py and served by
+    // the backend at /bundles; set window.BT88_API_BASE when it runs on another origin
+    const BUNDLES_BASE = ((typeof window !== 'undefined' && window.BT88_API_BASE) || '') + '/bundles';
+    
+    // Bundle manifest, fetched once per page load (null when no bundles were exported)
+    let bundleManifestPromise = null;
+    
+    function loadBundleManifest() {
+        if (!bundleManifestPromise) {
+            bundleManifestPromise = fetch(`${BUNDLES_BASE}/manifest.json`, { cache: 'no-cache' })
+                .then(response => response.ok ? response.json() : null)
+                .catch(() => null);
+        }
+        return bundleManifestPromise;
+    }
+    
     /**
      * Load data from local CSV file
      * @param {string} symbol - Stock symbol
@@ -151,6 +167,17 @@ window.DTIData = (function() {
      */
     async function loadLocalCSV(symbol) {
         try {
+            // Prefer the symbol's bundle: trimmed, and cacheable forever under its hashed name
+            const manifest = await loadBundleManifest();
+            const bundle = manifest && manifest.symbols ? manifest.symbols[symbol] : null;
+            if (bundle) {
+                const response = await fetch(`${BUNDLES_BASE}/${bundle.path}`);
+                if (response.ok) {
+                    const lines = (await response.text()).trim().split('\n');
+                    return lines.map(line => line.split(','));
+                }
+            }
+
             // Determine which folder to look in based on symbol
             let folder = '';
             if (symbol.endsWith('.NS')) {
@@ -53,6 +53,10 @@ const TradeCore = (function() {
     
     const PRICE_UPDATE_INTERVAL = 60000; // Update prices every 60 seconds
     const MAX_RETRIES = 3; // Maximum retries for fetching data
+    // Bulk quote endpoint of the backend; set window.BT88_API_BASE when it runs on another origin
+    const QUOTES_ENDPOINT = ((typeof window !== 'undefined' && window.BT88_API_BASE) || '') + '/api/quotes';
+    // Server-side mark-to-market analytics of the trade history (python/portfolio.py)
+    const PORTFOLIO_ENDPOINT = ((typeof window !== 'undefined' && window.BT88_API_BASE) || '') + '/api/portfolio/analytics';
     
     /**
      * Initialize the trade management system
@@ -181,7 +185,7 @@ const TradeCore = (function() {
     
     /**
      * Update current prices for active trades
-     * Uses Yahoo Finance API via CORS proxy
+     * Uses the backend quote endpoint, falling back to Yahoo Finance via CORS proxy
      */
     async function updatePrices() {
         if (activeTrades.length === 0) return;
@@ -204,12 +208,21 @@ const TradeCore = (function() {
         let errorCount = 0;
         
         try {
+            // One round trip for every symbol; per-symbol fetches only if the backend is unavailable
+            const quotes = await fetchQuotes(symbols);
+            
             for (const symbol of symbols) {
                 const trades = activeTrades.filter(trade => trade.symbol === symbol);
                 if (trades.length === 0) continue;
                 
                 try {
-                    const price = await fetchCurrentPrice(symbol);
+                    let price;
+                    if (quotes) {
+                        // Keep the last known price for symbols the backend has no quote for
+                        price = quotes[symbol] ? quotes[symbol].price : trades[0].currentPrice;
+                    } else {
+                        price = await fetchCurrentPrice(symbol);
+                    }
                     
                     if (price) {
                         // Update all trades with this symbol
@@ -300,6 +313,37 @@ const TradeCore = (function() {
         }
     }
     
+    /**
+     * Fetch latest prices for many symbols in one request to the backend quote cache
+     * @param {Array<string>} symbols - Stock symbols
+     * @returns {Promise<Object|null>} - Map of symbol to quote ({price, time, ...} or null), or null if the backend is unavailable
+     */
+    async function fetchQuotes(symbols) {
+        try {
+            const url = `${QUOTES_ENDPOINT}?symbols=${encodeURIComponent(symbols.join(','))}`;
+            const response = await fetch(url);
+            
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            
+            const data = await response.json();
+            if (!data.quotes) {
+                throw new Error('No quotes in response');
+            }
+            
+            // The backend upper-cases symbols; map quotes back to the trade symbols
+            const quotes = {};
+            symbols.forEach(symbol => {
+                quotes[symbol] = data.quotes[symbol.toUpperCase()] || null;
+            });
+            return quotes;
+        } catch (error) {
+            console.warn('Bulk quote request failed, fetching prices one by one:', error);
+            return null;
+        }
+    }
+    
     /**
      * Fetch current price for a symbol with retry logic
      * @param {string} symbol - Stock symbol
@@ -2001,6 +2045,34 @@ const TradeCore = (function() {
         }));
     }
     
+    /**
+     * Daily equity, drawdown and exposure curves per currency, marked to market on the backend
+     * @param {Object} options - Optional { capital, riskFree } (capital defaults to the peak amount invested)
+     * @returns {Promise<Object|null>} - { currencies: { [currencySymbol]: { stats, curves, openPositions, ... } } }, or null if the backend is unavailable
+     */
+    async function fetchPortfolioAnalytics(options = {}) {
+        try {
+            const params = new URLSearchParams();
+            if (options.capital) params.set('capital', options.capital);
+            if (options.riskFree !== undefined) params.set('riskFree', options.riskFree);
+            const query = params.toString();
+            
+            const response = await fetch(PORTFOLIO_ENDPOINT + (query ? `?${query}` : ''), {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ trades: allTrades })
+            });
+            
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return await response.json();
+        } catch (error) {
+            console.warn('Portfolio analytics request failed:', error);
+            return null;
+        }
+    }
+    
     /**
      * Get advanced trading metrics
      * @returns {Object} - Complete set of trading metrics
@@ -2169,6 +2241,7 @@ const TradeCore = (function() {
         getStreakInfo,
         getHoldingPeriodStats,
         getAdvancedMetrics,
+        fetchPortfolioAnalytics,
         
         // Visualization data methods
         getEquityCurveData,
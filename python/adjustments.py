@@ -0,0 +1,97 @@
+"""Back-adjustment of stored price history for new splits and dividends.
+
+Downloads are auto-adjusted by yfinance: every bar's OHLC is scaled for
+the splits and dividends after it, and volumes for the splits. The CSVs
+therefore hold adjusted prices, as of the day they were downloaded. When an
+incremental download brings a new split or dividend, every stored bar
+before it has to be scaled once more. Rather than downloading the whole
+history again, the factors are computed here from the new bars' action
+columns in one reverse cumulative pass and applied to the stored rows of
+that one symbol.
+
+The download starts at the last stored bar, which Yahoo returns adjusted
+for the new actions; its stored and downloaded close give the factor Yahoo
+itself applied. The stored history is only rescaled locally when that
+agrees with the computed factor within ADJUSTMENT_TOLERANCE, so a
+revision of older bars still falls back to a full re-pull.
+"""
+import numpy as np
+import pandas as pd
+
+# Largest relative difference between Yahoo's and the computed price factor
+ADJUSTMENT_TOLERANCE = 0.002
+
+# Stored CSV column -> Ticker.history column
+HISTORY_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+
+def back_adjustment(close, dividends, splits):
+    """Factors that back-adjust each bar for the actions on the bars after it.
+
+    Returns (price_factors, volume_factors). A split of ratio r on bar j
+    divides the prices of every earlier bar by r and multiplies their
+    volume by r; a dividend D divides them by (1 - D / close[j-1]), as
+    Yahoo's adjusted close does. Actions on the first bar adjust nothing
+    in the series (they only affect bars before it).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    dividends = np.nan_to_num(np.asarray(dividends, dtype=np.float64))
+    splits = np.nan_to_num(np.asarray(splits, dtype=np.float64))
+    previous_close = np.concatenate([[np.nan], close[:-1]])
+
+    split_step = np.where(splits > 0, splits, 1.0)
+    dividend_step = np.where(dividends > 0, 1.0 - dividends / previous_close, 1.0)
+    price_step = dividend_step / split_step
+    price_step[0] = split_step[0] = 1.0
+
+    # factor[i] = product of the steps of bars i+1 .. n-1
+    price = np.append(np.cumprod(price_step[:0:-1])[::-1], 1.0)
+    volume = np.append(np.cumprod(split_step[:0:-1])[::-1], 1.0)
+    return price, volume
+
+
+def read_history(file_path, tz=None):
+    """A stored CSV as a Ticker.history frame (DatetimeIndex in `tz`, OHLCV and actions)"""
+    stored = pd.read_csv(file_path).rename(columns=HISTORY_COLUMNS)
+    dates = pd.to_datetime(stored.pop('date'), utc=True)
+    stored.index = pd.DatetimeIndex(dates.dt.tz_convert(tz) if tz is not None else dates.dt.tz_localize(None),
+                                    name='Date')
+    return stored
+
+
+def adjust_stored_history(file_path, data, last_date):
+    """Full history of a symbol with its stored bars re-adjusted for the new ones.
+
+    `data` is an incremental download starting at the stored `last_date`
+    and carrying a new split or dividend. Returns the stored bars before
+    `last_date`, rescaled, followed by `data`, in the Ticker.history
+    layout; or None when the download does not start at the stored last
+    bar or Yahoo's factor disagrees with the computed one.
+    """
+    start = pd.Timestamp(last_date)
+    window = data[data.index >= start]
+    if window.empty or window.index[0] != start:
+        return None
+    zeros = np.zeros(len(window))
+    price_factors, volume_factors = back_adjustment(
+        window['Close'].to_numpy(dtype=np.float64),
+        window['Dividends'].to_numpy(dtype=np.float64) if 'Dividends' in window.columns else zeros,
+        window['Stock Splits'].to_numpy(dtype=np.float64) if 'Stock Splits' in window.columns else zeros)
+
+    stored = read_history(file_path, data.index.tz)
+    if stored.empty or stored.index[-1] != start:
+        return None
+    stored_close = float(stored['Close'].iloc[-1])
+    observed = float(window['Close'].iloc[0]) / stored_close if stored_close else np.nan
+    if not np.isfinite(observed) or abs(observed / price_factors[0] - 1) > ADJUSTMENT_TOLERANCE:
+        return None
+
+    history = stored.iloc[:-1].copy()
+    price_columns = [name for name in PRICE_COLUMNS if name in history.columns]
+    history[price_columns] = history[price_columns].to_numpy(dtype=np.float64) * observed
+    if 'Volume' in history.columns and volume_factors[0] != 1.0:
+        volume = np.nan_to_num(history['Volume'].to_numpy(dtype=np.float64)) * volume_factors[0]
+        history['Volume'] = np.round(volume).astype(window['Volume'].dtype if 'Volume' in window.columns
+                                                    else np.int64)
+    return pd.concat([history, window])
@@ -0,0 +1,240 @@
+"""DTI strategy backtest, ported from js/dti-backtest.js.
+
+Dates are int64 local wall-clock epoch seconds, as stored by price_store.
+Trade and metrics dicts keep the camelCase keys of the JS objects so results
+can be handed to the frontend unchanged. Parameters are passed explicitly
+instead of being read from the DOM.
+"""
+import math
+from datetime import date, timedelta
+import numpy as np
+import indicators
+
+SECONDS_PER_DAY = 86400
+WARMUP_MONTHS = 6
+MIN_TRADES_FOR_CONVICTION = 3
+
+# Defaults of the backtester form in index.html
+DEFAULT_PARAMS = {
+    'r': 14,
+    's': 10,
+    'u': 5,
+    'entryThreshold': 0,
+    'takeProfitPercent': 8,
+    'stopLossPercent': 5,
+    'maxHoldingDays': 30,
+    'enable7DayDTI': True,
+}
+
+_EPOCH = date(1970, 1, 1)
+
+
+def add_months(timestamp, months):
+    """Add calendar months with JS Date.setMonth overflow (Aug 31 + 6 -> Mar 3)"""
+    timestamp = int(timestamp)
+    day = _EPOCH + timedelta(days=timestamp // SECONDS_PER_DAY)
+    month_index = day.month - 1 + months
+    shifted = date(day.year + month_index // 12, month_index % 12 + 1, 1) + timedelta(days=day.day - 1)
+    return (shifted - _EPOCH).days * SECONDS_PER_DAY + timestamp % SECONDS_PER_DAY
+
+
+def warmup_end(first_date):
+    """First date on which trades may be entered"""
+    return add_months(first_date, WARMUP_MONTHS)
+
+
+def format_date(timestamp):
+    """Render an epoch-seconds date as YYYY-MM-DD (with time for intraday bars)"""
+    text = str(np.datetime64(int(timestamp), 's'))
+    return text[:10] if text.endswith('T00:00:00') else text.replace('T', ' ')
+
+
+def parse_date(text):
+    """Epoch seconds of a format_date string"""
+    return int(np.datetime64(text.replace(' ', 'T'), 's').astype(np.int64))
+
+
+def _value(x):
+    """NaN -> None so results serialize like the JS nulls"""
+    x = float(x)
+    return None if math.isnan(x) else x
+
+
+def backtest_with_active_detection(dates, prices, dti, seven_day, params=None, active_trade=None,
+                                   earliest=None):
+    """Run the strategy on one symbol (JS `backtestWithActiveDetection`).
+
+    `seven_day` is the dict returned by indicators.seven_day_dti. Holding
+    days are counted in local calendar days, so DST changes never shorten a
+    trade by one day as the JS Date arithmetic can.
+
+    `active_trade` and `earliest` resume an earlier run: the trade open
+    after dates[0] (not modified) and the warm-up end of the whole history.
+
+    Returns {'completedTrades': [...], 'activeTrade': trade or None}.
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    dates = np.asarray(dates, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    dti = np.asarray(dti, dtype=np.float64)
+    if len(dates) == 0 or len(dates) != len(prices) or len(dates) != len(dti):
+        return {'completedTrades': [], 'activeTrade': None}
+
+    if earliest is None:
+        earliest = warmup_end(dates[0])
+    # Plain lists: element access in the bar loop is much cheaper than on arrays
+    dates, prices, dti = dates.tolist(), prices.tolist(), dti.tolist()
+    daily_7day = np.asarray(seven_day['daily_7day_dti'], dtype=np.float64).tolist()
+    previous_7day = np.asarray(seven_day['previous_7day_dti'], dtype=np.float64).tolist()
+
+    completed_trades = []
+    active_trade = dict(active_trade) if active_trade else None
+    entry_date = parse_date(active_trade['entryDate']) if active_trade else None
+
+    for i in range(1, len(dti)):
+        current_price = prices[i]
+        current_dti = dti[i]
+
+        if active_trade:
+            holding_days = int((dates[i] - entry_date) // SECONDS_PER_DAY)
+            pl_percent = (current_price - active_trade['entryPrice']) / active_trade['entryPrice'] * 100
+
+            active_trade['currentPrice'] = current_price
+            active_trade['currentPlPercent'] = pl_percent
+            active_trade['holdingDays'] = holding_days
+
+            # Check exit conditions: take profit, stop loss, or time-based exit
+            if pl_percent >= p['takeProfitPercent']:
+                exit_reason = 'Take Profit'
+            elif pl_percent <= -p['stopLossPercent']:
+                exit_reason = 'Stop Loss'
+            elif holding_days >= p['maxHoldingDays']:
+                exit_reason = 'Time Exit'
+            else:
+                continue
+
+            active_trade.update({
+                'exitDate': format_date(dates[i]),
+                'exitPrice': current_price,
+                'plPercent': pl_percent,
+                'exitReason': exit_reason,
+            })
+            completed_trades.append(active_trade)
+            active_trade = None
+        else:
+            seven_day_condition_met = True
+            previous = previous_7day[i]
+            if p['enable7DayDTI'] and not math.isnan(previous):
+                seven_day_condition_met = daily_7day[i] > previous
+
+            if (current_dti < p['entryThreshold'] and
+                    current_dti > dti[i - 1] and
+                    seven_day_condition_met and
+                    dates[i] >= earliest):
+                entry_date = dates[i]
+                active_trade = {
+                    'entryDate': format_date(dates[i]),
+                    'entryPrice': current_price,
+                    'currentPrice': current_price,
+                    'entryDTI': current_dti,
+                    'entry7DayDTI': _value(daily_7day[i]),
+                    'currentPlPercent': 0,
+                    'holdingDays': 0,
+                }
+
+    return {'completedTrades': completed_trades, 'activeTrade': active_trade}
+
+
+def run_backtest(dates, high, low, close, params=None):
+    """Compute indicators for one symbol and backtest it"""
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    dti = indicators.dti(high, low, p['r'], p['s'], p['u'])
+    seven_day = indicators.seven_day_dti(high, low, p['r'], p['s'], p['u'])
+    return backtest_with_active_detection(dates, close, dti, seven_day, p)
+
+
+def get_conviction_level(win_rate, total_trades):
+    """Conviction level from win rate and trade count (JS `getConvictionLevel`)"""
+    if not total_trades or total_trades < MIN_TRADES_FOR_CONVICTION:
+        return 'insufficient-data'
+    if win_rate > 75:
+        return 'high-conviction'
+    if win_rate >= 50:
+        return 'moderate-conviction'
+    return 'low-conviction'
+
+
+def empty_metrics():
+    return {
+        'totalTrades': 0,
+        'winningTrades': 0,
+        'losingTrades': 0,
+        'winRate': 0,
+        'avgProfit': 0,
+        'totalReturn': 0,
+        'profitFactor': 0,
+        'maxDrawdown': 0,
+        'avgHoldingPeriod': 0,
+        'takeProfitCount': 0,
+        'stopLossCount': 0,
+        'timeExitCount': 0,
+        'endOfDataCount': 0,
+        'convictionLevel': 'insufficient-data',
+    }
+
+
+def calculate_performance_metrics(trades, include_equity_curve=True):
+    """Performance metrics of completed trades (JS `calculatePerformanceMetrics`)"""
+    if not trades:
+        return empty_metrics()
+
+    completed = [t for t in trades if t.get('exitDate') and t.get('exitReason')]
+    returns = np.array([t['plPercent'] for t in completed], dtype=np.float64)
+    holding = np.array([
+        (np.datetime64(t['exitDate'][:10], 'D') - np.datetime64(t['entryDate'][:10], 'D')).astype(int)
+        for t in completed
+    ], dtype=np.float64)
+    reasons = [t['exitReason'] for t in completed]
+
+    metrics = metrics_from_returns(returns, holding, include_equity_curve)
+    metrics['takeProfitCount'] = reasons.count('Take Profit')
+    metrics['stopLossCount'] = reasons.count('Stop Loss')
+    metrics['timeExitCount'] = reasons.count('Time Exit')
+    metrics['endOfDataCount'] = reasons.count('End of Data')
+    return metrics
+
+
+def metrics_from_returns(returns, holding_days, include_equity_curve=True):
+    """Return-based metrics shared by the backtest and the sweep engine"""
+    total_trades = len(returns)
+    wins = returns > 0
+    gross_profit = float(returns[wins].sum())
+    gross_loss = float(np.abs(returns[~wins]).sum())
+    total_profit = float(returns.sum())
+
+    # Equity starts at 100, but as in the JS code the peak starts at 0
+    equity_curve = 100 * np.cumprod(1 + returns / 100)
+    peaks = np.maximum.accumulate(equity_curve) if total_trades else equity_curve
+    drawdowns = (peaks - equity_curve) / peaks * 100 if total_trades else equity_curve
+
+    win_rate = wins.sum() / total_trades * 100 if total_trades else 0
+    if gross_loss > 0:
+        profit_factor = gross_profit / gross_loss
+    else:
+        profit_factor = math.inf if gross_profit > 0 else 0
+
+    metrics = {
+        'totalTrades': total_trades,
+        'winningTrades': int(wins.sum()),
+        'losingTrades': int(total_trades - wins.sum()),
+        'winRate': float(win_rate),
+        'avgProfit': total_profit / total_trades if total_trades else 0,
+        'totalReturn': total_profit,
+        'profitFactor': profit_factor,
+        'maxDrawdown': float(drawdowns.max()) if total_trades else 0,
+        'avgHoldingPeriod': float(holding_days.sum() / total_trades) if total_trades else 0,
+        'convictionLevel': get_conviction_level(win_rate, total_trades),
+    }
+    if include_equity_curve:
+        metrics['equityCurve'] = [100.0] + equity_curve.tolist()
+    return metrics
@@ -1,21 +1,67 @@
 import time
 import json
 import os
-from fetch_stock_data import fetch_stock_data
+import sys
+from functools import partial
+from fetch_stock_data import fetch_stock_data, fetch_stock_data_bulk, get_index_folder
+from price_store import build_index_store
+from export_bundles import export_bundles
+import metadata_store
+import signals_store
+import metrics
+import symbol_registry
+from config import LOG_DIR, configure_logging
 from stock_lists import get_stock_list
+from concurrent_ingest import process_symbols_concurrent, MAX_WORKERS
 
 # Configuration
-MAX_RETRIES = 3
 DELAY_BETWEEN_STOCKS = 1  # seconds
+METRICS_DIR = os.path.join(LOG_DIR, "metrics")  # run reports (JSON + Prometheus text)
 
-def process_batch(index_name, force_update=False):
-    """Process all stocks in a given index"""
-    stocks = get_stock_list(index_name)
+def process_batch(index_name, force_update=False, concurrent=False, max_workers=MAX_WORKERS,
+                  bulk=False, stocks=None):
+    """Process all stocks in a given index, or the given `stocks` in their order"""
+    if stocks is None:
+        stocks = get_stock_list(index_name)
     
     if not stocks:
         print(f"No stocks found for index: {index_name}")
         return
         
+    if not force_update:
+        # One batched metadata query instead of a lookup per symbol
+        with metrics.stage('update_check'):
+            stale = metadata_store.symbols_needing_update(stocks)
+        skipped = len(stocks) - len(stale)
+        print(f"{skipped} of {len(stocks)} symbols in {index_name} are up-to-date")
+        stocks = stale
+    else:
+        skipped = 0
+        
+    if bulk:
+        print(f"Starting bulk batch process for {index_name} ({len(stocks)} stocks)")
+        start = time.monotonic()
+        bulk_result = fetch_stock_data_bulk(stocks, force_update=True, update_store=False)
+        elapsed = time.monotonic() - start
+        result = {
+            "total": len(stocks),
+            "success": len(bulk_result['success']),
+            "failed": len(bulk_result['failed']),
+            "failed_symbols": bulk_result['failed'],
+            "requests": bulk_result['requests'],
+            "elapsed": elapsed,
+            "symbols_per_second": len(stocks) / elapsed if elapsed > 0 else 0.0
+        }
+        print(f"Used {bulk_result['requests']} download requests for {len(stocks)} symbols")
+        return finish_batch(index_name, stocks, result, skipped)
+        
+    if concurrent:
+        print(f"Starting concurrent batch process for {index_name} ({len(stocks)} stocks, {max_workers} workers)")
+        fetcher = partial(fetch_stock_data, update_store=False)
+        result = process_symbols_concurrent(stocks, fetcher, force_update=True,
+                                            max_workers=max_workers)
+        return finish_batch(index_name, stocks, result, skipped)
+        
     total = len(stocks)
     success_count = 0
     failure_count = 0
@@ -27,31 +73,74 @@ def process_batch(index_name, force_update=False):
         
         # Add delay to avoid rate limiting
         if i > 0:
-            time.sleep(DELAY_BETWEEN_STOCKS)
+            with metrics.stage('throttle_sleep'):
+                time.sleep(DELAY_BETWEEN_STOCKS)
             
-        success = fetch_stock_data(stock, force_update=force_update)
+        success = fetch_stock_data(stock, force_update=True, update_store=False)
         
         if success:
             success_count += 1
         else:
             failure_count += 1
-            # Retry logic could be added here
             
-    print(f"\nBatch processing complete for {index_name}:")
-    print(f"Total symbols: {total}")
-    print(f"Successfully processed: {success_count}")
-    print(f"Failed: {failure_count}")
-    
-    return {
+    result = {
         "total": total,
         "success": success_count,
         "failed": failure_count
     }
     
-def process_all_indices(force_update=False):
+    return finish_batch(index_name, stocks, result, skipped)
+
+def finish_batch(index_name, stocks, result, skipped=0):
+    """Count skipped symbols as successes, print the summary and refresh derived files"""
+    result["total"] += skipped
+    result["success"] += skipped
+    print_summary(index_name, result)
+    folders = refresh_price_stores(stocks)
+    try:
+        with metrics.stage('bundle_export'):
+            export_bundles(folders)
+    except Exception as e:
+        print(f"Error exporting bundles: {e}")
+    try:
+        with metrics.stage('metadata_export'):
+            metadata_store.export_json()
+    except Exception as e:
+        print(f"Error exporting metadata.json: {e}")
+    try:
+        with metrics.stage('signals_export'):
+            signals_store.export_json()
+    except Exception as e:
+        print(f"Error exporting signals.json: {e}")
+    return result
+
+def refresh_price_stores(symbols):
+    """Rebuild the columnar store of every index folder the symbols were written to.
+
+    Returns the folders whose store was rebuilt.
+    """
+    folders = []
+    for folder in sorted({get_index_folder(symbol) for symbol in symbols}):
+        try:
+            with metrics.stage('price_store'):
+                build_index_store(folder)
+            folders.append(folder)
+        except Exception as e:
+            print(f"Error building price store for {folder}: {e}")
+    return folders
+
+def print_summary(index_name, result):
+    """Print the end-of-batch success/failure summary"""
+    print(f"\nBatch processing complete for {index_name}:")
+    print(f"Total symbols: {result['total']}")
+    print(f"Successfully processed: {result['success']}")
+    print(f"Failed: {result['failed']}")
+    if 'symbols_per_second' in result:
+        print(f"Throughput: {result['symbols_per_second']:.2f} symbols/s over {result['elapsed']:.1f}s")
+
+def process_all_indices(force_update=False, concurrent=False, max_workers=MAX_WORKERS, bulk=False):
     """Process all stock indices"""
-    indices = ["nifty50", "niftyNext50", "niftyMidcap150", 
-              "ftse100", "ftse250", "usStocks"]
+    indices = symbol_registry.REFRESHED_LISTS
     
     results = {}
     
@@ -60,23 +149,57 @@ def process_all_indices(force_update=False):
         print(f"Processing index: {index}")
         print(f"{'='*50}\n")
         
-        result = process_batch(index, force_update)
+        result = process_batch(index, force_update, concurrent, max_workers, bulk)
         results[index] = result
         
-        # Add delay between indices
-        time.sleep(3)
+        # Add delay between indices (the rate limiter already paces concurrent runs)
+        if not concurrent:
+            time.sleep(3)
         
     print("\nAll indices processed")
     return results
     
+def write_run_report(results, metrics_dir=METRICS_DIR):
+    """Save the run's stage timings and counters and print the slowest stages"""
+    extra = {'command': sys.argv, 'results': {
+        index: {key: value for key, value in (result or {}).items() if key != 'failed_symbols'}
+        for index, result in results.items()
+    }}
+    try:
+        json_path, prom_path = metrics.write_report(metrics_dir, extra=extra)
+    except OSError as e:
+        print(f"Error writing run report: {e}")
+        return
+    print(f"\n{metrics.summary(metrics.METRICS.report())}")
+    print(f"Run report: {json_path} (Prometheus: {prom_path})")
+
 if __name__ == "__main__":
-    import sys
+    # Usage: batch_processor.py [index] [force] [--concurrent] [--workers=N] [--bulk]
+    #                           [--metrics-dir=DIR] [--profile=FILE.prof] [--trace-memory]
+    configure_logging()
+    args = [arg for arg in sys.argv[1:] if arg]
+    concurrent = "--concurrent" in args
+    bulk = "--bulk" in args
+    trace_memory = "--trace-memory" in args  # per-stage peak memory; slows the run down
+    max_workers = MAX_WORKERS
+    metrics_dir = METRICS_DIR
+    profile_path = None
+    for arg in args:
+        if arg.startswith("--workers="):
+            max_workers = int(arg.split("=", 1)[1])
+        elif arg.startswith("--metrics-dir="):
+            metrics_dir = arg.split("=", 1)[1]
+        elif arg.startswith("--profile="):
+            profile_path = arg.split("=", 1)[1]
+    args = [arg for arg in args if not arg.startswith("--")]
     
-    # Check for command line arguments
-    if len(sys.argv) > 1:
-        index_name = sys.argv[1]
-        force_update = len(sys.argv) > 2 and sys.argv[2].lower() == "force"
-        process_batch(index_name, force_update)
-    else:
-        # Process all indices
-        process_all_indices()
\ No newline at end of file
+    with metrics.profile(profile_path), metrics.trace_memory(trace_memory):
+        # Check for command line arguments
+        if args:
+            index_name = args[0]
+            force_update = len(args) > 1 and args[1].lower() == "force"
+            results = {index_name: process_batch(index_name, force_update, concurrent, max_workers, bulk)}
+        else:
+            # Process all indices
+            results = process_all_indices(concurrent=concurrent, max_workers=max_workers, bulk=bulk)
+    write_run_report(results, metrics_dir)
@@ -0,0 +1,50 @@
+"""Per-symbol frames of a multi-ticker yf.download (group_by='ticker').
+
+Shared by python/fetch_stock_data.py, and by backend/fetch_stock_data.py
+and backend/quote_service.py through backend/shared.py.
+"""
+import pandas as pd
+
+# A row with no prices is kept when one of these is non-zero (Ticker.history
+# returns such rows for some splits), so has_corporate_action still sees it
+ACTION_COLUMNS = ('Dividends', 'Stock Splits')
+
+
+def split_bulk_frame(wide, symbols):
+    """Split a group_by='ticker' download into {symbol: frame}, leaving out missing symbols"""
+    return {symbol: frame for symbol, frame in iter_bulk_frames(wide, symbols) if frame is not None}
+
+
+def iter_bulk_frames(wide, symbols):
+    """Yield (symbol, frame) for each of `symbols`, frame None if it is missing.
+
+    The union of all symbols' dates is the wide index, so each symbol keeps
+    only the rows where it has a close or a corporate action; that mask is
+    computed for every symbol at once, and frames are cut one by one as they
+    are consumed.
+    """
+    if wide is None or wide.empty:
+        for symbol in symbols:
+            yield symbol, None
+        return
+    if not isinstance(wide.columns, pd.MultiIndex):
+        # Single-ticker downloads come back with flat columns
+        wide = pd.concat({symbols[0]: wide}, axis=1)
+    present = wide.xs('Close', axis=1, level=1).notna()
+    for column in ACTION_COLUMNS:
+        if column in wide.columns.get_level_values(1):
+            present |= wide.xs(column, axis=1, level=1).fillna(0).ne(0)
+    for symbol in symbols:
+        if symbol not in present.columns or not present[symbol].any():
+            yield symbol, None
+            continue
+        frame = wide[symbol].loc[present[symbol]].copy()
+        frame.columns.name = None
+        frame.index.name = frame.index.name or 'Date'
+        if 'Volume' in frame.columns:
+            # The NaN padding of the wide frame turned volumes into floats
+            frame['Volume'] = frame['Volume'].fillna(0).astype('int64')
+        for column in ACTION_COLUMNS:
+            if column in frame.columns:
+                frame[column] = frame[column].fillna(0.0)
+        yield symbol, frame
@@ -0,0 +1,190 @@
+"""Single entry point for the data pipeline, fast to start.
+
+Only the standard library, config, symbol_registry, market_calendar and
+metadata_store are imported up front; pandas, NumPy, yfinance and the
+ingest modules are imported by the commands that actually fetch. Checking
+for stale symbols or printing the status is therefore a SQLite query and
+a registry lookup, with no network access.
+
+    cli.py stale [INDEX ...] [--list]      exit 0 if any symbol is stale, 1 if none (like grep)
+    cli.py status [--json]                 metadata, calendar, signals and store summary
+    cli.py symbol SYMBOL ...               registry entry and last update of symbols
+    cli.py update [INDEX ...] [--force] [--bulk | --concurrent] [--workers N] [--trace-memory]
+
+Paths come from config (BT_DATA_DIR, BT_LOG_DIR, ... in the environment).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import config
+import market_calendar
+import metadata_store
+import symbol_registry
+
+STORE_SUFFIX = ".cols"
+MANIFEST_PATH = ("bundles", "manifest.json")
+
+
+def stale_by_index(indices, now=None):
+    """{index: [stale symbols]} for the given list ids (one metadata query)"""
+    now = now or datetime.now()
+    members = {index: symbol_registry.index_symbols(index) for index in indices}
+    stale = set(metadata_store.symbols_needing_update(
+        list(dict.fromkeys(symbol for symbols in members.values() for symbol in symbols)), now))
+    return {index: [symbol for symbol in symbols if symbol in stale] for index, symbols in members.items()}
+
+
+def _table_count(conn, table, where=""):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return conn.execute(f"SELECT COUNT(*) FROM {table} {where}").fetchone()[0] if exists else 0
+
+
+def status(now=None):
+    """Summary of the local data, without touching the network"""
+    now = now or datetime.now().astimezone()
+    conn = metadata_store.get_connection()
+    oldest, newest = conn.execute("SELECT MIN(last_updated), MAX(last_updated) FROM symbols").fetchone()
+    registry = symbol_registry.load_registry()
+
+    stores = {}
+    for folder in sorted(registry['folders']):
+        folder_dir = os.path.join(config.DATA_DIR, folder)
+        if os.path.isdir(folder_dir):
+            names = [name for name in os.listdir(folder_dir) if name.endswith(STORE_SUFFIX)]
+            stores[folder] = {name: datetime.fromtimestamp(os.path.getmtime(os.path.join(folder_dir, name)))
+                              .isoformat(timespec='seconds') for name in sorted(names)}
+
+    manifest_path = os.path.join(config.DATA_DIR, *MANIFEST_PATH)
+    bundles = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            bundles = json.load(f).get('generatedAt')
+
+    return {
+        'dataDir': config.DATA_DIR,
+        'registry': {'symbols': len(registry['symbols']), 'lists': len(registry['indices'])},
+        'metadata': {
+            'symbols': _table_count(conn, 'symbols'),
+            'failed': _table_count(conn, 'symbols', "WHERE status != 'success'"),
+            'oldestUpdate': oldest,
+            'newestUpdate': newest,
+        },
+        'signals': {
+            'symbols': _table_count(conn, 'signals'),
+            'activeTrades': _table_count(conn, 'signals', "WHERE active = 1"),
+        },
+        'exchanges': {exchange: {
+            'lastRefreshDue': market_calendar.last_refresh_due(exchange, now).isoformat(timespec='minutes'),
+            'nextRefreshDue': market_calendar.next_refresh_due(exchange, now).isoformat(timespec='minutes'),
+        } for exchange in market_calendar.EXCHANGES},
+        'priceStores': stores,
+        'bundlesGeneratedAt': bundles,
+    }
+
+
+def cmd_stale(args):
+    stale = stale_by_index(args.indices or symbol_registry.REFRESHED_LISTS)
+    total = len(set(symbol for symbols in stale.values() for symbol in symbols))
+    for index, symbols in stale.items():
+        print(f"{index:<16} {len(symbols):>5} stale / {len(symbol_registry.index_symbols(index))}")
+        if args.list and symbols:
+            print("  " + " ".join(symbols))
+    print(f"{total} stale symbols")
+    return 0 if total else 1
+
+
+def cmd_status(args):
+    summary = status()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    meta = summary['metadata']
+    print(f"Data:     {summary['dataDir']}")
+    print(f"Registry: {summary['registry']['symbols']} symbols in {summary['registry']['lists']} lists")
+    print(f"Metadata: {meta['symbols']} symbols ({meta['failed']} failed), "
+          f"updates {meta['oldestUpdate'] or '-'} .. {meta['newestUpdate'] or '-'}")
+    print(f"Signals:  {summary['signals']['symbols']} symbols, {summary['signals']['activeTrades']} active trades")
+    for exchange, due in summary['exchanges'].items():
+        print(f"{exchange:<9} last refresh due {due['lastRefreshDue']}, next {due['nextRefreshDue']}")
+    for folder, files in summary['priceStores'].items():
+        print(f"{folder:<9} " + (", ".join(f"{name} {stamp}" for name, stamp in files.items()) or "no price store"))
+    print(f"Bundles:  {summary['bundlesGeneratedAt'] or 'not exported'}")
+    return 0
+
+
+def cmd_symbol(args):
+    known = metadata_store.get_symbols(args.symbols)
+    stale = set(metadata_store.symbols_needing_update(args.symbols))
+    for symbol in args.symbols:
+        info = dict(symbol_registry.symbol_info(symbol), **(known.get(symbol) or {}), stale=symbol in stale)
+        print(f"{symbol}: {json.dumps(info)}")
+    return 0
+
+
+def cmd_update(args):
+    indices = args.indices or symbol_registry.REFRESHED_LISTS
+    if not args.force:
+        stale = stale_by_index(indices)
+        indices = [index for index in indices if stale[index]]
+        if not indices:
+            print("All symbols are up-to-date; nothing to fetch")
+            return 0
+
+    # pandas and the ingest modules are only imported once there is something to fetch
+    config.configure_logging()
+    import metrics
+    from batch_processor import process_batch, write_run_report
+    from concurrent_ingest import MAX_WORKERS
+
+    results = {}
+    with metrics.profile(args.profile), metrics.trace_memory(args.trace_memory):
+        for index in indices:
+            results[index] = process_batch(index, args.force, args.concurrent, args.workers or MAX_WORKERS, args.bulk)
+    write_run_report(results)
+    return 0 if all(result and not result['failed'] for result in results.values()) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='BT88 data pipeline')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stale = commands.add_parser('stale', help='List stale symbols (exit 0 if any, 1 if none)')
+    stale.add_argument('indices', nargs='*', help='List ids (default: every refreshed list)')
+    stale.add_argument('--list', action='store_true', help='Print the stale symbols')
+    stale.set_defaults(handler=cmd_stale)
+
+    status_parser = commands.add_parser('status', help='Summary of the local data')
+    status_parser.add_argument('--json', action='store_true')
+    status_parser.set_defaults(handler=cmd_status)
+
+    symbol = commands.add_parser('symbol', help='Registry entry and update state of symbols')
+    symbol.add_argument('symbols', nargs='+')
+    symbol.set_defaults(handler=cmd_symbol)
+
+    update = commands.add_parser('update', help='Fetch stale symbols (no-op if none are stale)')
+    update.add_argument('indices', nargs='*', help='List ids (default: every refreshed list)')
+    update.add_argument('--force', action='store_true', help='Refetch every symbol')
+    update.add_argument('--bulk', action='store_true', help='Multi-ticker downloads')
+    update.add_argument('--concurrent', action='store_true', help='Rate-limited worker pool')
+    update.add_argument('--workers', type=int, help='Worker pool size with --concurrent')
+    update.add_argument('--profile', help='Write a cProfile dump of the run to this file')
+    update.add_argument('--trace-memory', action='store_true',
+                        help='Record the peak memory of every stage (tracemalloc; slows the run down)')
+    update.set_defaults(handler=cmd_update)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    code = main()
+    if os.environ.get("BT_CLI_TIMING"):
+        print(f"({(time.perf_counter() - start) * 1000:.1f} ms)", file=sys.stderr)
+    sys.exit(code)
@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import get_rate_limiter, DEFAULT_SOURCE
+import metrics
+
+# Configuration
+MAX_RETRIES = 3
+MAX_WORKERS = 8
+RETRY_BACKOFF = 2  # seconds, doubled after every failed attempt
+
+def fetch_with_retry(symbol, fetcher, force_update=False, limiter=None,
+                     max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    """Fetch one symbol through the rate limiter, retrying with exponential backoff.
+
+    Returns a tuple of (success, attempts).
+    """
+    limiter = limiter or get_rate_limiter(DEFAULT_SOURCE)
+    
+    for attempt in range(1, max_retries + 1):
+        with metrics.stage('rate_limit_wait'):
+            limiter.acquire()
+        try:
+            if fetcher(symbol, force_update=force_update):
+                return True, attempt
+        except Exception as e:
+            print(f"Error fetching {symbol} (attempt {attempt}/{max_retries}): {e}")
+            
+        if attempt < max_retries:
+            metrics.count('retries')
+            with metrics.stage('retry_backoff'):
+                time.sleep(backoff * (2 ** (attempt - 1)))
+            
+    return False, max_retries
+
+def process_symbols_concurrent(symbols, fetcher, force_update=False, max_workers=MAX_WORKERS,
+                               limiter=None, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF,
+                               verbose=True):
+    """Fetch symbols on a worker pool; the token bucket replaces fixed sleeps.
+
+    `fetcher` has the signature of fetch_stock_data: fetcher(symbol, force_update=...)
+    returning True on success.
+    """
+    limiter = limiter or get_rate_limiter(DEFAULT_SOURCE)
+    total = len(symbols)
+    success_count = 0
+    failed_symbols = []
+    retries = 0
+    start = time.monotonic()
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_with_retry, symbol, fetcher, force_update,
+                            limiter, max_retries, backoff): symbol
+            for symbol in symbols
+        }
+        
+        for done, future in enumerate(as_completed(futures), start=1):
+            symbol = futures[future]
+            success, attempts = future.result()
+            retries += attempts - 1
+            
+            if success:
+                success_count += 1
+            else:
+                failed_symbols.append(symbol)
+            if verbose:
+                print(f"Processed {done}/{total}: {symbol} ({'ok' if success else 'failed'})")
+            
+    elapsed = time.monotonic() - start
+    
+    return {
+        "total": total,
+        "success": success_count,
+        "failed": len(failed_symbols),
+        "failed_symbols": failed_symbols,
+        "retries": retries,
+        "elapsed": elapsed,
+        "symbols_per_second": total / elapsed if elapsed > 0 else 0.0
+    }
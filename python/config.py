@@ -0,0 +1,30 @@
+import logging
+import os
+import sys
+
+# Base paths: the checkout this file lives in, or BT_BASE_DIR / BT_DATA_DIR /
+# BT_STOCK_LISTS_DIR / BT_LOG_DIR from the environment
+BASE_DIR = os.environ.get("BT_BASE_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.environ.get("BT_DATA_DIR", os.path.join(BASE_DIR, "DATA"))
+METADATA_FILE = os.path.join(DATA_DIR, "metadata.json")
+STOCK_LISTS_DIR = os.environ.get("BT_STOCK_LISTS_DIR", os.path.join(BASE_DIR, "js", "stock-lists"))
+LOG_DIR = os.environ.get("BT_LOG_DIR", os.path.join(BASE_DIR, "python", "logs"))
+
+
+def configure_logging(filename="stock_update.log", level=logging.INFO):
+    """Log to LOG_DIR/<filename> and stdout, unless logging is already set up.
+
+    Called by entry points rather than at import, so importing a module
+    never touches the filesystem.
+    """
+    if logging.getLogger().handlers:
+        return
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(LOG_DIR, filename)),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
@@ -0,0 +1,214 @@
+"""Precompressed, content-hashed price bundles for the browser and the API.
+
+For every symbol of an index folder's price store this writes a trimmed
+CSV (date,open,high,low,close,volume, prices rounded to PRICE_DECIMALS),
+and for the folder as a whole one JSON bundle holding all of those CSVs, so
+a full-index scan is one request. Under DATA/bundles:
+
+    bundles/<folder>/<symbol>.<hash>.csv   (+ .gz, + .br when Brotli is installed)
+    bundles/<folder>.<hash>.json           (+ .gz, + .br)
+    bundles/manifest.json                  symbol/folder -> current file names
+
+The hash is the start of the SHA-256 of the uncompressed content, so a file
+name never changes meaning: servers can send it with an immutable, year-long
+Cache-Control, and only the manifest needs revalidating. Bundles whose
+content is unchanged are not rewritten; files no longer referenced by the
+manifest are removed. backend/server.js serves them at /bundles/ with the
+encoding the client accepts.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+import numpy as np
+from config import DATA_DIR
+from price_store import open_store
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUNDLES_DIR = os.path.join(DATA_DIR, "bundles")
+MANIFEST_FILENAME = "manifest.json"
+
+PRICE_DECIMALS = 4
+HASH_LENGTH = 12
+CSV_HEADER = "date,open,high,low,close,volume\n"
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+GZIP_LEVEL = 6       # level 9 is twice as slow for <1% smaller files
+BROTLI_QUALITY = 11
+
+
+def _date_strings(dates):
+    return np.datetime_as_string(np.asarray(dates, dtype=np.int64).astype('datetime64[s]'), unit='D')
+
+
+def symbol_csv(columns):
+    """Trimmed CSV text of one symbol's store columns"""
+    dates = _date_strings(columns['date']).tolist()
+    # repr of a rounded float is its shortest form: no trailing zeros
+    prices = [np.round(np.asarray(columns[name], dtype=np.float64), PRICE_DECIMALS).tolist()
+              for name in PRICE_COLUMNS]
+    volume = np.nan_to_num(np.asarray(columns['volume'])).astype(np.int64).tolist()
+    return CSV_HEADER + "".join(f"{day},{o!r},{h!r},{l!r},{c!r},{v}\n"
+                                for day, o, h, l, c, v in zip(dates, *prices, volume))
+
+
+def index_json(texts):
+    """Index bundle: {"symbols": {symbol: CSV text}}, parsed per symbol like a single CSV"""
+    return json.dumps({'symbols': texts}, separators=(',', ':'))
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def write_bundle(output_dir, stem, extension, text):
+    """Write `text` as <stem>.<hash>.<extension> plus its compressed variants.
+
+    Returns the manifest entry; nothing is written if the file already exists.
+    """
+    data = text.encode('utf-8')
+    digest = content_hash(data)
+    relative = f"{stem}.{digest}.{extension}"
+    path = os.path.join(output_dir, relative)
+    variants = {path: data, path + '.gz': None}
+    if brotli is not None:
+        variants[path + '.br'] = None
+
+    if not all(os.path.exists(variant) for variant in variants):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        variants[path + '.gz'] = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            variants[path + '.br'] = brotli.compress(data, quality=BROTLI_QUALITY)
+        for variant, payload in variants.items():
+            tmp_path = variant + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, variant)
+
+    entry = {'path': relative, 'hash': digest, 'bytes': len(data),
+             'gzipBytes': os.path.getsize(path + '.gz')}
+    if brotli is not None:
+        entry['brBytes'] = os.path.getsize(path + '.br')
+    return entry
+
+
+def export_folder(index_folder, data_dir=DATA_DIR, output_dir=BUNDLES_DIR, previous=None):
+    """Write the bundles of one index folder; returns (symbol entries, index entry).
+
+    `previous` is the last manifest; symbols whose source CSV (size and
+    mtime, as recorded in the price store) is unchanged keep their bundle
+    without being formatted again.
+    """
+    previous = previous or {'symbols': {}, 'indices': {}}
+    store = open_store(index_folder, data_dir)
+    symbols, texts = {}, {}
+    changed = False
+    for symbol in store.symbols:
+        info = store.header['symbols'][symbol]
+        if not info['count']:
+            continue
+        source = [info.get('mtime_ns'), info.get('size')]
+        entry = previous['symbols'].get(symbol)
+        if (entry and entry.get('folder') == index_folder and entry.get('source') == source
+                and None not in source and os.path.exists(os.path.join(output_dir, entry['path']))):
+            symbols[symbol] = entry
+            continue
+        columns = store.get(symbol)
+        texts[symbol] = symbol_csv(columns)
+        entry = write_bundle(output_dir, f"{index_folder}/{symbol}", "csv", texts[symbol])
+        entry.update(folder=index_folder, bars=info['count'], source=source,
+                     lastDate=str(_date_strings(columns['date'][-1:])[0]))
+        symbols[symbol] = entry
+        changed = True
+
+    index_entry = previous['indices'].get(index_folder)
+    if (changed or not index_entry or index_entry.get('symbols') != len(symbols)
+            or not os.path.exists(os.path.join(output_dir, index_entry['path']))):
+        for symbol, entry in symbols.items():
+            if symbol not in texts:
+                with open(os.path.join(output_dir, entry['path']), 'r') as f:
+                    texts[symbol] = f.read()
+        index_entry = write_bundle(output_dir, index_folder, "json", index_json({symbol: texts[symbol] for symbol in symbols}))
+        index_entry['symbols'] = len(symbols)
+    return symbols, index_entry
+
+
+def load_manifest(output_dir=BUNDLES_DIR):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'symbols': {}, 'indices': {}}
+
+
+def remove_stale(output_dir, manifest, folders):
+    """Delete bundles of `folders` that the manifest no longer references"""
+    current = {entry['path'] for entry in manifest['symbols'].values()}
+    current.update(entry['path'] for entry in manifest['indices'].values())
+    removed = 0
+    for folder in folders:
+        folder_dir = os.path.join(output_dir, folder)
+        candidates = [f"{folder}/{name}" for name in os.listdir(folder_dir)] if os.path.isdir(folder_dir) else []
+        candidates += [name for name in os.listdir(output_dir) if name.startswith(f"{folder}.")]
+        for relative in candidates:
+            base = relative[:-3] if relative.endswith(('.gz', '.br')) else relative
+            if base not in current:
+                os.remove(os.path.join(output_dir, relative))
+                removed += 1
+    return removed
+
+
+def export_bundles(folders, data_dir=DATA_DIR, output_dir=BUNDLES_DIR):
+    """Export the bundles of index folders and update the manifest"""
+    manifest = load_manifest(output_dir)
+    for folder in folders:
+        try:
+            symbols, index_entry = export_folder(folder, data_dir, output_dir, manifest)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not export bundles for {folder}: {e}")
+            print(f"Error exporting bundles for {folder}: {e}")
+            continue
+        manifest['symbols'] = {symbol: entry for symbol, entry in manifest['symbols'].items()
+                               if entry['folder'] != folder}
+        manifest['symbols'].update(symbols)
+        manifest['indices'][folder] = index_entry
+
+    manifest['generatedAt'] = datetime.now().isoformat()
+    manifest['encodings'] = ['br', 'gzip'] if brotli is not None else ['gzip']
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    remove_stale(output_dir, manifest, [folder for folder in folders if folder in manifest['indices']])
+    return manifest
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # Usage: export_bundles.py [index_folder ...]
+    folders = sys.argv[1:] or ["ftse100", "us_stocks"]
+    start = time.perf_counter()
+    manifest = export_bundles(folders)
+    elapsed = time.perf_counter() - start
+    if brotli is None:
+        print("Brotli is not installed; only gzip variants were written")
+    for folder in folders:
+        entry = manifest['indices'].get(folder)
+        if not entry:
+            continue
+        symbols = [e for e in manifest['symbols'].values() if e['folder'] == folder]
+        raw = sum(e['bytes'] for e in symbols)
+        packed = sum(e.get('brBytes', e['gzipBytes']) for e in symbols)
+        print(f"{folder}: {len(symbols)} symbol bundles, {raw / 1e6:.1f} MB -> {packed / 1e6:.1f} MB compressed; "
+              f"index bundle {entry['bytes'] / 1e6:.1f} MB -> {entry.get('brBytes', entry['gzipBytes']) / 1e6:.1f} MB")
+    print(f"✓ Exported bundles in {elapsed:.1f}s -> {os.path.join(BUNDLES_DIR, MANIFEST_FILENAME)}")
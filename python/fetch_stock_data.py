@@ -1,29 +1,55 @@
 import os
-import yfinance as yf
+import importlib
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
-import json
 import logging
 import sys
+from config import DATA_DIR, configure_logging
+from price_store import build_index_store
+from indicator_state import update_indicators
+import signals_store
+import metrics
+import metadata_store
+import symbol_registry
+import resample
+import adjustments
+from pipeline import buffered
+from bulk_frames import iter_bulk_frames, split_bulk_frame
 
-# Configure logging if not already configured
-if not logging.getLogger().handlers:
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('/Users/DSJP/Desktop/CODE/BT/python/logs/stock_update.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-
-# Configuration
-DATA_DIR = "/Users/DSJP/Desktop/CODE/BT/DATA"
-METADATA_FILE = os.path.join(DATA_DIR, "metadata.json")
-
-def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False):
-    """Fetch stock data and save as CSV"""
+class _LazyModule:
+    """Module imported on first attribute access"""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+# yfinance (and its requests/curl stack) is only imported once a download is made
+yf = _LazyModule('yfinance')
+
+# Columns whose non-zero values mean yfinance has re-adjusted the whole history
+CORPORATE_ACTION_COLUMNS = ['Dividends', 'Stock Splits']
+
+# Symbols per multi-ticker yf.download request
+BULK_CHUNK_SIZE = 100
+
+# Downloaded symbols queued ahead of the CSV writer in bulk runs; the next
+# request waits while the queue is full
+IN_FLIGHT_SYMBOLS = BULK_CHUNK_SIZE
+
+def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False, incremental=True,
+                     update_store=True):
+    """Fetch stock data and save as CSV.
+
+    With incremental=True and an existing CSV, only the bars after the last
+    stored date are downloaded and merged into the file. A full `period`
+    re-pull happens when the CSV is missing or the new bars carry a split or
+    dividend, since yfinance then back-adjusts the whole history.
+    
+    With update_store=True the index's columnar price store is refreshed
+    too; batch runs pass False and rebuild it once per index instead.
+    """
     logging.info(f"Processing symbol: {symbol}")
     
     # Determine index folder
@@ -40,123 +66,367 @@ def fetch_stock_data(symbol, period="5y", interval="1d", force_update=False):
     # Check if file exists and if update is needed
     if not force_update and os.path.exists(file_path):
         logging.info(f"File exists for {symbol}, checking if update needed")
-        if not is_update_needed(symbol):
+        with metrics.stage('update_check'):
+            needed = is_update_needed(symbol)
+        if not needed:
             logging.info(f"Skipping {symbol}: Data is up-to-date")
             print(f"Skipping {symbol}: Data is up-to-date")
+            metrics.count('symbols_skipped')
             return True
             
     # Fetch data
+    started = time.perf_counter()
     try:
         logging.info(f"Fetching data for {symbol}...")
         print(f"Fetching data for {symbol}...")
         
+        tail = read_csv_tail(file_path) if incremental and os.path.exists(file_path) else None
+        
         try:
             ticker = yf.Ticker(symbol)
             logging.info(f"Created ticker object for {symbol}")
-            data = ticker.history(period=period, interval=interval)
-            logging.info(f"Retrieved history data for {symbol}, rows: {len(data) if not data.empty else 0}")
+            with metrics.stage('download'):
+                if tail:
+                    # Start at the last stored bar so a revised final bar is replaced
+                    start = pd.Timestamp(tail['last_date']).strftime('%Y-%m-%d')
+                    data = ticker.history(start=start, interval=interval)
+                    logging.info(f"Retrieved {len(data)} incremental rows for {symbol} since {start}")
+                else:
+                    data = ticker.history(period=period, interval=interval)
+                    logging.info(f"Retrieved history data for {symbol}, rows: {len(data) if not data.empty else 0}")
+            record_fetch(data)
         except Exception as ticker_error:
             logging.error(f"Error in yfinance API for {symbol}: {str(ticker_error)}")
             raise
         
-        if data.empty:
-            logging.error(f"No data received for {symbol}")
-            raise Exception(f"No data received for {symbol}")
-            
-        # Format data for CSV
-        data = data.reset_index()
-        # Format columns to match existing structure
-        data = data.rename(columns={
-            'Date': 'date',
-            'Open': 'open', 
-            'High': 'high',
-            'Low': 'low',
-            'Close': 'close',
-            'Volume': 'volume'
-        })
+        return save_history(symbol, data, tail, file_path, period, interval, update_store)
+        
+    except Exception as e:
+        print(f"Error fetching {symbol}: {str(e)}")
+        return False
+    finally:
+        metrics.observe('symbol_seconds', time.perf_counter() - started)
+
+def save_history(symbol, data, tail, file_path, period="5y", interval="1d", update_store=True):
+    """Write downloaded bars for a symbol to its CSV and record the update.
+
+    `tail` is the read_csv_tail of the existing file when `data` holds only
+    the bars from its last stored date on. Raises if nothing was received.
+    
+    A split or dividend in the new bars back-adjusts the stored history:
+    locally when Yahoo's factor can be checked against the action columns
+    (see adjustments), otherwise by re-pulling the full `period`. Either
+    way the file is rewritten and the symbol's indicators are rebuilt.
+    """
+    if tail and not data.empty and has_corporate_action(data, tail['last_date']):
+        with metrics.stage('adjust'):
+            history = (adjustments.adjust_stored_history(file_path, data, tail['last_date'])
+                       if interval not in resample.INTRADAY_INTERVALS else None)
+        if history is not None:
+            logging.info(f"Split/dividend in new bars for {symbol}, back-adjusted the stored history")
+            metrics.count('histories_adjusted')
+            data = history
+        else:
+            logging.info(f"Split/dividend in new bars for {symbol}, re-pulling full history")
+            metrics.count('full_repulls')
+            with metrics.stage('download'):
+                data = yf.Ticker(symbol).history(period=period, interval=interval)
+            record_fetch(data)
+        tail = None
         
-        # Save to CSV
-        data.to_csv(file_path, index=False)
+    if data.empty:
+        if tail:
+            logging.info(f"No new bars for {symbol} since {tail['last_date']}")
+            with metrics.stage('metadata'):
+                update_metadata(symbol)
+            print(f"✓ {symbol} already has the latest bar")
+            return True
+        logging.error(f"No data received for {symbol}")
+        raise Exception(f"No data received for {symbol}")
         
-        # Update metadata
+    with metrics.stage('reshape'):
+        if interval in resample.INTRADAY_INTERVALS:
+            # The CSVs and everything built on them hold daily bars
+            data = resample.resample_frame(data, '1d')
+            interval = "1d"
+        data = format_history(data)
+    
+    with metrics.stage('csv_write'):
+        merged = bool(tail) and merge_incremental(file_path, data, tail)
+        if not merged:
+            # Save to CSV
+            data.to_csv(file_path, index=False)
+    metrics.count('bytes_written', os.path.getsize(file_path) - (tail['last_row_offset'] if merged else 0))
+    if merged:
+        logging.info(f"Merged incremental rows into {file_path}")
+    
+    # Extend the stored DTI series with the new bars only (full rebuild after a rewrite)
+    # and refresh the symbol's row of the latest-signals table
+    if interval == "1d":
+        index_folder = get_index_folder(symbol)
+        since = tail['last_date'] if merged else None
+        with metrics.stage('indicators'):
+            update_indicators(symbol, index_folder, data, since)
+        with metrics.stage('signals'):
+            signals_store.update_signal(symbol, index_folder, data, since)
+    
+    # Update metadata
+    with metrics.stage('metadata'):
         update_metadata(symbol)
+    
+    if update_store:
+        index_folder = get_index_folder(symbol)
+        try:
+            with metrics.stage('price_store'):
+                build_index_store(index_folder)
+        except Exception as store_error:
+            logging.error(f"Error updating price store for {index_folder}: {store_error}")
+    
+    print(f"✓ Successfully saved data for {symbol}")
+    return True
+
+def download_bulk(symbols, period=None, start=None, interval="1d"):
+    """Download several symbols with one multi-ticker yf.download request.
+
+    Returns {symbol: frame} in the Ticker.history layout (tz-aware index,
+    OHLCV plus Dividends and Stock Splits). Symbols that came back empty are
+    left out so the caller can fall back to single-symbol fetches.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    wide = download_wide(symbols, period, start, interval)
+    with metrics.stage('reshape'):
+        return split_bulk_frame(wide, symbols)
+
+def download_wide(symbols, period=None, start=None, interval="1d"):
+    """One multi-ticker yf.download request, as the raw group_by='ticker' frame"""
+    range_args = {'start': start} if start else {'period': period}
+    with metrics.stage('download'):
+        wide = yf.download(symbols, interval=interval, group_by='ticker', auto_adjust=True,
+                           actions=True, ignore_tz=False, threads=False, progress=False, **range_args)
+    record_fetch(wide)
+    return wide
+
+def record_fetch(data):
+    """Count one download request and the rows and bytes it returned.
+
+    yfinance does not expose the HTTP payload, so bytes are the in-memory
+    size of the returned frame.
+    """
+    metrics.count('requests')
+    if data is not None and not data.empty:
+        metrics.count('rows_fetched', len(data))
+        metrics.count('bytes_fetched', int(data.memory_usage(index=True).sum()))
+
+def stream_bulk(groups, period="5y", interval="1d", chunk_size=BULK_CHUNK_SIZE, stats=None):
+    """Download {(index_folder, start): symbols} groups, yielding (symbol, frame, empty) per symbol.
+
+    One multi-ticker request per `chunk_size` symbols; frame is None when
+    the symbol is missing from the response (or the request failed), and
+    `empty` is True when the whole response had no bars. Only one
+    response is held at a time; `stats['requests']` counts the requests.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('requests', 0)
+    for (index_folder, start), group in groups.items():
+        for i in range(0, len(group), chunk_size):
+            chunk = group[i:i + chunk_size]
+            print(f"Downloading {len(chunk)} symbols from {index_folder}" + (f" since {start}" if start else ""))
+            stats['requests'] += 1
+            try:
+                wide = download_wide(chunk, period, start, interval)
+            except Exception as e:
+                logging.error(f"Bulk download failed for {len(chunk)} symbols: {e}")
+                wide = None
+            empty = wide is not None and wide.empty
+            frames = iter_bulk_frames(wide, chunk)
+            while True:
+                with metrics.stage('reshape'):
+                    item = next(frames, None)
+                if item is None:
+                    break
+                yield item[0], item[1], empty
+            wide = frames = item = None
+
+def fetch_stock_data_bulk(symbols, period="5y", interval="1d", force_update=False, incremental=True,
+                          update_store=True, chunk_size=BULK_CHUNK_SIZE):
+    """Fetch many symbols with multi-ticker requests and save each as CSV.
+
+    Symbols are grouped by index folder (one exchange, so one timezone) and
+    by the date their download starts from; each group costs one request
+    per `chunk_size` symbols. Symbols missing from a bulk response fall back
+    to fetch_stock_data. Returns {'success', 'failed', 'requests'}.
+    
+    Downloads run on a background thread (stream_bulk) and are saved one
+    symbol at a time while the next request is in flight; at most
+    IN_FLIGHT_SYMBOLS symbols wait in between, so memory does not grow with
+    the number of symbols.
+    """
+    groups = {}
+    targets = {}
+    for symbol in symbols:
+        index_folder = get_index_folder(symbol)
+        os.makedirs(os.path.join(DATA_DIR, index_folder), exist_ok=True)
+        file_path = os.path.join(DATA_DIR, index_folder, f"{symbol}.csv")
+        if not force_update and os.path.exists(file_path):
+            with metrics.stage('update_check'):
+                needed = is_update_needed(symbol)
+            if not needed:
+                print(f"Skipping {symbol}: Data is up-to-date")
+                metrics.count('symbols_skipped')
+                continue
+        tail = read_csv_tail(file_path) if incremental and os.path.exists(file_path) else None
+        targets[symbol] = (file_path, tail)
+        # Start at the last stored bar so a revised final bar is replaced
+        start = pd.Timestamp(tail['last_date']).strftime('%Y-%m-%d') if tail else None
+        groups.setdefault((index_folder, start), []).append(symbol)
+    
+    results = {'success': [], 'failed': [], 'requests': 0}
+    stats = {'requests': 0}
+    downloads = buffered(stream_bulk(groups, period, interval, chunk_size, stats), IN_FLIGHT_SYMBOLS, 'download')
+    waited_at = time.perf_counter()
+    for symbol, frame, empty in downloads:
+        file_path, tail = targets[symbol]
+        try:
+            if frame is not None:
+                success = save_history(symbol, frame, tail, file_path, period, interval, update_store=False)
+            elif empty and tail:
+                # Nobody in an incremental group has a bar since `start`
+                success = save_history(symbol, pd.DataFrame(), tail, file_path,
+                                       period, interval, update_store=False)
+            else:
+                logging.info(f"{symbol} missing from bulk response, fetching it alone")
+                results['requests'] += 1
+                success = fetch_stock_data(symbol, period, interval, force_update=True,
+                                           incremental=incremental, update_store=False)
+        except Exception as e:
+            print(f"Error fetching {symbol}: {str(e)}")
+            success = False
+        results['success' if success else 'failed'].append(symbol)
+        # Latency: waiting for the symbol's download plus saving it (a lone
+        # fallback fetch is recorded by fetch_stock_data itself)
+        if frame is not None or (empty and tail):
+            metrics.observe('symbol_seconds', time.perf_counter() - waited_at)
+        frame = None
+        waited_at = time.perf_counter()
+    results['requests'] += stats['requests']
+    
+    if update_store:
+        for index_folder in sorted({folder for folder, _ in groups}):
+            try:
+                with metrics.stage('price_store'):
+                    build_index_store(index_folder)
+            except Exception as store_error:
+                logging.error(f"Error updating price store for {index_folder}: {store_error}")
+    
+    return results
+
+def format_history(data):
+    """Flatten a yfinance history frame into the CSV column layout"""
+    data = data.reset_index()
+    # Format columns to match existing structure
+    return data.rename(columns={
+        'Date': 'date',
+        'Open': 'open', 
+        'High': 'high',
+        'Low': 'low',
+        'Close': 'close',
+        'Volume': 'volume'
+    })
+
+def read_csv_tail(file_path, block_size=4096):
+    """Read the header and last row of a CSV without parsing the whole file.
+
+    Returns a dict with the header columns, the last row's date string and the
+    byte offset where the last row starts, or None if the file has no rows.
+    """
+    with open(file_path, 'rb') as f:
+        header = f.readline().decode('utf-8').strip()
+        data_start = f.tell()
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end <= data_start:
+            return None
+            
+        # Walk back block by block until the last full line is in the buffer
+        pos = end
+        buffer = b''
+        while pos > data_start:
+            read_size = min(block_size, pos - data_start)
+            pos -= read_size
+            f.seek(pos)
+            buffer = f.read(read_size) + buffer
+            if buffer.rstrip(b'\r\n').count(b'\n') >= 1 or pos == data_start:
+                break
+                
+    content = buffer.rstrip(b'\r\n')
+    if not content:
+        return None
+    line_start = content.rfind(b'\n') + 1
+    last_line = content[line_start:].decode('utf-8')
+    
+    return {
+        'columns': header.split(','),
+        'last_date': last_line.split(',', 1)[0],
+        'last_row_offset': pos + line_start
+    }
+
+def has_corporate_action(data, since):
+    """Check whether any bar after `since` carries a split or dividend"""
+    new_rows = data[data.index > pd.Timestamp(since)]
+    for column in CORPORATE_ACTION_COLUMNS:
+        if column in new_rows.columns and (new_rows[column].fillna(0) != 0).any():
+            return True
+    return False
+
+def merge_incremental(file_path, data, tail):
+    """Replace the stored last bar and append newer bars in place.
+
+    Rows are de-duplicated on `date`: everything from the last stored date on
+    comes from the fresh download. Returns False when the column layout no
+    longer matches the file, in which case the caller rewrites it.
+    """
+    columns = tail['columns']
+    if set(data.columns) - set(columns):
+        return False
         
-        print(f"✓ Successfully saved data for {symbol}")
+    new_rows = data[data['date'] >= pd.Timestamp(tail['last_date'])]
+    new_rows = new_rows.reindex(columns=columns, fill_value=0.0)
+    if new_rows.empty:
         return True
         
-    except Exception as e:
-        print(f"Error fetching {symbol}: {str(e)}")
-        return False
+    with open(file_path, 'r+b') as f:
+        f.truncate(tail['last_row_offset'])
+        f.seek(tail['last_row_offset'])
+        f.write(new_rows.to_csv(header=False, index=False).encode('utf-8'))
+    return True
         
 def get_index_folder(symbol):
     """Determine which index folder the symbol belongs to"""
-    # Add logic to determine correct folder based on symbol
-    if symbol.endswith('.NS'):
-        folder = "nifty50"  # Or other Indian indices
-    elif symbol.endswith('.L'):
-        folder = "ftse100"  # Or ftse250
-    else:
-        folder = "us_stocks"  # Default for US stocks
-        
+    folder = symbol_registry.index_folder(symbol)
     logging.info(f"Mapped symbol {symbol} to folder {folder}")
     return folder
         
 def update_metadata(symbol):
     """Update the last update time in metadata"""
     try:
-        metadata = {}
-        if os.path.exists(METADATA_FILE):
-            with open(METADATA_FILE, 'r') as f:
-                metadata = json.load(f)
-                
-        # Update timestamp
-        if 'symbols' not in metadata:
-            metadata['symbols'] = {}
-            
-        metadata['symbols'][symbol] = {
-            'last_updated': datetime.now().isoformat(),
-            'status': 'success'
-        }
-        
-        with open(METADATA_FILE, 'w') as f:
-            json.dump(metadata, f, indent=2)
-            
+        metadata_store.set_symbol(symbol, status='success')
     except Exception as e:
         print(f"Error updating metadata: {e}")
         
 def is_update_needed(symbol: str) -> bool:
     """Check if symbol needs updating based on metadata and market hours"""
     try:
-        if not os.path.exists(METADATA_FILE):
-            return True
-            
-        with open(METADATA_FILE, 'r') as f:
-            metadata = json.load(f)
-            
-        if 'symbols' not in metadata or symbol not in metadata['symbols']:
+        info = metadata_store.get_symbol(symbol)
+        if info is None:
             return True
             
-        last_updated = datetime.fromisoformat(metadata['symbols'][symbol]['last_updated'])
-        now = datetime.now()
-        
-        # If data was updated in the last 30 minutes, don't update again
-        if now - last_updated < timedelta(minutes=30):
-            logging.info(f"Skipping update for {symbol}: Last updated {last_updated}, less than 30 minutes ago")
+        last_updated = datetime.fromisoformat(info['last_updated'])
+        if not metadata_store.needs_update(symbol, last_updated):
+            logging.info(f"Skipping update for {symbol}: Last updated {last_updated}")
             return False
         
-        # Check market hours for US stocks
-        if not symbol.endswith('.L') and not symbol.endswith('.NS'):  # US stock
-            # Convert to Eastern Time
-            # This is a simplified check. For more accurate results, 
-            # you might want to use pytz or dateutil libraries.
-            et_hour = (now.hour - 5) % 24  # Approximate ET conversion
-            
-            # If it's a US stock and it's before 5 PM ET, don't update
-            # unless the data is from yesterday or earlier
-            if et_hour < 17 and last_updated.date() == now.date():
-                logging.info(f"Skipping update for US stock {symbol}: Market may still be open or recently closed")
-                return False
-        
         # Data needs updating
         logging.info(f"Update needed for {symbol}: Last updated {last_updated}")
         return True
@@ -167,5 +437,8 @@ def is_update_needed(symbol: str) -> bool:
         
 # Example usage
 if __name__ == "__main__":
-    symbol = "AAPL"
-    fetch_stock_data(symbol)
\ No newline at end of file
+    configure_logging()
+    symbol = sys.argv[1] if len(sys.argv) > 1 else "AAPL"
+    fetch_stock_data(symbol, incremental="--full" not in sys.argv)
+    metadata_store.export_json()
+    signals_store.export_json()
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""Incremental DTI and 7-day DTI series, updated in O(new bars).
+
+DTI is three chained EMAs over the signed and absolute momentum, so the six
+EMA values of the last bar are all that is needed to extend it. For every
+symbol and parameter set this module keeps
+
+    DATA/<index>/indicators/<symbol>.<r>-<s>-<u>.csv    date, dti,
+                                                        daily_7day_dti,
+                                                        previous_7day_dti
+    DATA/<index>/indicators/<symbol>.<r>-<s>-<u>.json   checkpoint state
+
+The checkpoint sits at the end of the last complete 7-bar period: the daily
+and weekly EMA accumulators there, the last bar's and period's high/low,
+the byte offset of the next series row, and the bars after it (at most
+seven; the latest bar is never checkpointed since the next download may
+revise it). New bars are replayed from the checkpoint, so only the open
+period and the new bars are computed and only their series rows are
+rewritten. Values are identical to indicators.dti / seven_day_dti over the
+whole history; a full rewrite of the CSV (first download, or a split or
+dividend re-adjusting the stored bars) rebuilds the series from scratch.
+"""
+import io
+import json
+import logging
+import os
+import pandas as pd
+from config import DATA_DIR
+
+INDICATOR_DIR = "indicators"
+STATE_VERSION = 1
+
+# (r, s, u) sets kept up to date on every ingest
+DEFAULT_PARAM_SETS = [(14, 10, 5)]
+
+SERIES_COLUMNS = ['date', 'dti', 'daily_7day_dti', 'previous_7day_dti']
+PERIOD_BARS = 7
+
+
+def state_paths(symbol, index_folder, params, data_dir=DATA_DIR):
+    """(state file, series file) of a symbol and (r, s, u)"""
+    base = os.path.join(data_dir, index_folder, INDICATOR_DIR, f"{symbol}.{'-'.join(map(str, params))}")
+    return base + ".json", base + ".csv"
+
+
+def new_state(r, s, u):
+    """State before the first bar"""
+    return {
+        'version': STATE_VERSION,
+        'params': [r, s, u],
+        'bars': 0,            # bars up to the checkpoint (a multiple of 7)
+        'date': None,         # date of the checkpoint bar
+        'high': None,
+        'low': None,
+        'ema': None,          # [signed r, s, u, absolute r, s, u]
+        'periods': 0,         # complete 7-bar periods
+        'period_high': None,
+        'period_low': None,
+        'period_ema': None,
+        'period_dti': None,   # DTI of the last complete period
+        'offset': 0,          # series file size at the checkpoint
+        'pending': [],        # [date, high, low] after the checkpoint (1-7 bars)
+    }
+
+
+def _momentum(high, low, prev_high, prev_low):
+    if prev_high is None:
+        return 0.0
+    high_diff = high - prev_high
+    low_diff = low - prev_low
+    return (high_diff if high_diff > 0 else 0.0) - (-low_diff if low_diff < 0 else 0.0)
+
+
+def _step(ema, x, weights):
+    """Advance the two EMA chains by one value; the same arithmetic as indicators.ema"""
+    if ema is None:
+        # EMAs are seeded with their first input
+        ax = abs(x)
+        return [x, x, x, ax, ax, ax]
+    out = list(ema)
+    for chain, value in ((0, x), (3, abs(x))):
+        for i, k in enumerate(weights):
+            value = value * k + out[chain + i] * (1 - k)
+            out[chain + i] = value
+    return out
+
+
+def _dti(ema):
+    return 100 * ema[2] / ema[5] if ema[5] != 0 else 0.0
+
+
+def _format(value):
+    return '' if value is None or value != value else repr(value)
+
+
+def advance(state, bars):
+    """Replay `bars` ([date, high, low] after the checkpoint) and move the checkpoint.
+
+    Returns the series rows of those bars as CSV text; the caller writes it
+    at the old state['offset']. `state` is updated in place.
+    """
+    r, s, u = state['params']
+    weights = [2.0 / (p + 1) for p in (r, s, u)]
+
+    high, low, ema = state['high'], state['low'], state['ema']
+    bucket = []  # (date, high, low, dti) of the open period
+    text = []
+    written = 0
+
+    def period_dti(commit):
+        period_high = max(bar[1] for bar in bucket)
+        period_low = min(bar[2] for bar in bucket)
+        x = _momentum(period_high, period_low, state['period_high'], state['period_low'])
+        period_ema = _step(state['period_ema'], x, weights)
+        value = _dti(period_ema)
+        if commit:
+            state.update(periods=state['periods'] + 1, period_high=period_high, period_low=period_low,
+                         period_ema=period_ema)
+        return value
+
+    def flush(weekly):
+        nonlocal written
+        previous = state['period_dti'] if state['periods'] > 0 else None
+        lines = ''.join(f"{date},{_format(daily)},{_format(weekly)},{_format(previous)}\n"
+                        for date, _, _, daily in bucket)
+        text.append(lines)
+        written += len(lines.encode('utf-8'))
+
+    for i, (date, bar_high, bar_low) in enumerate(bars):
+        x = _momentum(bar_high, bar_low, high, low)
+        ema = _step(ema, x, weights)
+        high, low = bar_high, bar_low
+        bucket.append((date, bar_high, bar_low, _dti(ema)))
+        if len(bucket) == PERIOD_BARS and i < len(bars) - 1:
+            weekly = period_dti(commit=False)
+            flush(weekly)
+            period_dti(commit=True)
+            state.update(bars=state['bars'] + PERIOD_BARS, date=date, high=high, low=low, ema=ema,
+                         period_dti=weekly, offset=state['offset'] + written)
+            written = 0
+            bucket = []
+
+    if bucket:
+        flush(period_dti(commit=False))
+    state['pending'] = [[date, bar_high, bar_low] for date, bar_high, bar_low, _ in bucket]
+    return ''.join(text)
+
+
+def _save(state, state_file, series_file, text, offset):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    header = ','.join(SERIES_COLUMNS) + '\n'
+    if offset == 0 or not os.path.exists(series_file):
+        with open(series_file, 'wb') as f:
+            f.write(header.encode('utf-8') + text.encode('utf-8'))
+    else:
+        with open(series_file, 'r+b') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(text.encode('utf-8'))
+    tmp = state_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, state_file)
+
+
+def _read_bars(file_path):
+    frame = pd.read_csv(file_path, usecols=['date', 'high', 'low'])
+    frame = frame.dropna()
+    return list(zip(frame['date'].astype(str), frame['high'].astype(float), frame['low'].astype(float)))
+
+
+def rebuild_symbol(symbol, index_folder, params=DEFAULT_PARAM_SETS[0], data_dir=DATA_DIR):
+    """Compute a symbol's series from its whole CSV and store a fresh checkpoint"""
+    state_file, series_file = state_paths(symbol, index_folder, params, data_dir)
+    bars = _read_bars(os.path.join(data_dir, index_folder, f"{symbol}.csv"))
+    state = new_state(*params)
+    state['offset'] = len(','.join(SERIES_COLUMNS)) + 1
+    text = advance(state, bars)
+    _save(state, state_file, series_file, text, 0)
+    return state
+
+
+def load_state(symbol, index_folder, params=DEFAULT_PARAM_SETS[0], data_dir=DATA_DIR):
+    state_file, _ = state_paths(symbol, index_folder, params, data_dir)
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+
+def update_symbol(symbol, index_folder, new_bars, since, params=DEFAULT_PARAM_SETS[0], data_dir=DATA_DIR):
+    """Extend a symbol's series with the bars merged into its CSV from `since` on.
+
+    `new_bars` are the [date, high, low] rows that replaced every stored bar
+    dated `since` or later. Falls back to rebuild_symbol when there is no
+    usable checkpoint before `since`. Returns the number of bars replayed.
+    """
+    state_file, series_file = state_paths(symbol, index_folder, params, data_dir)
+    state = load_state(symbol, index_folder, params, data_dir)
+    if (state is None or (state['date'] is not None and state['date'] >= since)
+            or not os.path.exists(series_file) or os.path.getsize(series_file) < state['offset']):
+        state = rebuild_symbol(symbol, index_folder, params, data_dir)
+        return state['bars'] + len(state['pending'])
+
+    bars = [bar for bar in state['pending'] if bar[0] < since] + list(new_bars)
+    offset = state['offset']
+    text = advance(state, bars)
+    _save(state, state_file, series_file, text, offset)
+    return len(bars)
+
+
+def update_indicators(symbol, index_folder, data=None, since=None, param_sets=DEFAULT_PARAM_SETS,
+                      data_dir=DATA_DIR):
+    """Refresh every parameter set of a symbol after its CSV was written.
+
+    `data` is the formatted frame that was merged from `since` on; without
+    `since` the CSV was rewritten and the series are rebuilt.
+    """
+    new_bars = []
+    if since is not None and data is not None:
+        rows = data[data['date'] >= pd.Timestamp(since)].dropna(subset=['high', 'low'])
+        new_bars = list(zip(rows['date'].astype(str), rows['high'].astype(float), rows['low'].astype(float)))
+    for params in param_sets:
+        try:
+            if since is None:
+                rebuild_symbol(symbol, index_folder, params, data_dir)
+            else:
+                update_symbol(symbol, index_folder, new_bars, since, params, data_dir)
+        except Exception as e:
+            logging.error(f"Error updating indicators {params} for {symbol}: {e}")
+
+
+def read_series(symbol, index_folder, params=DEFAULT_PARAM_SETS[0], data_dir=DATA_DIR, offset=0):
+    """Stored series of a symbol as a DataFrame (None if not built yet).
+
+    With a state's 'offset' only the rows after its checkpoint are read.
+    """
+    _, series_file = state_paths(symbol, index_folder, params, data_dir)
+    if not os.path.exists(series_file):
+        return None
+    if not offset:
+        return pd.read_csv(series_file)
+    with open(series_file, 'rb') as f:
+        f.seek(offset)
+        text = f.read().decode('utf-8')
+    return pd.read_csv(io.StringIO(','.join(SERIES_COLUMNS) + '\n' + text))
+
+
+def rebuild_index(index_folder, param_sets=DEFAULT_PARAM_SETS, data_dir=DATA_DIR):
+    """Rebuild the series of every symbol CSV in an index folder"""
+    folder = os.path.join(data_dir, index_folder)
+    symbols = sorted(name[:-4] for name in os.listdir(folder) if name.endswith('.csv'))
+    for symbol in symbols:
+        for params in param_sets:
+            try:
+                rebuild_symbol(symbol, index_folder, params, data_dir)
+            except Exception as e:
+                logging.error(f"Error rebuilding indicators {params} for {symbol}: {e}")
+    return symbols
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Rebuild stored DTI series for index folders')
+    parser.add_argument('indices', nargs='+', help='Index folders under DATA (e.g. us_stocks ftse100)')
+    parser.add_argument('--params', nargs=3, type=int, action='append', metavar=('R', 'S', 'U'),
+                        help='EMA periods; may be repeated (default: 14 10 5)')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Data directory')
+    args = parser.parse_args()
+
+    param_sets = [tuple(p) for p in args.params] if args.params else DEFAULT_PARAM_SETS
+    for index_folder in args.indices:
+        start = time.perf_counter()
+        symbols = rebuild_index(index_folder, param_sets, args.data_dir)
+        print(f"✓ {index_folder}: {len(symbols)} symbols x {len(param_sets)} parameter sets "
+              f"in {time.perf_counter() - start:.1f}s")
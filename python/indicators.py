@@ -0,0 +1,327 @@
+"""Vectorized DTI, 7-day DTI, ROC, ADX and Bollinger Bands.
+
+NumPy ports of js/dti-indicators.js. Every function accepts either a 1-D
+series or a 2-D (symbols x bars) matrix and works along the last axis, so a
+whole index is computed in one call. Rows of a matrix may be left-padded
+with NaN (as produced by PriceStore.matrix); each row then behaves exactly
+as the JS code does on that symbol's own series, and padded positions stay
+NaN in the output.
+
+Outputs are aligned to the input bars. Where the JS code returns shorter
+arrays (ADX) or nulls (ROC, Bollinger), the warm-up bars are NaN here.
+"""
+import numpy as np
+
+# Above this many rows the per-bar NumPy loop beats per-row Python loops
+_VECTOR_ROWS = 4
+
+
+def _as_2d(data):
+    array = np.asarray(data, dtype=np.float64)
+    return array.reshape(1, -1) if array.ndim == 1 else array, array.ndim == 1
+
+
+def _restore(array, was_1d):
+    return array[0] if was_1d else array
+
+
+def _recurse(values, step, seed=None):
+    """Run prev -> step(prev, x) along the last axis, restarting after NaN.
+
+    Where the previous output is NaN (padding or warm-up) the output is
+    `seed` at that bar (the input itself by default), matching the JS
+    convention of seeding an EMA with its first value.
+    """
+    seed = values if seed is None else seed
+    out = np.empty_like(values)
+    rows, bars = values.shape
+    if bars == 0:
+        return out
+
+    if rows < _VECTOR_ROWS:
+        # Plain float loops are far cheaper than per-bar NumPy calls here
+        for row in range(rows):
+            x = values[row].tolist()
+            s = seed[row].tolist()
+            o = out[row]
+            prev = s[0]
+            o[0] = prev
+            for i in range(1, bars):
+                prev = s[i] if prev != prev else step(prev, x[i])
+                o[i] = prev
+        return out
+
+    prev = seed[:, 0].copy()
+    out[:, 0] = prev
+    for i in range(1, bars):
+        prev = np.where(np.isnan(prev), seed[:, i], step(prev, values[:, i]))
+        out[:, i] = prev
+    return out
+
+
+def ema(data, period):
+    """Exponential moving average seeded with the first value (JS `EMA`)"""
+    if period <= 0:
+        raise ValueError("EMA period must be positive")
+    values, was_1d = _as_2d(data)
+    k = 2.0 / (period + 1)
+    return _restore(_recurse(values, lambda prev, x: x * k + prev * (1 - k)), was_1d)
+
+
+def _triple_ema(values, r, s, u):
+    return ema(ema(ema(values, r), s), u)
+
+
+def dti(high, low, r, s, u):
+    """Directional Trend Index (JS `calculateDTI`)"""
+    if r <= 0 or s <= 0 or u <= 0:
+        raise ValueError("Invalid EMA periods for DTI calculation")
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    if high.shape != low.shape:
+        raise ValueError("high and low must have the same shape")
+
+    rows = high.shape[0]
+    high_diff = np.zeros_like(high)
+    low_diff = np.zeros_like(low)
+    high_diff[:, 1:] = high[:, 1:] - high[:, :-1]
+    low_diff[:, 1:] = low[:, 1:] - low[:, :-1]
+
+    # NaN comparisons are False, so each series' first bar gets 0 like in JS
+    with np.errstate(invalid='ignore'):
+        xhmu = np.where(high_diff > 0, high_diff, 0.0)
+        xlmd = np.where(low_diff < 0, -low_diff, 0.0)
+    x_price = xhmu - xlmd
+    x_price[np.isnan(high)] = np.nan
+
+    # One EMA chain over both the signed and absolute momentum
+    smoothed = _triple_ema(np.vstack([x_price, np.abs(x_price)]), r, s, u)
+    numerator, denominator = smoothed[:rows], smoothed[rows:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(denominator != 0, 100 * numerator / denominator, 0.0)
+    result[np.isnan(denominator)] = np.nan
+    return _restore(result, was_1d)
+
+
+def _left_justify(values):
+    """Shift each row so its first valid bar sits in column 0.
+
+    Returns the shifted matrix (NaN-filled on the right) and each row's
+    original first-valid column.
+    """
+    rows, bars = values.shape
+    valid = ~np.isnan(values)
+    first = np.where(valid.any(axis=1), valid.argmax(axis=1), bars)
+    index = np.arange(bars)[None, :] + first[:, None]
+    shifted = np.take_along_axis(values, np.minimum(index, max(bars - 1, 0)), axis=1)
+    shifted[index >= bars] = np.nan
+    return shifted, first
+
+
+def aggregate_7day(high, low):
+    """Group bars into consecutive 7-bar periods (JS `aggregateTo7Day`).
+
+    Returns (period_high, period_low, period_index): the per-period extremes
+    and, for every bar, the index of its period (-1 on padding). Periods are
+    counted from each row's first valid bar, as the JS code does.
+    """
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    high_j, first = _left_justify(high)
+    low_j, _ = _left_justify(low)
+
+    rows, bars = high_j.shape
+    periods = -(-bars // 7)
+    padded = periods * 7
+    high_p = np.full((rows, padded), np.nan)
+    low_p = np.full((rows, padded), np.nan)
+    high_p[:, :bars] = high_j
+    low_p[:, :bars] = low_j
+    # fmax/fmin skip NaN and leave all-NaN periods as NaN without warnings
+    period_high = np.fmax.reduce(high_p.reshape(rows, periods, 7), axis=2)
+    period_low = np.fmin.reduce(low_p.reshape(rows, periods, 7), axis=2)
+
+    period_index = np.arange(bars)[None, :] - first[:, None]
+    period_index = np.where(period_index >= 0, period_index // 7, -1)
+    return (_restore(period_high, was_1d), _restore(period_low, was_1d),
+            _restore(period_index, was_1d))
+
+
+def map_periods(period_values, period_index):
+    """Map (symbols x periods) values back to bars by each bar's period column.
+
+    Returns (current, previous): the value of each bar's period and of the
+    period before it, NaN where period_index is -1 (or 0 for previous).
+    """
+    # Lookup table with a NaN slot at the end for "no period"
+    lookup = np.concatenate([period_values, np.full((period_values.shape[0], 1), np.nan)], axis=1)
+    no_period = lookup.shape[1] - 1
+    current = np.where(period_index >= 0, period_index, no_period)
+    previous = np.where(period_index >= 1, period_index - 1, no_period)
+    return np.take_along_axis(lookup, current, axis=1), np.take_along_axis(lookup, previous, axis=1)
+
+
+def seven_day_dti(high, low, r, s, u):
+    """7-day DTI mapped back to daily bars (JS `calculate7DayDTI`).
+
+    Returns a dict with:
+        seven_day_dti      DTI of each 7-bar period
+        daily_7day_dti     each bar's period DTI
+        previous_7day_dti  each bar's previous period DTI (NaN in period 0)
+        period_index       each bar's period number, so callers never need
+                           to scan the period list to find it
+    """
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    period_high, period_low, period_index = aggregate_7day(high, low)
+    period_high = period_high.reshape(high.shape[0], -1)
+    period_low = period_low.reshape(high.shape[0], -1)
+    period_index = period_index.reshape(high.shape)
+
+    period_dti = dti(period_high, period_low, r, s, u).reshape(period_high.shape)
+    daily, daily_previous = map_periods(period_dti, period_index)
+
+    return {
+        'seven_day_dti': _restore(period_dti, was_1d),
+        'daily_7day_dti': _restore(daily, was_1d),
+        'previous_7day_dti': _restore(daily_previous, was_1d),
+        'period_index': _restore(period_index, was_1d),
+    }
+
+
+def roc(data, period):
+    """Rate of change in percent (JS `calculateROC`); first `period` bars are NaN"""
+    if period <= 0:
+        raise ValueError("ROC period must be positive")
+    values, was_1d = _as_2d(data)
+    result = np.full_like(values, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[:, period:] = (values[:, period:] - values[:, :-period]) / values[:, :-period] * 100
+    return _restore(result, was_1d)
+
+
+def _wilder(values, period):
+    """Wilder smoothing seeded with the sum of the first `period` values"""
+    rows, bars = values.shape
+    window_sum = np.full_like(values, np.nan)
+    if bars >= period:
+        # Sum over windows that contain no padding; others stay NaN
+        zero = np.zeros((rows, 1))
+        cumulative = np.cumsum(np.concatenate([zero, np.nan_to_num(values)], axis=1), axis=1)
+        valid = np.cumsum(np.concatenate([zero, ~np.isnan(values)], axis=1), axis=1)
+        sums = cumulative[:, period:] - cumulative[:, :-period]
+        complete = (valid[:, period:] - valid[:, :-period]) == period
+        window_sum[:, period - 1:] = np.where(complete, sums, np.nan)
+    return _recurse(values, lambda prev, x: prev - prev / period + x, seed=window_sum)
+
+
+def adx(high, low, close, period=14):
+    """Average Directional Index with +DI and -DI (JS `calculateADX`).
+
+    The JS arrays start at bar `period - 1`; here they are aligned to the
+    input with NaN before that.
+    """
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+
+    prev_close = np.full_like(close, np.nan)
+    prev_close[:, 1:] = close[:, :-1]
+    with np.errstate(invalid='ignore'):
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+        high_diff = np.full_like(high, np.nan)
+        low_diff = np.full_like(low, np.nan)
+        high_diff[:, 1:] = high[:, 1:] - high[:, :-1]
+        low_diff[:, 1:] = low[:, :-1] - low[:, 1:]
+        plus_dm = np.where((high_diff > low_diff) & (high_diff > 0), high_diff, 0.0)
+        minus_dm = np.where((low_diff > high_diff) & (low_diff > 0), low_diff, 0.0)
+    padding = np.isnan(high)
+    plus_dm[padding] = np.nan
+    minus_dm[padding] = np.nan
+
+    smoothed_tr = _wilder(true_range, period)
+    smoothed_plus = _wilder(plus_dm, period)
+    smoothed_minus = _wilder(minus_dm, period)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = np.where(smoothed_tr != 0, smoothed_plus / smoothed_tr * 100, 0.0)
+        minus_di = np.where(smoothed_tr != 0, smoothed_minus / smoothed_tr * 100, 0.0)
+        di_sum = plus_di + minus_di
+        dx = np.where(di_sum != 0, np.abs(plus_di - minus_di) / di_sum * 100, 0.0)
+    warmup = np.isnan(smoothed_tr)
+    for array in (plus_di, minus_di, dx):
+        array[warmup] = np.nan
+
+    return {
+        'adx': _restore(ema(dx, period), was_1d),
+        'plus_di': _restore(plus_di, was_1d),
+        'minus_di': _restore(minus_di, was_1d),
+    }
+
+
+def bollinger_bands(data, period=20, std_dev=2, chunk_rows=256):
+    """Bollinger Bands with population standard deviation (JS `calculateBollingerBands`)"""
+    values, was_1d = _as_2d(data)
+    rows, bars = values.shape
+    upper = np.full_like(values, np.nan)
+    middle = np.full_like(values, np.nan)
+    lower = np.full_like(values, np.nan)
+    if bars >= period:
+        # Two-pass statistics over sliding windows, in row chunks to bound memory
+        for start in range(0, rows, chunk_rows):
+            windows = np.lib.stride_tricks.sliding_window_view(values[start:start + chunk_rows], period, axis=1)
+            mean = windows.mean(axis=2)
+            std = windows.std(axis=2)
+            middle[start:start + chunk_rows, period - 1:] = mean
+            upper[start:start + chunk_rows, period - 1:] = mean + std_dev * std
+            lower[start:start + chunk_rows, period - 1:] = mean - std_dev * std
+    return {
+        'upper': _restore(upper, was_1d),
+        'middle': _restore(middle, was_1d),
+        'lower': _restore(lower, was_1d),
+    }
+
+
+def index_indicators(store, r=14, s=10, u=5, symbols=None):
+    """DTI and 7-day DTI for every symbol of a PriceStore in one batched pass.
+
+    Returns the symbols in row order plus (symbols x bars) matrices, right
+    aligned on each symbol's latest bar.
+    """
+    symbols = symbols or store.symbols
+    high = store.matrix('high', symbols)
+    low = store.matrix('low', symbols)
+    weekly = seven_day_dti(high, low, r, s, u)
+    return {
+        'symbols': symbols,
+        'close': store.matrix('close', symbols),
+        'dti': dti(high, low, r, s, u),
+        'daily_7day_dti': weekly['daily_7day_dti'],
+        'previous_7day_dti': weekly['previous_7day_dti'],
+        'period_index': weekly['period_index'],
+    }
+
+
+def calendar_dti(store, period_store, index_column, r=14, s=10, u=5, symbols=None):
+    """DTI of calendar-week or month bars mapped back to a PriceStore's daily bars.
+
+    `period_store` is the resampled store (price_store.open_store(...,
+    frequency='1wk')) and `index_column` the daily store's matching
+    resample.INDEX_COLUMNS entry, so each daily bar finds its period with
+    one take. Returns 'period_dti' plus 'daily_dti' and 'previous_dti',
+    right aligned like index_indicators.
+    """
+    symbols = symbols or store.symbols
+    period_high = period_store.matrix('high', symbols)
+    period_dti = dti(period_high, period_store.matrix('low', symbols), r, s, u)
+    period_dti = period_dti.reshape(len(symbols), -1)
+
+    # Bucket numbers count from each symbol's first period; periods are right
+    # aligned, and the column before a symbol's first period is NaN padding
+    bar_period = store.matrix(index_column, symbols)
+    offset = period_high.shape[1] - (~np.isnan(period_store.matrix('date', symbols))).sum(axis=1)
+    column = np.where(np.isnan(bar_period), -1, bar_period + offset[:, None]).astype(np.int64)
+    current, previous = map_periods(period_dti, column)
+    return {'symbols': symbols, 'period_dti': period_dti, 'daily_dti': current, 'previous_dti': previous}
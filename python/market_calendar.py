@@ -0,0 +1,239 @@
+"""Trading sessions and holidays of the exchanges we pull data from.
+
+NYSE and LSE holidays follow fixed rules (observed/substitute days, Easter,
+nth-weekday holidays) plus a few one-off closures. Most NSE holidays follow
+the lunar calendar and are published by the exchange each December, so they
+are listed per year in NSE_HOLIDAYS; add the new year's circular there, or
+drop a {"NSE": ["YYYY-MM-DD", ...]} file at HOLIDAYS_FILE. A year that is
+missing only costs a refresh that finds no new bar.
+
+    last_refresh_due('NYSE')   # close of the latest finished session + REFRESH_DELAY
+    next_refresh_due('NSE')    # when the next session's data will be final
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from config import DATA_DIR
+import symbol_registry
+
+EXCHANGES = {
+    'NSE': {'tz': 'Asia/Kolkata', 'open': time(9, 15), 'close': time(15, 30)},
+    'LSE': {'tz': 'Europe/London', 'open': time(8, 0), 'close': time(16, 30)},
+    'NYSE': {'tz': 'America/New_York', 'open': time(9, 30), 'close': time(16, 0)},
+}
+
+# Time after the close before Yahoo's daily bar is final
+REFRESH_DELAY = timedelta(minutes=30)
+
+# Extra closures, merged with the rules and NSE_HOLIDAYS
+HOLIDAYS_FILE = os.path.join(DATA_DIR, "market_holidays.json")
+
+# Days searched for a session before giving up (longest closures are a few days)
+MAX_SEARCH_DAYS = 14
+
+MON, TUE, WED, THU, FRI, SAT, SUN = range(7)
+
+# NSE trading holidays that fall on weekdays, from the exchange's yearly circulars.
+# Republic Day, Maharashtra Day, Independence Day, Gandhi Jayanti and Christmas
+# are added by rule for every year.
+NSE_HOLIDAYS = {
+    2024: ['2024-01-22', '2024-03-08', '2024-03-25', '2024-03-29', '2024-04-11', '2024-04-17',
+           '2024-05-20', '2024-06-17', '2024-07-17', '2024-11-01', '2024-11-15', '2024-11-20'],
+    2025: ['2025-02-26', '2025-03-14', '2025-03-31', '2025-04-10', '2025-04-14', '2025-04-18',
+           '2025-08-27', '2025-10-21', '2025-10-22', '2025-11-05'],
+}
+
+# One-off closures (national days of mourning, royal events)
+SPECIAL_CLOSURES = {
+    'NYSE': ['2018-12-05', '2025-01-09'],
+    'LSE': ['2022-06-03', '2022-09-19', '2023-05-08'],
+    'NSE': [],
+}
+
+
+def easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def nth_weekday(year, month, weekday, n):
+    """n-th `weekday` of a month (n=-1 for the last)"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _us_observed(day):
+    """Saturday holidays are observed on Friday, Sunday ones on Monday"""
+    if day.weekday() == SAT:
+        return day - timedelta(days=1)
+    if day.weekday() == SUN:
+        return day + timedelta(days=1)
+    return day
+
+
+def _nyse_holidays(year):
+    good_friday = easter(year) - timedelta(days=2)
+    days = {
+        nth_weekday(year, 1, MON, 3),   # Martin Luther King Jr. Day
+        nth_weekday(year, 2, MON, 3),   # Washington's Birthday
+        good_friday,
+        nth_weekday(year, 5, MON, -1),  # Memorial Day
+        _us_observed(date(year, 7, 4)),
+        nth_weekday(year, 9, MON, 1),   # Labor Day
+        nth_weekday(year, 11, THU, 4),  # Thanksgiving
+        _us_observed(date(year, 12, 25)),
+    }
+    # A Saturday New Year's Day is not moved back into the previous year
+    if date(year, 1, 1).weekday() != SAT:
+        days.add(_us_observed(date(year, 1, 1)))
+    if year >= 2022:
+        days.add(_us_observed(date(year, 6, 19)))  # Juneteenth
+    return days
+
+
+def _uk_substitute(day, taken):
+    """Weekend bank holidays move to the next weekday not already a holiday"""
+    while day.weekday() >= SAT or day in taken:
+        day += timedelta(days=1)
+    return day
+
+
+def _lse_holidays(year):
+    easter_sunday = easter(year)
+    days = {
+        easter_sunday - timedelta(days=2),  # Good Friday
+        easter_sunday + timedelta(days=1),  # Easter Monday
+        nth_weekday(year, 5, MON, 1),       # Early May bank holiday
+        nth_weekday(year, 8, MON, -1),      # Summer bank holiday
+    }
+    # Spring bank holiday; moved for the 2022 Platinum Jubilee
+    days.add(date(2022, 6, 2) if year == 2022 else nth_weekday(year, 5, MON, -1))
+    days.add(_uk_substitute(date(year, 1, 1), days))
+    christmas = _uk_substitute(date(year, 12, 25), days)
+    days.add(christmas)
+    days.add(_uk_substitute(max(date(year, 12, 26), christmas + timedelta(days=1)), days))
+    return days
+
+
+def _nse_holidays(year):
+    days = {date(year, 1, 26), date(year, 5, 1), date(year, 8, 15), date(year, 10, 2), date(year, 12, 25)}
+    days.update(date.fromisoformat(day) for day in NSE_HOLIDAYS.get(year, []))
+    return days
+
+
+@lru_cache(maxsize=None)
+def _file_holidays(path=HOLIDAYS_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return {exchange: {date.fromisoformat(day) for day in days} for exchange, days in json.load(f).items()}
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not read market holidays from {path}: {e}")
+        return {}
+
+
+@lru_cache(maxsize=None)
+def holidays(exchange, year):
+    """Weekday closures of an exchange in a year"""
+    rules = {'NYSE': _nyse_holidays, 'LSE': _lse_holidays, 'NSE': _nse_holidays}[exchange]
+    days = set(rules(year))
+    days.update(date.fromisoformat(day) for day in SPECIAL_CLOSURES[exchange])
+    days.update(_file_holidays().get(exchange, ()))
+    return frozenset(day for day in days if day.year == year and day.weekday() < SAT)
+
+
+def early_close(exchange, day):
+    """Close time of a half-day session, or None for a full session"""
+    if exchange == 'NYSE':
+        july_4 = date(day.year, 7, 4)
+        if (day == date(day.year, 7, 3) and july_4.weekday() in (TUE, WED, THU, FRI)
+                or day == nth_weekday(day.year, 11, THU, 4) + timedelta(days=1)
+                or day == date(day.year, 12, 24) and day.weekday() < FRI):
+            return time(13, 0)
+    elif exchange == 'LSE':
+        if day.month == 12 and day.day in (24, 31):
+            return time(12, 30)
+    return None
+
+
+def exchange_for_symbol(symbol):
+    return symbol_registry.exchange(symbol)
+
+
+def is_trading_day(exchange, day):
+    return day.weekday() < SAT and day not in holidays(exchange, day.year)
+
+
+def session_close(exchange, day):
+    """Timezone-aware close of the session on `day`"""
+    info = EXCHANGES[exchange]
+    close = early_close(exchange, day) or info['close']
+    return datetime.combine(day, close, tzinfo=ZoneInfo(info['tz']))
+
+
+def to_aware(moment):
+    """Naive datetimes (as stored in metadata) are local time"""
+    return moment if moment.tzinfo is not None else moment.astimezone()
+
+
+def local_date(exchange, moment):
+    """Calendar date at the exchange at `moment`"""
+    return to_aware(moment).astimezone(ZoneInfo(EXCHANGES[exchange]['tz'])).date()
+
+
+def last_refresh_due(exchange, now=None, delay=REFRESH_DELAY):
+    """Latest session close + `delay` that is not after `now`.
+
+    Data fetched after this moment already holds the final bar of the
+    exchange's most recent session.
+    """
+    now = to_aware(now or datetime.now())
+    day = local_date(exchange, now)
+    for _ in range(MAX_SEARCH_DAYS):
+        if is_trading_day(exchange, day):
+            due = session_close(exchange, day) + delay
+            if due <= now:
+                return due
+        day -= timedelta(days=1)
+    raise ValueError(f"No {exchange} session in the {MAX_SEARCH_DAYS} days before {now}")
+
+
+def next_refresh_due(exchange, now=None, delay=REFRESH_DELAY):
+    """First session close + `delay` after `now`"""
+    now = to_aware(now or datetime.now())
+    day = local_date(exchange, now)
+    for _ in range(MAX_SEARCH_DAYS):
+        if is_trading_day(exchange, day):
+            due = session_close(exchange, day) + delay
+            if due > now:
+                return due
+        day += timedelta(days=1)
+    raise ValueError(f"No {exchange} session in the {MAX_SEARCH_DAYS} days after {now}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else date.today().year
+    now = datetime.now().astimezone()
+    for exchange in EXCHANGES:
+        print(f"{exchange}: last refresh due {last_refresh_due(exchange, now):%Y-%m-%d %H:%M %Z}, "
+              f"next {next_refresh_due(exchange, now):%Y-%m-%d %H:%M %Z}")
+        print("  holidays " + ", ".join(f"{day:%b %d}" for day in sorted(holidays(exchange, year))))
@@ -0,0 +1,158 @@
+"""Per-symbol update metadata kept in SQLite (WAL mode).
+
+Replaces rewriting the whole of DATA/metadata.json on every symbol: reads and
+writes touch one row, readers never block on writers, and every write is an
+atomic transaction. metadata.json is still produced by export_json() for the
+frontend, once per batch instead of once per symbol.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from config import DATA_DIR, METADATA_FILE
+import market_calendar
+
+DB_FILE = os.path.join(DATA_DIR, "metadata.db")
+
+# Don't refetch a symbol updated this recently
+MIN_UPDATE_INTERVAL = timedelta(minutes=30)
+
+# SQLite's default limit on host parameters per statement is 999
+QUERY_CHUNK = 900
+
+_local = threading.local()
+
+
+def get_connection(db_file=DB_FILE):
+    """Return this thread's connection, creating the schema on first use"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    if db_file not in connections:
+        is_new = not os.path.exists(db_file)
+        conn = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS symbols (
+                symbol TEXT PRIMARY KEY,
+                last_updated TEXT NOT NULL,
+                status TEXT NOT NULL
+            )
+        """)
+        connections[db_file] = conn
+        if is_new and db_file == DB_FILE:
+            import_json(METADATA_FILE, db_file)
+    return connections[db_file]
+
+
+def import_json(json_path=METADATA_FILE, db_file=DB_FILE):
+    """Seed the database from an existing metadata.json"""
+    if not os.path.exists(json_path):
+        return 0
+    try:
+        with open(json_path, 'r') as f:
+            symbols = json.load(f).get('symbols', {})
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not import {json_path}: {e}")
+        return 0
+    entries = [(symbol, info.get('last_updated'), info.get('status', 'success'))
+               for symbol, info in symbols.items() if info.get('last_updated')]
+    set_symbols(entries, db_file)
+    logging.info(f"Imported {len(entries)} symbols from {json_path}")
+    return len(entries)
+
+
+def set_symbol(symbol, status='success', last_updated=None, db_file=DB_FILE):
+    """Record that a symbol was updated"""
+    set_symbols([(symbol, last_updated, status)], db_file)
+
+
+def set_symbols(entries, db_file=DB_FILE):
+    """Record many (symbol, last_updated, status) updates in one transaction"""
+    now = datetime.now().isoformat()
+    rows = [(symbol, last_updated or now, status) for symbol, last_updated, status in entries]
+    conn = get_connection(db_file)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO symbols (symbol, last_updated, status) VALUES (?, ?, ?) "
+            "ON CONFLICT(symbol) DO UPDATE SET last_updated = excluded.last_updated, "
+            "status = excluded.status",
+            rows
+        )
+
+
+def get_symbols(symbols, db_file=DB_FILE):
+    """Fetch {symbol: {'last_updated', 'status'}} for the given symbols"""
+    conn = get_connection(db_file)
+    symbols = list(symbols)
+    found = {}
+    for i in range(0, len(symbols), QUERY_CHUNK):
+        chunk = symbols[i:i + QUERY_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        for symbol, last_updated, status in conn.execute(
+            f"SELECT symbol, last_updated, status FROM symbols WHERE symbol IN ({placeholders})", chunk
+        ):
+            found[symbol] = {'last_updated': last_updated, 'status': status}
+    return found
+
+
+def get_symbol(symbol, db_file=DB_FILE):
+    """Metadata of one symbol, or None if it was never updated"""
+    return get_symbols([symbol], db_file).get(symbol)
+
+
+def needs_update(symbol, last_updated, now=None, refresh_due=None):
+    """Decide whether a symbol last updated at `last_updated` should be refetched.
+
+    A symbol is stale once its exchange has finished a session after the
+    last update (see market_calendar.last_refresh_due), so weekends and
+    holidays never trigger a refetch. Pass `refresh_due` to reuse one
+    calendar lookup for many symbols of the same exchange.
+    """
+    if last_updated is None:
+        return True
+    now = now or datetime.now()
+
+    # If data was updated in the last 30 minutes, don't update again
+    if now - last_updated < MIN_UPDATE_INTERVAL:
+        return False
+
+    if refresh_due is None:
+        refresh_due = market_calendar.last_refresh_due(market_calendar.exchange_for_symbol(symbol), now)
+    return market_calendar.to_aware(last_updated) < refresh_due
+
+
+def symbols_needing_update(symbols, now=None, db_file=DB_FILE):
+    """Return the subset of `symbols` that need refetching, in input order"""
+    now = now or datetime.now()
+    known = get_symbols(symbols, db_file)
+    due = {exchange: market_calendar.last_refresh_due(exchange, now) for exchange in market_calendar.EXCHANGES}
+    stale = []
+    for symbol in symbols:
+        info = known.get(symbol)
+        last_updated = datetime.fromisoformat(info['last_updated']) if info else None
+        if needs_update(symbol, last_updated, now, due[market_calendar.exchange_for_symbol(symbol)]):
+            stale.append(symbol)
+    return stale
+
+
+def export_json(json_path=METADATA_FILE, db_file=DB_FILE):
+    """Atomically write the metadata.json consumed by the frontend"""
+    conn = get_connection(db_file)
+    symbols = {
+        symbol: {'last_updated': last_updated, 'status': status}
+        for symbol, last_updated, status in conn.execute(
+            "SELECT symbol, last_updated, status FROM symbols ORDER BY last_updated"
+        )
+    }
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'symbols': symbols}, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, json_path)
+    return len(symbols)
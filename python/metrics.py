@@ -0,0 +1,284 @@
+"""Stage timers, latency histograms and counters for the ingest pipelines.
+
+The fetch and batch code records into one process-wide registry:
+
+    with metrics.stage('download'):
+        data = ticker.history(...)
+    metrics.count('bytes_written', size)
+    metrics.observe('symbol_seconds', elapsed)
+
+and a run ends with write_report(), which saves a JSON report and a
+Prometheus text-format file (for node_exporter's textfile collector).
+backend/ imports this module too (see backend/shared.py) and reports
+under its own prefix.
+Stage times are summed over threads, so with concurrent workers they can
+exceed the run's wall time; compare stages with each other, not with
+`elapsed`. profile() wraps a run in cProfile when given a path.
+
+Inside trace_memory() every stage also records the peak of Python
+allocations (tracemalloc) while it ran, and the report carries the run's
+overall peak and the process's peak RSS. The peak is process-wide, so a
+stage running next to others on threads is charged for their memory too.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Samples kept per histogram for exact percentiles in the JSON report
+MAX_SAMPLES = 100000
+
+PROMETHEUS_PREFIX = "bt88_ingest"
+
+
+class Metrics:
+    """Thread-safe registry of stage timers, histograms and counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.now()
+            self.start = time.perf_counter()
+            self.stages = {}      # name -> {'calls', 'seconds', 'maxSeconds'}
+            self.histograms = {}  # name -> {'buckets', 'count', 'sum', 'samples'}
+            self.counters = {}
+            self.peaks = {}       # stage name -> peak traced bytes while it ran
+            self.peak = 0         # peak traced bytes of the run
+            self.open_stages = []
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'maxSeconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['maxSeconds'] = max(entry['maxSeconds'], seconds)
+
+    def _fold_peak(self):
+        """Charge the traced peak since the last fold to every running stage (lock held)"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for name in self.open_stages:
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+        self.peak = max(self.peak, peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        traced = tracemalloc.is_tracing()
+        if traced:
+            with self.lock:
+                self._fold_peak()
+                self.open_stages.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+            if traced:
+                with self.lock:
+                    if tracemalloc.is_tracing():
+                        self._fold_peak()
+                    self.open_stages.remove(name)
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'count': 0, 'sum': 0.0, 'samples': []
+                }
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if value <= bound), len(LATENCY_BUCKETS))
+            histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            if len(histogram['samples']) < MAX_SAMPLES:
+                histogram['samples'].append(value)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self, extra=None):
+        """Snapshot of everything recorded since the last reset, JSON-serializable"""
+        with self.lock:
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                samples = sorted(histogram['samples'])
+                histograms[name] = {
+                    'count': histogram['count'],
+                    'sum': round(histogram['sum'], 6),
+                    'p50': _percentile(samples, 50),
+                    'p90': _percentile(samples, 90),
+                    'p99': _percentile(samples, 99),
+                    'max': samples[-1] if samples else None,
+                    'buckets': {('+Inf' if i == len(LATENCY_BUCKETS) else str(LATENCY_BUCKETS[i])): n
+                                for i, n in enumerate(histogram['buckets'])},
+                }
+            stages = {name: dict(entry, seconds=round(entry['seconds'], 6),
+                                 maxSeconds=round(entry['maxSeconds'], 6))
+                      for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]['seconds'])}
+            if tracemalloc.is_tracing():
+                self._fold_peak()
+            for name, peak in self.peaks.items():
+                if name in stages:
+                    stages[name]['peakBytes'] = peak
+            report = {
+                'startedAt': self.started_at.isoformat(),
+                'elapsed': round(time.perf_counter() - self.start, 6),
+                'stages': stages,
+                'histograms': histograms,
+                'counters': dict(sorted(self.counters.items())),
+            }
+            if self.peak:
+                report['peakTracedBytes'] = self.peak
+        if resource is not None:
+            # ru_maxrss is in KiB on Linux and in bytes on macOS
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            report['maxRssBytes'] = maxrss if sys.platform == 'darwin' else maxrss * 1024
+        report.update(extra or {})
+        return report
+
+
+def _percentile(samples, percent):
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def prometheus_text(report, prefix=PROMETHEUS_PREFIX):
+    """Render a report in the Prometheus text exposition format"""
+    lines = [f"# TYPE {prefix}_elapsed_seconds gauge", f"{prefix}_elapsed_seconds {report['elapsed']}"]
+    lines += [f"# TYPE {prefix}_stage_seconds_total counter"]
+    lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {entry["seconds"]}'
+              for name, entry in report['stages'].items()]
+    lines += [f"# TYPE {prefix}_stage_calls_total counter"]
+    lines += [f'{prefix}_stage_calls_total{{stage="{name}"}} {entry["calls"]}'
+              for name, entry in report['stages'].items()]
+    peaks = {name: entry['peakBytes'] for name, entry in report['stages'].items() if 'peakBytes' in entry}
+    if peaks:
+        lines += [f"# TYPE {prefix}_stage_peak_bytes gauge"]
+        lines += [f'{prefix}_stage_peak_bytes{{stage="{name}"}} {peak}' for name, peak in peaks.items()]
+    for key, metric in (('peakTracedBytes', 'peak_traced_bytes'), ('maxRssBytes', 'max_rss_bytes')):
+        if key in report:
+            lines += [f"# TYPE {prefix}_{metric} gauge", f"{prefix}_{metric} {report[key]}"]
+    for name, value in report['counters'].items():
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+    for name, histogram in report['histograms'].items():
+        lines.append(f"# TYPE {prefix}_{name} histogram")
+        cumulative = 0
+        for bound, n in histogram['buckets'].items():
+            cumulative += n
+            lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{prefix}_{name}_sum {histogram['sum']}", f"{prefix}_{name}_count {histogram['count']}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(directory, name="ingest", extra=None, registry=None, prefix=PROMETHEUS_PREFIX):
+    """Write <name>-<timestamp>.json and <name>.prom (latest run) into `directory`"""
+    report = (registry or METRICS).report(extra)
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    json_path = os.path.join(directory, f"{name}-{stamp}.json")
+    prom_path = os.path.join(directory, f"{name}.prom")
+    with open(json_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    # Write-then-rename so a scraper never reads a half-written file
+    with open(prom_path + '.tmp', 'w') as f:
+        f.write(prometheus_text(report, prefix))
+    os.replace(prom_path + '.tmp', prom_path)
+    return json_path, prom_path
+
+
+def summary(report, top=8):
+    """Short text table of the slowest stages and the latency percentiles"""
+    traced = any('peakBytes' in entry for entry in report['stages'].values())
+    lines = ["Stage                    calls    seconds      max" + ("   peak MB" if traced else "")]
+    for name, entry in list(report['stages'].items())[:top]:
+        lines.append(f"{name:<22} {entry['calls']:>7} {entry['seconds']:>10.2f} {entry['maxSeconds']:>8.2f}"
+                     + ((f" {entry['peakBytes'] / 1e6:>9.1f}" if 'peakBytes' in entry else f" {'-':>9}")
+                        if traced else ""))
+    for name, histogram in report['histograms'].items():
+        if histogram['count']:
+            lines.append(f"{name}: p50 {histogram['p50']:.3f}s  p90 {histogram['p90']:.3f}s  "
+                         f"p99 {histogram['p99']:.3f}s  max {histogram['max']:.3f}s  (n={histogram['count']})")
+    if report['counters']:
+        lines.append("  ".join(f"{name}={value}" for name, value in report['counters'].items()))
+    memory = [f"{label} {report[key] / 1e6:.1f} MB" for key, label in
+              (('peakTracedBytes', 'traced peak'), ('maxRssBytes', 'max RSS')) if key in report]
+    if memory:
+        lines.append("Memory: " + ", ".join(memory))
+    return "\n".join(lines)
+
+
+@contextmanager
+def profile(path=None, top=25):
+    """Run the block under cProfile and dump stats to `path` (no-op without a path)"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        print(f"Profile written to {path}\n{out.getvalue()}")
+
+
+@contextmanager
+def trace_memory(enabled=True):
+    """Trace allocations for the block so stages record their peak memory (no-op when disabled).
+
+    tracemalloc slows allocation-heavy code down severalfold, so this is
+    for diagnostic runs, not for every batch.
+    """
+    if not enabled or tracemalloc.is_tracing():
+        yield
+        return
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        with METRICS.lock:
+            METRICS._fold_peak()
+        tracemalloc.stop()
+
+
+# Process-wide registry used by the module-level helpers
+METRICS = Metrics()
+
+
+def stage(name):
+    return METRICS.stage(name)
+
+
+def observe(name, value):
+    METRICS.observe(name, value)
+
+
+def count(name, amount=1):
+    METRICS.count(name, amount)
+
+
+def reset():
+    METRICS.reset()
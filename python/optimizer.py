@@ -0,0 +1,351 @@
+"""Parallel DTI parameter sweep (server-side `findOptimalParameters`).
+
+The JS optimizer re-computes DTI and 7-day DTI for every one of the 3^7
+combinations and runs the bar-by-bar backtest each time. Here indicators
+are computed once per (r, s, u) for a whole block of symbols, and all
+entry-threshold / take-profit / stop-loss / max-days combinations are
+evaluated together:
+
+1. every bar that is an entry signal for any threshold becomes a candidate;
+2. for each candidate the exit bar of every (tp, sl, max-days) rule is found
+   with array operations over the following bars;
+3. the non-overlapping trade sequence of every combination is then walked
+   in lock-step, one trade per iteration for all combinations at once.
+
+Work is split into (r, s, u) x symbol-block tasks on a process pool; each
+worker reads prices straight from the memory-mapped price store.
+"""
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import indicators
+from backtest import (
+    SECONDS_PER_DAY, DEFAULT_PARAMS, warmup_end, get_conviction_level, empty_metrics
+)
+from config import DATA_DIR
+from price_store import open_store
+
+DEFAULT_RANGES = {
+    'r': [7, 14, 21],
+    's': [5, 10, 15],
+    'u': [3, 5, 7],
+    'entryThreshold': [-50, -40, -30],
+    'takeProfitPercent': [5, 8, 10],
+    'stopLossPercent': [3, 5, 7],
+    'maxHoldingDays': [15, 30, 45],
+}
+EXIT_KEYS = ['entryThreshold', 'takeProfitPercent', 'stopLossPercent', 'maxHoldingDays']
+MIN_TRADES_FOR_BEST = 5
+SWEEP_BLOCK_SIZE = 128  # symbols per process-pool task
+OPTIMIZER_DIR = os.path.join(DATA_DIR, "optimizer")
+
+# Per-combination accumulators returned by sweep_block
+METRIC_FIELDS = ['trades', 'wins', 'gross_profit', 'gross_loss', 'total_return',
+                 'holding_days', 'take_profit', 'stop_loss', 'time_exit', 'max_drawdown']
+
+# Row offset that keeps flattened per-symbol date rows globally sorted
+_ROW_OFFSET = 1e11
+
+
+def _next_signal_table(signals):
+    """For every bar b, the first bar >= b with a signal (W if none); one extra column for b = W"""
+    bars = signals.shape[-1]
+    index = np.where(signals, np.arange(bars), bars)
+    table = np.minimum.accumulate(index[..., ::-1], axis=-1)[..., ::-1]
+    pad = np.full(signals.shape[:-1] + (1,), bars)
+    return np.concatenate([table, pad], axis=-1)
+
+
+def _first_hit(mask, entry_bars, bars):
+    """Bar of the first True along axis 1 of a (K, H, n) mask, or `bars` if none"""
+    hit = mask.any(axis=1)
+    return np.where(hit, entry_bars[:, None] + 1 + mask.argmax(axis=1), bars)
+
+
+def sweep_block(dates, high, low, close, r, s, u, ranges=None, enable_7day=True):
+    """Evaluate every exit-rule combination for one (r, s, u) on a block of symbols.
+
+    Inputs are (symbols x bars) matrices right-aligned on the latest bar and
+    left-padded with NaN, as returned by PriceStore.matrix. Returns a dict of
+    METRIC_FIELDS arrays shaped (symbols, thresholds, take_profits,
+    stop_losses, max_days).
+    """
+    ranges = dict(DEFAULT_RANGES, **(ranges or {}))
+    thresholds = np.asarray(ranges['entryThreshold'], dtype=np.float64)
+    take_profits = np.asarray(ranges['takeProfitPercent'], dtype=np.float64)
+    stop_losses = np.asarray(ranges['stopLossPercent'], dtype=np.float64)
+    max_days = np.asarray(ranges['maxHoldingDays'], dtype=np.float64)
+    shape = (len(thresholds), len(take_profits), len(stop_losses), len(max_days))
+    exit_combos = shape[1] * shape[2] * shape[3]
+
+    dates = np.atleast_2d(np.asarray(dates, dtype=np.float64))
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    symbols, bars = close.shape
+    valid = ~np.isnan(close)
+
+    dti = np.atleast_2d(indicators.dti(high, low, r, s, u))
+    seven_day = indicators.seven_day_dti(np.atleast_2d(high), np.atleast_2d(low), r, s, u)
+    daily_7day = seven_day['daily_7day_dti']
+    previous_7day = seven_day['previous_7day_dti']
+
+    # Entry conditions shared by all thresholds
+    first = np.where(valid.any(axis=1), valid.argmax(axis=1), 0)
+    earliest = np.array([warmup_end(dates[row, first[row]]) if valid[row].any() else np.inf
+                         for row in range(symbols)])
+    previous_dti = np.full_like(dti, np.nan)
+    previous_dti[:, 1:] = dti[:, :-1]
+    with np.errstate(invalid='ignore'):
+        base = valid & (dti > previous_dti) & (dates >= earliest[:, None])
+        if enable_7day:
+            base &= np.isnan(previous_7day) | (daily_7day > previous_7day)
+        signals = base[None] & (dti[None] < thresholds[:, None, None])
+
+    candidate_symbol, candidate_bar = np.nonzero(signals.any(axis=0))
+    result = {field: np.zeros((symbols,) + shape) for field in METRIC_FIELDS}
+    if len(candidate_symbol) == 0:
+        return result
+    rank = np.full((symbols, bars), -1, dtype=np.int64)
+    rank[candidate_symbol, candidate_bar] = np.arange(len(candidate_symbol))
+
+    # Time exits: first bar at least `max_days` calendar days after entry
+    flat_dates = (np.where(valid, dates, -1.0) + np.arange(symbols)[:, None] * _ROW_OFFSET).ravel()
+    entry_dates = flat_dates[candidate_symbol * bars + candidate_bar]
+    targets = entry_dates[:, None] + max_days[None, :] * SECONDS_PER_DAY
+    time_bar = np.searchsorted(flat_dates, targets, side='left') - (candidate_symbol * bars)[:, None]
+    time_bar = np.minimum(time_bar, bars)
+
+    # P/L path over the bars each candidate can stay open
+    horizon = max(1, int((np.minimum(time_bar.max(axis=1), bars - 1) - candidate_bar).max()))
+    path_bars = candidate_bar[:, None] + np.arange(1, horizon + 1)[None, :]
+    inside = path_bars < bars
+    entry_price = close[candidate_symbol, candidate_bar]
+    path = close[candidate_symbol[:, None], np.minimum(path_bars, bars - 1)]
+    with np.errstate(invalid='ignore'):
+        pl = (path - entry_price[:, None]) / entry_price[:, None] * 100
+        pl[~inside] = np.nan
+        take_profit_bar = _first_hit(pl[:, :, None] >= take_profits, candidate_bar, bars)
+        stop_loss_bar = _first_hit(pl[:, :, None] <= -stop_losses, candidate_bar, bars)
+
+    # Exit bar and reason of every candidate under every (tp, sl, days) rule;
+    # on the same bar take profit wins over stop loss over time exit
+    tp_b = take_profit_bar[:, :, None, None]
+    sl_b = stop_loss_bar[:, None, :, None]
+    tm_b = time_bar[:, None, None, :]
+    exit_bar = np.minimum(np.minimum(tp_b, sl_b), tm_b)
+    reason = np.where(exit_bar == tp_b, 0, np.where(exit_bar == sl_b, 1, 2))
+    exit_bar = exit_bar.reshape(len(candidate_symbol), exit_combos)
+    reason = reason.reshape(len(candidate_symbol), exit_combos)
+
+    # Walk the trade sequence of all (symbol, threshold, exit rule) combos at once
+    next_signal = _next_signal_table(signals)
+    combo_symbol, combo_threshold, combo_exit = [a.ravel() for a in np.meshgrid(
+        np.arange(symbols), np.arange(len(thresholds)), np.arange(exit_combos), indexing='ij')]
+    combos = len(combo_symbol)
+    acc = {field: np.zeros(combos) for field in METRIC_FIELDS}
+    equity = np.full(combos, 100.0)
+    peak = np.zeros(combos)
+
+    live = np.arange(combos)
+    start = np.zeros(combos, dtype=np.int64)
+    while len(live):
+        sym = combo_symbol[live]
+        entry = next_signal[combo_threshold[live], sym, start[live]]
+        has_entry = entry < bars
+        live, sym, entry = live[has_entry], sym[has_entry], entry[has_entry]
+
+        k = rank[sym, entry]
+        exit_at = exit_bar[k, combo_exit[live]]
+        completed = exit_at < bars  # otherwise the trade is still open at the end
+        live, sym, entry, k, exit_at = (live[completed], sym[completed], entry[completed],
+                                        k[completed], exit_at[completed])
+        why = reason[k, combo_exit[live]]
+
+        trade_pl = (close[sym, exit_at] - entry_price[k]) / entry_price[k] * 100
+        win = trade_pl > 0
+        acc['trades'][live] += 1
+        acc['wins'][live] += win
+        acc['gross_profit'][live] += np.where(win, trade_pl, 0)
+        acc['gross_loss'][live] += np.where(win, 0, -trade_pl)
+        acc['total_return'][live] += trade_pl
+        acc['holding_days'][live] += np.floor((dates[sym, exit_at] - dates[sym, entry]) / SECONDS_PER_DAY)
+        acc['take_profit'][live] += why == 0
+        acc['stop_loss'][live] += why == 1
+        acc['time_exit'][live] += why == 2
+
+        equity[live] *= 1 + trade_pl / 100
+        peak[live] = np.maximum(peak[live], equity[live])
+        acc['max_drawdown'][live] = np.maximum(acc['max_drawdown'][live],
+                                               (peak[live] - equity[live]) / peak[live] * 100)
+        start[live] = exit_at + 1
+
+    return {field: values.reshape((symbols,) + shape) for field, values in acc.items()}
+
+
+def metrics_from_sweep(acc, index):
+    """Build the JS metrics dict of one combination from sweep accumulators"""
+    trades = int(acc['trades'][index])
+    if trades == 0:
+        return empty_metrics()
+    wins = int(acc['wins'][index])
+    gross_profit = float(acc['gross_profit'][index])
+    gross_loss = float(acc['gross_loss'][index])
+    total_return = float(acc['total_return'][index])
+    win_rate = wins / trades * 100
+    if gross_loss > 0:
+        profit_factor = gross_profit / gross_loss
+    else:
+        profit_factor = math.inf if gross_profit > 0 else 0
+    return {
+        'totalTrades': trades,
+        'winningTrades': wins,
+        'losingTrades': trades - wins,
+        'winRate': win_rate,
+        'avgProfit': total_return / trades,
+        'totalReturn': total_return,
+        'profitFactor': profit_factor,
+        'maxDrawdown': float(acc['max_drawdown'][index]),
+        'avgHoldingPeriod': float(acc['holding_days'][index]) / trades,
+        'takeProfitCount': int(acc['take_profit'][index]),
+        'stopLossCount': int(acc['stop_loss'][index]),
+        'timeExitCount': int(acc['time_exit'][index]),
+        'endOfDataCount': 0,
+        'convictionLevel': get_conviction_level(win_rate, trades),
+    }
+
+
+def _scores(acc):
+    """JS score totalReturn * winRate * profitFactor; -inf where ineligible"""
+    trades = acc['trades']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(trades > 0, acc['wins'] / trades, 0)
+        profit_factor = np.where(acc['gross_loss'] > 0, acc['gross_profit'] / acc['gross_loss'],
+                                 np.where(acc['gross_profit'] > 0, np.inf, 0))
+        score = acc['total_return'] * win_rate * profit_factor
+    return np.where((trades >= MIN_TRADES_FOR_BEST) & ~np.isnan(score), score, -np.inf)
+
+
+def _params_at(ranges, index):
+    """Parameter dict of the index-th combination in the JS loop order (r, s, u outermost)"""
+    keys = ['r', 's', 'u'] + EXIT_KEYS
+    positions = np.unravel_index(index, [len(ranges[key]) for key in keys])
+    return {key: ranges[key][int(i)] for key, i in zip(keys, positions)}
+
+
+def collect_results(sweeps, ranges, include_all=True):
+    """Turn per-(r, s, u) accumulators of one symbol into {bestResult, allResults}.
+
+    `sweeps` maps (r, s, u) -> accumulators sliced to that symbol. Unlike the
+    JS version, whose initial best score is -Infinity * 0 (NaN) and so never
+    updates, the best eligible combination is actually returned.
+    """
+    rsu_keys = [(r, s, u) for r in ranges['r'] for s in ranges['s'] for u in ranges['u']]
+    acc = {field: np.stack([sweeps[key][field] for key in rsu_keys]).ravel()
+           for field in METRIC_FIELDS}
+    scores = _scores(acc)
+
+    best = {'params': None, 'metrics': {'totalReturn': -math.inf, 'winRate': 0, 'profitFactor': 0}}
+    index = int(np.argmax(scores))
+    if scores[index] > -np.inf:
+        best = {'params': _params_at(ranges, index), 'metrics': metrics_from_sweep(acc, index)}
+
+    all_results = []
+    if include_all:
+        all_results = [{'params': _params_at(ranges, i), 'metrics': metrics_from_sweep(acc, i)}
+                       for i in range(len(scores))]
+    return {'bestResult': best, 'allResults': all_results}
+
+
+def find_optimal_parameters(dates, high, low, close, param_ranges=None,
+                            enable_7day=DEFAULT_PARAMS['enable7DayDTI']):
+    """Grid search for one symbol, returning the JS {bestResult, allResults} shape"""
+    ranges = dict(DEFAULT_RANGES, **(param_ranges or {}))
+    arrays = [np.asarray(a, dtype=np.float64)[None, :] for a in (dates, high, low, close)]
+    sweeps = {}
+    for r in ranges['r']:
+        for s in ranges['s']:
+            for u in ranges['u']:
+                block = sweep_block(*arrays, r, s, u, ranges, enable_7day)
+                sweeps[(r, s, u)] = {field: values[0] for field, values in block.items()}
+    return collect_results(sweeps, ranges)
+
+
+_worker_stores = {}
+
+
+def _sweep_task(task):
+    """Process-pool task: one (r, s, u) over one block of symbols of a store"""
+    store_dir, index_folder, symbols, rsu, ranges, enable_7day = task
+    key = (store_dir, index_folder)
+    if key not in _worker_stores:
+        _worker_stores[key] = open_store(index_folder, store_dir)
+    store = _worker_stores[key]
+    matrices = [store.matrix(name, symbols) for name in ('date', 'high', 'low', 'close')]
+    return rsu, symbols, sweep_block(*matrices, *rsu, ranges, enable_7day)
+
+
+def optimize_index(index_folder, param_ranges=None, workers=None, data_dir=DATA_DIR,
+                   include_all=False, enable_7day=DEFAULT_PARAMS['enable7DayDTI'],
+                   block_size=SWEEP_BLOCK_SIZE):
+    """Sweep every symbol of an index folder's price store on a process pool.
+
+    Returns {symbol: {'bestResult', 'allResults'}}; allResults is only filled
+    when include_all=True since it holds one entry per combination.
+    """
+    ranges = dict(DEFAULT_RANGES, **(param_ranges or {}))
+    store = open_store(index_folder, data_dir)
+    symbols = store.symbols
+    blocks = [symbols[i:i + block_size] for i in range(0, len(symbols), block_size)]
+    tasks = [(data_dir, index_folder, block, (r, s, u), ranges, enable_7day)
+             for r in ranges['r'] for s in ranges['s'] for u in ranges['u']
+             for block in blocks]
+
+    per_symbol = {symbol: {} for symbol in symbols}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rsu, block, acc in executor.map(_sweep_task, tasks):
+            for row, symbol in enumerate(block):
+                per_symbol[symbol][rsu] = {field: values[row] for field, values in acc.items()}
+
+    return {symbol: collect_results(sweeps, ranges, include_all)
+            for symbol, sweeps in per_symbol.items()}
+
+
+def json_safe(value):
+    """Replace infinities, which JSON.parse rejects, with null"""
+    if isinstance(value, float) and math.isinf(value):
+        return None
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [json_safe(v) for v in value]
+    return value
+
+
+def write_results(index_folder, results, output_dir=OPTIMIZER_DIR):
+    """Write sweep results to DATA/optimizer/<index_folder>.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{index_folder}.json")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(json_safe(results), f)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sweep DTI strategy parameters over an index')
+    parser.add_argument('index', help='Index folder under DATA/ (e.g. ftse100, us_stocks)')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: all cores)')
+    parser.add_argument('--all', action='store_true', help='Include every combination, not just the best')
+    parser.add_argument('--ranges', help='JSON object overriding parameter ranges')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = optimize_index(args.index, json.loads(args.ranges) if args.ranges else None,
+                             args.workers, include_all=args.all)
+    path = write_results(args.index, results)
+    print(f"✓ Swept {len(results)} symbols in {time.perf_counter() - start:.1f}s -> {path}")
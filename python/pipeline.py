@@ -0,0 +1,95 @@
+"""Bounded stages for the streaming ingest pipeline.
+
+A batch run is a chain of generators, fetch -> normalize -> write, where
+each symbol's bars are released as soon as they are written:
+
+    downloads = buffered(download_stream(...), IN_FLIGHT_SYMBOLS, 'download')
+    for group in batched(downloads, WRITE_BATCH_SYMBOLS, WRITE_BATCH_ROWS, weight=rows):
+        commit(group)
+
+buffered() runs its producer on a thread and hands items over through a
+queue of `maxsize`: when the writer falls behind, the producer blocks
+(backpressure) instead of piling downloads up in memory. batched() groups
+items for one commit, bounded by both item count and total weight (bars).
+Time spent blocked on either side is recorded as `<name>_backpressure`
+(producer waiting for room) and `<name>_starved` (consumer waiting for
+data), which shows which end of the pipeline is the bottleneck.
+"""
+import queue
+import threading
+import time
+import metrics
+
+# How often a blocked producer checks whether the consumer has gone away
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def buffered(iterable, maxsize, name='pipeline'):
+    """Iterate `iterable` on a background thread with at most `maxsize` items queued.
+
+    Exceptions raised by the producer are re-raised in the consumer. If the
+    consumer stops early, the producer stops at its next item.
+    """
+    items = queue.Queue(maxsize=max(1, maxsize))
+    closed = threading.Event()
+
+    def put(item):
+        start = time.perf_counter()
+        while not closed.is_set():
+            try:
+                items.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        metrics.METRICS.add_time(f"{name}_backpressure", time.perf_counter() - start)
+
+    def produce():
+        try:
+            for item in iterable:
+                put(item)
+                if closed.is_set():
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name=f"{name}-producer", daemon=True)
+    thread.start()
+    try:
+        while True:
+            with metrics.stage(f"{name}_starved"):
+                item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        closed.set()
+        thread.join()
+
+
+def batched(iterable, max_items, max_weight=None, weight=None):
+    """Lists of consecutive items, each at most `max_items` long and `max_weight` heavy.
+
+    `weight(item)` defaults to 1; an item heavier than `max_weight` forms a
+    batch on its own.
+    """
+    batch, total = [], 0
+    for item in iterable:
+        item_weight = weight(item) if weight else 1
+        if batch and (len(batch) >= max_items or (max_weight and total + item_weight > max_weight)):
+            yield batch
+            batch, total = [], 0
+        batch.append(item)
+        total += item_weight
+    if batch:
+        yield batch
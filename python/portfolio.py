@@ -0,0 +1,426 @@
+"""Mark-to-market analytics of a trade journal against the stored daily prices.
+
+Takes the trade-history export of js/trade-core.js (exportAllTradesJSON:
+{metadata, trades}) and, per currency, builds a daily equity curve from
+every trade's entry to the latest stored bar:
+
+    calendar   union of the bar days of the traded symbols (plus trade days)
+    closes     (symbols x days) matrix of stored closes, forward-filled
+    holdings   (symbols x days) units held, from entry/exit difference arrays
+    equity     capital + realized P&L + holdings x closes - open cost basis
+
+All trades of a currency are joined to the price stores in one pass over
+NumPy arrays, so thousands of trades take milliseconds. Stored closes are
+split/dividend adjusted (see adjustments.py), so an open position is marked
+by its return since its entry bar's stored close rather than by shares x
+price; closed trades realize their own plValue on their exit day. A
+missing price store is built from DATA/<folder>'s CSVs first. Symbols
+without stored prices are held at cost and listed in `unpricedSymbols`;
+when no traded symbol is priced at all, analyze() raises ValueError rather
+than returning flat curves.
+
+Capital defaults to the peak cost basis of a currency's open positions, so
+returns, drawdown and exposure are relative to the money actually deployed.
+
+Results are cached in DATA/portfolio/<hash>.json, keyed by the trade fields
+used here, the options and the mtime/size of the price stores read, so a
+repeated request for the same journal is one file read. Every edit of a
+journal and every store rebuild makes a new key, so the cache keeps at most
+CACHE_MAX_FILES results, none older than CACHE_MAX_AGE (hits count as use).
+
+    python portfolio.py trades.json [--capital 10000] [--risk-free 0.02] [--no-cache]
+    python portfolio.py - < trades.json
+
+The backend runs analyze() in its resident update worker (method
+"portfolio"), so a request does not pay for interpreter start-up.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import numpy as np
+import symbol_registry
+from config import DATA_DIR
+from optimizer import json_safe
+from price_store import build_index_store, open_store, store_path
+
+PORTFOLIO_FOLDER = "portfolio"
+CACHE_MAX_FILES = 500
+CACHE_MAX_AGE = 7 * 24 * 3600  # seconds since a result was written or last served
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.02
+SECONDS_PER_DAY = 86400
+
+# Trade fields the analytics depend on (the hash ignores currentPrice etc.)
+TRADE_FIELDS = ('id', 'status', 'symbol', 'currencySymbol', 'entryDate', 'entryPrice',
+                'investmentAmount', 'exitDate', 'exitPrice', 'plPercent', 'plValue')
+
+# Same defaults as getCurrencySymbol in js/trade-core.js
+CURRENCY_SYMBOLS = {'USD': '$', 'GBp': '£', 'INR': '₹'}
+
+
+def _days(values):
+    """Day numbers (days since the epoch) of ISO date strings or JS millisecond timestamps"""
+    return np.array([value // (SECONDS_PER_DAY * 1000) if isinstance(value, (int, float)) else str(value)[:10]
+                     for value in values], dtype='datetime64[D]').astype(np.int64)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def currency_of(trade):
+    return trade.get('currencySymbol') or CURRENCY_SYMBOLS.get(symbol_registry.currency(trade['symbol']), '$')
+
+
+def load_trades(payload):
+    """Trades of an exportAllTradesJSON payload (or a bare list), reduced to TRADE_FIELDS.
+
+    Returns (trades, skipped): trades without a symbol, entry date or
+    investment, and closed trades without an exit, are skipped.
+    """
+    trades = payload.get('trades', []) if isinstance(payload, dict) else payload
+    kept, skipped = [], 0
+    for trade in trades:
+        closed = trade.get('status') == 'closed'
+        if (not trade.get('symbol') or not trade.get('entryDate') or not _number(trade.get('investmentAmount')) > 0
+                or (closed and not trade.get('exitDate'))):
+            skipped += 1
+            continue
+        kept.append({field: trade.get(field) for field in TRADE_FIELDS})
+    return kept, skipped
+
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def _build_lock(path):
+    """Lock serializing the lazy builds of one store within this process"""
+    with _build_locks_lock:
+        if path not in _build_locks:
+            _build_locks[path] = threading.Lock()
+        return _build_locks[path]
+
+
+def _stores(symbols, data_dir):
+    """{index folder: store path} of the folders holding `symbols`, building missing stores.
+
+    A folder without CSVs keeps no store; its symbols are left unpriced.
+    """
+    folders = sorted(set(symbol_registry.index_folder(symbol) for symbol in symbols))
+    paths = {folder: store_path(folder, data_dir) for folder in folders}
+    for folder, path in paths.items():
+        if os.path.exists(path):
+            continue
+        folder_dir = os.path.join(data_dir, folder)
+        if not os.path.isdir(folder_dir) or not any(name.endswith('.csv') for name in os.listdir(folder_dir)):
+            continue
+        with _build_lock(path):
+            if not os.path.exists(path):
+                build_index_store(folder, data_dir)
+    return paths
+
+
+def prune_cache(cache_dir, max_files=CACHE_MAX_FILES, max_age=CACHE_MAX_AGE, now=None):
+    """Delete cached results older than `max_age`, then all but the `max_files` most recently used"""
+    now = now or time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.json'):
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+    entries.sort(reverse=True)
+    removed = 0
+    for i, (mtime, path) in enumerate(entries):
+        if i >= max_files or now - mtime > max_age:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def cache_key(trades, options, paths):
+    """Hash of the trades, the options and the state of the price stores they are marked against"""
+    stores = {}
+    for folder, path in paths.items():
+        stat = os.stat(path) if os.path.exists(path) else None
+        stores[folder] = [stat.st_mtime_ns, stat.st_size] if stat else None
+    canonical = json.dumps([trades, options, stores], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def load_closes(symbols, start_day, data_dir=DATA_DIR):
+    """{symbol: (days, closes)} from the price stores, from the last bar before `start_day` on"""
+    closes = {}
+    stores = {}
+    for symbol in symbols:
+        folder = symbol_registry.index_folder(symbol)
+        if folder not in stores:
+            try:
+                stores[folder] = open_store(folder, data_dir)
+            except (OSError, ValueError):
+                stores[folder] = None
+        store = stores[folder]
+        if store is None or symbol not in store:
+            continue
+        bars = store.get(symbol, ['date', 'close'])
+        days = bars['date'] // SECONDS_PER_DAY
+        first = max(int(np.searchsorted(days, start_day)) - 1, 0)
+        valid = np.isfinite(bars['close'][first:])
+        if valid.any():
+            closes[symbol] = (days[first:][valid], np.asarray(bars['close'][first:], dtype=np.float64)[valid])
+    return closes
+
+
+def _curve_stats(equity, market_value, cost_basis, risk_free_rate):
+    """Sharpe, Sortino, drawdown and exposure of a daily equity curve"""
+    peaks = np.maximum.accumulate(equity)
+    drawdown = np.where(peaks > 0, (peaks - equity) / peaks * 100, 0.0)
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+    excess = returns - ((1 + risk_free_rate) ** (1 / TRADING_DAYS) - 1)
+
+    sharpe = sortino = 0.0
+    if len(excess) > 1:
+        deviation = excess.std(ddof=1)
+        downside = math.sqrt(float(np.mean(np.minimum(excess, 0) ** 2)))
+        sharpe = float(excess.mean() / deviation * math.sqrt(TRADING_DAYS)) if deviation > 0 else 0.0
+        sortino = float(excess.mean() / downside * math.sqrt(TRADING_DAYS)) if downside > 0 else 0.0
+
+    exposure = np.where(equity > 0, market_value / equity * 100, 0.0)
+    trough = int(drawdown.argmax()) if len(drawdown) else 0
+    peak = int(np.argmax(equity[:trough + 1])) if len(drawdown) else 0
+    return drawdown, exposure, {
+        'totalReturn': float((equity[-1] / equity[0] - 1) * 100) if len(equity) and equity[0] > 0 else 0.0,
+        'sharpeRatio': sharpe,
+        'sortinoRatio': sortino,
+        'maxDrawdown': float(drawdown[trough]) if len(drawdown) else 0.0,
+        'maxDrawdownStart': peak,
+        'maxDrawdownEnd': trough,
+        'timeInMarket': float((cost_basis > 0).mean() * 100) if len(cost_basis) else 0.0,
+        'avgExposure': float(exposure.mean()) if len(exposure) else 0.0,
+        'maxExposure': float(exposure.max()) if len(exposure) else 0.0,
+    }
+
+
+def currency_analytics(trades, closes, capital=None, risk_free_rate=RISK_FREE_RATE):
+    """Equity, drawdown and exposure curves plus statistics of one currency's trades"""
+    symbols = sorted(set(trade['symbol'] for trade in trades))
+    row = {symbol: i for i, symbol in enumerate(symbols)}
+    sym = np.array([row[trade['symbol']] for trade in trades], dtype=np.int64)
+    closed = np.array([trade.get('status') == 'closed' for trade in trades])
+    entry_day = _days([trade['entryDate'] for trade in trades])
+    exit_day = _days([trade['exitDate'] if is_closed else 0 for trade, is_closed in zip(trades, closed)])
+    invested = np.array([_number(trade['investmentAmount']) for trade in trades])
+    entry_price = np.array([_number(trade.get('entryPrice')) for trade in trades])
+    exit_price = np.array([_number(trade.get('exitPrice')) for trade in trades])
+    pl_value = np.array([_number(trade.get('plValue')) for trade in trades])
+    pl_percent = np.array([_number(trade.get('plPercent')) for trade in trades])
+
+    # Realized P&L as trade-core computes it when plValue is missing
+    fallback = invested * (exit_price / entry_price - 1)
+    pl_value = np.where(np.isfinite(pl_value), pl_value, np.nan_to_num(fallback))
+    pl_percent = np.where(np.isfinite(pl_percent), pl_percent, np.nan_to_num(fallback / invested * 100))
+    exit_day = np.where(closed, np.maximum(exit_day, entry_day), 0)
+
+    # Calendar: every stored bar from the first entry on, plus the trade days themselves
+    start = int(entry_day.min())
+    priced = [closes[symbol] for symbol in symbols if symbol in closes]
+    all_days = np.concatenate([entry_day, exit_day[closed]] + [days[days >= start] for days, _ in priced])
+    seen = np.zeros(int(all_days.max()) - start + 1, dtype=bool)
+    seen[all_days - start] = True
+    calendar = np.flatnonzero(seen) + start
+    n_days = len(calendar)
+
+    # One scatter of every symbol's closes into the (symbols x days) matrix, then a forward fill
+    matrix = np.full((len(symbols), n_days), np.nan)
+    if priced:
+        rows = np.concatenate([np.full(len(closes[s][0]), row[s]) for s in symbols if s in closes])
+        columns = np.searchsorted(calendar, np.concatenate([days for days, _ in priced]))
+        matrix[rows, np.minimum(columns, n_days - 1)] = np.concatenate([values for _, values in priced])
+    filled = np.where(np.isnan(matrix), 0, np.arange(n_days))
+    np.maximum.accumulate(filled, axis=1, out=filled)
+    matrix = np.take_along_axis(matrix, filled, axis=1)
+
+    entry_index = np.searchsorted(calendar, entry_day)
+    exit_index = np.where(closed, np.searchsorted(calendar, exit_day), n_days)
+    entry_close = matrix[sym, entry_index]
+    marked = np.isfinite(entry_close) & (entry_close > 0)
+    units = np.where(marked, invested / np.where(marked, entry_close, 1), 0.0)
+
+    # Difference arrays: +x on the entry day, -x on the exit day, then a running sum
+    holdings = np.zeros((len(symbols), n_days + 1))
+    np.add.at(holdings, (sym, entry_index), units)
+    np.add.at(holdings, (sym, exit_index), -units)
+    holdings = np.cumsum(holdings[:, :n_days], axis=1)
+    cost_basis = np.zeros(n_days + 1)
+    np.add.at(cost_basis, entry_index, invested)
+    np.add.at(cost_basis, exit_index, -invested)
+    cost_basis = np.cumsum(cost_basis[:n_days])
+    unpriced_basis = np.zeros(n_days + 1)
+    np.add.at(unpriced_basis, entry_index[~marked], invested[~marked])
+    np.add.at(unpriced_basis, exit_index[~marked], -invested[~marked])
+    unpriced_basis = np.cumsum(unpriced_basis[:n_days])
+    realized = np.zeros(n_days + 1)
+    np.add.at(realized, exit_index[closed], pl_value[closed])
+    realized = np.cumsum(realized[:n_days])
+
+    market_value = np.einsum('ij,ij->j', holdings, np.nan_to_num(matrix)) + unpriced_basis
+    # Float residue of +x/-x in the running sums would otherwise show as tiny exposure
+    cost_basis[np.abs(cost_basis) < 1e-9 * max(float(invested.max()), 1.0)] = 0.0
+    pnl = realized + market_value - cost_basis
+    capital = capital or float(cost_basis.max()) or float(invested.max())
+    equity = capital + pnl
+    drawdown, exposure, curve_stats = _curve_stats(equity, market_value, cost_basis, risk_free_rate)
+
+    dates = np.datetime_as_string(calendar.astype('datetime64[D]')).tolist()
+    curve_stats['maxDrawdownStart'] = dates[curve_stats['maxDrawdownStart']]
+    curve_stats['maxDrawdownEnd'] = dates[curve_stats['maxDrawdownEnd']]
+
+    # Trade statistics as getTradeStatisticsByCurrency computes them, with the open P&L marked
+    is_open = ~closed
+    open_value = units * matrix[sym, -1]
+    open_value = np.where(marked, open_value, invested)
+    open_invested = float(invested[is_open].sum())
+    open_pl = float((open_value - invested)[is_open].sum())
+    wins = closed & (pl_percent > 0)
+    gross_profit = float(pl_percent[wins].sum())
+    gross_loss = float(np.abs(pl_percent[closed & ~wins]).sum())
+    total_closed = int(closed.sum())
+    if gross_loss > 0:
+        profit_factor = gross_profit / gross_loss
+    else:
+        profit_factor = math.inf if gross_profit > 0 else 0
+
+    last_bar = {symbol: int(days[-1]) for symbol, (days, _) in closes.items()}
+    open_positions = [{
+        'id': trades[i].get('id'),
+        'symbol': trades[i]['symbol'],
+        'markPrice': float(matrix[sym[i], -1]) if marked[i] else None,
+        'markDate': str(np.datetime64(last_bar[trades[i]['symbol']], 'D')) if marked[i] else None,
+        'investmentAmount': float(invested[i]),
+        'currentValue': float(open_value[i]),
+        'plValue': float(open_value[i] - invested[i]),
+        'plPercent': float((open_value[i] / invested[i] - 1) * 100),
+    } for i in np.flatnonzero(is_open)]
+
+    return {
+        'capital': capital,
+        'stats': dict(curve_stats, **{
+            'totalActive': int(is_open.sum()),
+            'totalClosed': total_closed,
+            'totalInvested': open_invested,
+            'openPLValue': open_pl,
+            'openPLPercent': open_pl / open_invested * 100 if open_invested else 0,
+            'winningTrades': int(wins.sum()),
+            'losingTrades': total_closed - int(wins.sum()),
+            'winRate': float(wins.sum() / total_closed * 100) if total_closed else 0,
+            'avgProfit': float(pl_percent[closed].sum() / total_closed) if total_closed else 0,
+            'totalClosedProfit': float(pl_percent[closed].sum()),
+            'realizedPLValue': float(pl_value[closed].sum()),
+            'profitFactor': profit_factor,
+        }),
+        'curves': {
+            'dates': dates,
+            'equity': np.round(equity, 2).tolist(),
+            'pnl': np.round(pnl, 2).tolist(),
+            'drawdown': np.round(drawdown, 4).tolist(),
+            'exposure': np.round(exposure, 4).tolist(),
+        },
+        'openPositions': open_positions,
+        'unpricedSymbols': [symbol for symbol in symbols if symbol not in closes],
+    }
+
+
+def analyze(payload, capital=None, risk_free_rate=RISK_FREE_RATE, data_dir=DATA_DIR, use_cache=True):
+    """Per-currency analytics of a trade export, from the cache when nothing changed"""
+    trades, skipped = load_trades(payload)
+    options = {'capital': capital, 'riskFreeRate': risk_free_rate}
+    paths = _stores([trade['symbol'] for trade in trades], data_dir)
+    key = cache_key(trades, options, paths)
+    cache_dir = os.path.join(data_dir, PORTFOLIO_FOLDER)
+    cache_path = os.path.join(cache_dir, f"{key}.json")
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            result = json.load(f)
+        os.utime(cache_path)  # most recently used, for prune_cache
+        return dict(result, cached=True)
+
+    groups = {}
+    for trade in trades:
+        groups.setdefault(currency_of(trade), []).append(trade)
+    start = int(_days([trade['entryDate'] for trade in trades]).min()) if trades else 0
+    closes = load_closes(sorted(set(trade['symbol'] for trade in trades)), start, data_dir)
+    if trades and not closes:
+        raise ValueError(f"None of the traded symbols has stored prices in {', '.join(sorted(paths.values()))}")
+
+    result = json_safe({
+        'cacheKey': key,
+        'tradeCount': len(trades),
+        'skippedTrades': skipped,
+        'options': options,
+        'currencies': {currency: dict(currency_analytics(group, closes, capital, risk_free_rate),
+                                      currencySymbol=currency)
+                       for currency, group in groups.items()},
+    })
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+        prune_cache(cache_dir)
+    return dict(result, cached=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from contextlib import redirect_stdout
+
+    parser = argparse.ArgumentParser(description='Mark a trade-history export to market')
+    parser.add_argument('trades', help='exportAllTradesJSON file, or - for stdin')
+    parser.add_argument('--capital', type=float, help='Starting capital per currency (default: peak cost basis)')
+    parser.add_argument('--risk-free', type=float, default=RISK_FREE_RATE, help='Annual risk-free rate')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not write DATA/portfolio')
+    parser.add_argument('--json', action='store_true', help='Print the full result as one line of JSON')
+    args = parser.parse_args()
+
+    if args.trades == '-':
+        payload = json.load(sys.stdin)
+    else:
+        with open(args.trades, 'r') as f:
+            payload = json.load(f)
+
+    start = time.perf_counter()
+    try:
+        # Keep stdout to the result: building a missing price store prints progress
+        with redirect_stdout(sys.stderr if args.json else sys.stdout):
+            result = analyze(payload, args.capital, args.risk_free, use_cache=not args.no_cache)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(result, separators=(',', ':')))
+        sys.exit(0)
+
+    print(f"{result['tradeCount']} trades ({result['skippedTrades']} skipped) in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms{' (cached)' if result['cached'] else ''}")
+    for currency, analytics in result['currencies'].items():
+        stats = analytics['stats']
+        print(f"{currency}  capital {analytics['capital']:,.0f}  return {stats['totalReturn']:.2f}%  "
+              f"Sharpe {stats['sharpeRatio']:.2f}  Sortino {stats['sortinoRatio']:.2f}  "
+              f"max DD {stats['maxDrawdown']:.2f}% ({stats['maxDrawdownStart']} .. {stats['maxDrawdownEnd']})  "
+              f"in market {stats['timeInMarket']:.0f}%  avg exposure {stats['avgExposure']:.0f}%")
+        if analytics['unpricedSymbols']:
+            print(f"  held at cost (no stored prices): {' '.join(analytics['unpricedSymbols'])}")
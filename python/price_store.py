@@ -0,0 +1,279 @@
+"""Columnar, memory-mapped price store: one binary file per index folder.
+
+Layout of DATA/<index>/prices.cols:
+
+    [0:8]    magic b"BTCOLS01"
+    [8:16]   little-endian uint64 length of the JSON header
+    [16:..]  JSON header (columns with dtype/offset, per-symbol row ranges)
+    ...      one contiguous block per column, 64-byte aligned
+
+Rows of all symbols are concatenated per column; the header's symbol table
+gives each symbol's [start, count] row range. `date` holds the bar's local
+wall-clock time as int64 seconds since the epoch, so daily bars divide
+evenly by 86400.
+
+Calendar-week and month bars (see resample.py) are stored the same way in
+prices.1wk.cols and prices.1mo.cols, and the daily store carries each
+bar's row in them as resample.INDEX_COLUMNS.
+"""
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+import pandas as pd
+import resample
+from config import DATA_DIR
+
+STORE_FILENAME = "prices.cols"
+STORE_MAGIC = b"BTCOLS01"
+STORE_VERSION = 1
+ALIGNMENT = 64
+
+# CSV column -> (store column, dtype)
+CSV_COLUMNS = {
+    'open': ('open', '<f8'),
+    'high': ('high', '<f8'),
+    'low': ('low', '<f8'),
+    'close': ('close', '<f8'),
+    'volume': ('volume', '<f8'),
+    'Dividends': ('dividends', '<f4'),
+    'Stock Splits': ('splits', '<f4'),
+}
+DATE_DTYPE = '<i8'
+
+
+def store_path(index_folder, data_dir=DATA_DIR, frequency='1d'):
+    """Path of the columnar store for an index folder (prices.<frequency>.cols for resampled bars)"""
+    if frequency == '1d':
+        return os.path.join(data_dir, index_folder, STORE_FILENAME)
+    return os.path.join(data_dir, index_folder, STORE_FILENAME.replace('.cols', f'.{frequency}.cols'))
+
+
+def parse_dates(values):
+    """Convert CSV date strings to int64 local wall-clock epoch seconds"""
+    # Strip the UTC offset: "2020-05-06 00:00:00+01:00" -> "2020-05-06 00:00:00"
+    local = pd.Series(values, dtype=str).str.slice(0, 19)
+    return pd.to_datetime(local, format='ISO8601').to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def read_csv_columns(file_path, float32=False):
+    """Parse one per-symbol CSV into a dict of NumPy column arrays"""
+    frame = pd.read_csv(file_path)
+    columns = {'date': parse_dates(frame['date'])}
+    for csv_name, (name, dtype) in CSV_COLUMNS.items():
+        if float32 and dtype == '<f8':
+            dtype = '<f4'
+        if csv_name in frame.columns:
+            columns[name] = frame[csv_name].to_numpy(dtype=dtype)
+        else:
+            columns[name] = np.zeros(len(frame), dtype=dtype)
+    return columns
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_store(path, symbol_columns, sources=None):
+    """Write {symbol: {column: array}} to `path` atomically.
+
+    `sources` optionally maps each symbol to the (mtime_ns, size) of the CSV
+    it came from, so later rebuilds can skip unchanged files. Columns beyond
+    the CSV ones (such as resample.INDEX_COLUMNS) are written when every
+    symbol has them.
+    """
+    symbols = sorted(symbol_columns)
+    column_names = ['date'] + [name for name, _ in CSV_COLUMNS.values()]
+    extra = set.intersection(*(set(symbol_columns[symbol]) for symbol in symbols)) if symbols else set()
+    column_names += sorted(extra - set(column_names))
+
+    symbol_table = {}
+    start = 0
+    for symbol in symbols:
+        count = len(symbol_columns[symbol]['date'])
+        entry = {'start': start, 'count': count}
+        if sources and symbol in sources:
+            entry['mtime_ns'], entry['size'] = sources[symbol]
+        symbol_table[symbol] = entry
+        start += count
+    total_rows = start
+
+    blocks = []
+    for name in column_names:
+        parts = [symbol_columns[symbol][name] for symbol in symbols]
+        dtype = parts[0].dtype.str if parts else (DATE_DTYPE if name == 'date' else '<f8')
+        blocks.append((name, np.concatenate(parts).astype(dtype, copy=False) if parts
+                       else np.empty(0, dtype=dtype)))
+
+    # Offsets depend on the header length, which depends on the offsets;
+    # reserve a generous fixed header size instead of iterating
+    header = {'version': STORE_VERSION, 'rows': total_rows, 'symbols': symbol_table, 'columns': []}
+    header_size = _aligned(16 + len(json.dumps(header)) + 128 * len(column_names) + 256)
+    offset = header_size
+    for name, array in blocks:
+        header['columns'].append({'name': name, 'dtype': array.dtype.str, 'offset': offset})
+        offset = _aligned(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    if 16 + len(header_bytes) > header_size:
+        raise ValueError("Price store header overflows its reserved space")
+
+    # A unique temp file, so concurrent builds of one store never write into
+    # the same file (a batch run and the update worker can both build it)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(STORE_MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for column, (name, array) in zip(header['columns'], blocks):
+                f.seek(column['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(max(offset, header_size))
+        os.chmod(tmp_path, 0o644)  # mkstemp creates it owner-only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+class PriceStore:
+    """Read-only, zero-copy view over a columnar price store file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._mmap[:8]) != STORE_MAGIC:
+            raise ValueError(f"Not a price store: {path}")
+        header_length = struct.unpack('<Q', bytes(self._mmap[8:16]))[0]
+        self.header = json.loads(bytes(self._mmap[16:16 + header_length]).decode('utf-8'))
+        self.rows = self.header['rows']
+        self._columns = {}
+        for column in self.header['columns']:
+            self._columns[column['name']] = np.ndarray(
+                shape=(self.rows,), dtype=np.dtype(column['dtype']),
+                buffer=self._mmap, offset=column['offset']
+            )
+
+    @property
+    def symbols(self):
+        return list(self.header['symbols'])
+
+    @property
+    def column_names(self):
+        return list(self._columns)
+
+    def __contains__(self, symbol):
+        return symbol in self.header['symbols']
+
+    def __len__(self):
+        return len(self.header['symbols'])
+
+    def column(self, name):
+        """Whole column across all symbols (memory-mapped, no copy)"""
+        return self._columns[name]
+
+    def symbol_range(self, symbol):
+        entry = self.header['symbols'][symbol]
+        return entry['start'], entry['start'] + entry['count']
+
+    def get(self, symbol, columns=None):
+        """Dict of column views for one symbol (memory-mapped, no copy)"""
+        start, end = self.symbol_range(symbol)
+        names = columns or self.column_names
+        return {name: self._columns[name][start:end] for name in names}
+
+    def matrix(self, name, symbols=None):
+        """Stack one column into a (symbols x bars) float matrix.
+
+        Series are right-aligned on their last bar and left-padded with NaN,
+        so column -1 is every symbol's latest bar.
+        """
+        symbols = symbols or self.symbols
+        ranges = [self.symbol_range(symbol) for symbol in symbols]
+        width = max((end - start for start, end in ranges), default=0)
+        out = np.full((len(symbols), width), np.nan)
+        source = self._columns[name]
+        for row, (start, end) in enumerate(ranges):
+            if end > start:
+                out[row, width - (end - start):] = source[start:end]
+        return out
+
+
+def open_store(index_folder, data_dir=DATA_DIR, frequency='1d'):
+    """Open the columnar store of an index folder, or its weekly/monthly bars"""
+    return PriceStore(store_path(index_folder, data_dir, frequency))
+
+
+def build_index_store(index_folder, data_dir=DATA_DIR, float32=False):
+    """(Re)build DATA/<index_folder>/prices.cols from the per-symbol CSVs.
+
+    Symbols whose CSV size and mtime match the existing store are copied from
+    it instead of being re-parsed, so a rebuild after a daily refresh only
+    parses the files that changed. The weekly and monthly stores are rebuilt
+    from the daily bars in the same call.
+    """
+    folder = os.path.join(data_dir, index_folder)
+    path = store_path(index_folder, data_dir)
+
+    previous = None
+    if os.path.exists(path):
+        try:
+            previous = PriceStore(path)
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable price store {path}: {e}")
+
+    symbol_columns = {}
+    sources = {}
+    parsed = 0
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.csv'):
+            continue
+        symbol = name[:-4]
+        stat = os.stat(os.path.join(folder, name))
+        source = (stat.st_mtime_ns, stat.st_size)
+        sources[symbol] = source
+
+        entry = previous.header['symbols'].get(symbol) if previous else None
+        if entry and (entry.get('mtime_ns'), entry.get('size')) == source:
+            symbol_columns[symbol] = {k: np.array(v) for k, v in previous.get(symbol).items()}
+            continue
+
+        try:
+            symbol_columns[symbol] = read_csv_columns(os.path.join(folder, name), float32)
+            parsed += 1
+        except Exception as e:
+            print(f"Skipping {symbol} in price store: {e}")
+            sources.pop(symbol)
+
+    for frequency in resample.STORED_FREQUENCIES:
+        bars, indices = resample.resample_symbols(symbol_columns, frequency)
+        for symbol, columns in symbol_columns.items():
+            columns[resample.INDEX_COLUMNS[frequency]] = indices.get(symbol, np.zeros(0, dtype=np.int32))
+        write_store(store_path(index_folder, data_dir, frequency), bars)
+
+    write_store(path, symbol_columns, sources)
+    print(f"✓ Price store for {index_folder}: {len(symbol_columns)} symbols ({parsed} re-parsed)")
+    return path
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # Usage: price_store.py [index_folder ...] [--float32]
+    float32 = "--float32" in sys.argv
+    folders = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or ["ftse100", "us_stocks"]
+    for folder in folders:
+        start = time.perf_counter()
+        path = build_index_store(folder, float32=float32)
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = open_store(folder)
+        closes = store.matrix('close')
+        loaded = time.perf_counter() - start
+        print(f"{folder}: built in {built:.2f}s, {os.path.getsize(path) / 1e6:.1f} MB, "
+              f"opened {len(store)} symbols x {closes.shape[1]} bars in {loaded * 1000:.1f} ms")
@@ -0,0 +1,50 @@
+import threading
+import time
+
+# Requests per second and burst size allowed for each upstream data source
+RATE_LIMITS = {
+    "yfinance": {"rate": 2.0, "burst": 4},
+}
+DEFAULT_SOURCE = "yfinance"
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how fast requests hit a data source"""
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` tokens are available, then consume them"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self._sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(source=DEFAULT_SOURCE):
+    """Return the shared token bucket for a data source"""
+    with _buckets_lock:
+        if source not in _buckets:
+            limits = RATE_LIMITS.get(source, RATE_LIMITS[DEFAULT_SOURCE])
+            _buckets[source] = TokenBucket(limits["rate"], limits["burst"])
+        return _buckets[source]
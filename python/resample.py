@@ -0,0 +1,141 @@
+"""Calendar-correct resampling of OHLCV bars.
+
+indicators.aggregate_7day mirrors the browser's `aggregateTo7Day`, whose
+"7-day" periods are runs of 7 trading days and drift against the calendar.
+The bars built here follow the calendar instead: weeks run Monday to
+Sunday, months are calendar months and intraday bars collapse into their
+local trading day. Each bucket's date is that of its first bar.
+
+Every function takes columns concatenated over many series (as stored in
+price_store) plus the row where each series starts, and resamples all of
+them in one pass with ufunc.reduceat. Alongside the bars it returns, for
+every input row, the index of its bucket within its own series, so mapping
+a higher-timeframe value back to daily bars is a take() rather than a scan.
+
+price_store.build_index_store writes the weekly and monthly bars to
+prices.1wk.cols / prices.1mo.cols and the bucket indices to the daily store
+as INDEX_COLUMNS.
+"""
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
+
+# Frequencies stored next to each daily price store
+STORED_FREQUENCIES = ['1wk', '1mo']
+
+# Daily store column holding each bar's bucket in the resampled store
+INDEX_COLUMNS = {'1wk': 'week_index', '1mo': 'month_index'}
+
+# yfinance intervals shorter than a day
+INTRADAY_INTERVALS = {'1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h'}
+
+
+def bucket_keys(dates, frequency):
+    """Calendar bucket number of each date (int64 local epoch seconds)"""
+    dates = np.asarray(dates, dtype=np.int64)
+    if frequency == '1d':
+        return dates // SECONDS_PER_DAY
+    if frequency == '1wk':
+        # Epoch day 0 (1970-01-01) was a Thursday; +3 starts weeks on Monday
+        return (dates // SECONDS_PER_DAY + 3) // 7
+    if frequency == '1mo':
+        return dates.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"Unsupported frequency '{frequency}' (use 1d, 1wk or 1mo)")
+
+
+def resample_columns(columns, frequency, starts=None):
+    """Resample concatenated OHLCV columns; returns (bars, bar_index, bucket_starts).
+
+    `columns` holds 1-D arrays under the price_store names (date, open,
+    high, low, close and optionally volume, dividends, splits); `starts` are
+    the rows where a new series begins (default: one series). `bars` has the
+    same columns per bucket, `bar_index` each row's bucket number within its
+    series and `bucket_starts` the first bucket of each series in `bars`.
+    """
+    dates = np.asarray(columns['date'], dtype=np.int64)
+    rows = len(dates)
+    starts = np.zeros(1, dtype=np.int64) if starts is None else np.asarray(starts, dtype=np.int64)
+    if rows == 0:
+        empty = {name: np.asarray(values)[:0] for name, values in columns.items()}
+        return empty, np.zeros(0, dtype=np.int32), np.zeros(len(starts), dtype=np.int64)
+
+    keys = bucket_keys(dates, frequency)
+    new_bucket = np.ones(rows, dtype=bool)
+    new_bucket[1:] = keys[1:] != keys[:-1]
+    new_bucket[starts[starts < rows]] = True
+    first = np.flatnonzero(new_bucket)
+    last = np.append(first[1:], rows) - 1
+
+    bars = {'date': dates[first]}
+    if 'open' in columns:
+        bars['open'] = np.asarray(columns['open'])[first]
+    if 'high' in columns:
+        # fmax/fmin skip the NaN bars yfinance sometimes returns
+        bars['high'] = np.fmax.reduceat(np.asarray(columns['high']), first)
+    if 'low' in columns:
+        bars['low'] = np.fmin.reduceat(np.asarray(columns['low']), first)
+    if 'close' in columns:
+        bars['close'] = np.asarray(columns['close'])[last]
+    for name in ('volume', 'dividends'):
+        if name in columns:
+            bars[name] = np.add.reduceat(np.asarray(columns[name]), first)
+    if 'splits' in columns:
+        # 0 means no split; several splits in one bucket compound
+        splits = np.asarray(columns['splits'])
+        ratio = np.multiply.reduceat(np.where(splits > 0, splits, 1).astype(splits.dtype), first)
+        bars['splits'] = np.where(np.add.reduceat(splits > 0, first) > 0, ratio, 0).astype(splits.dtype)
+
+    bucket = np.cumsum(new_bucket) - 1
+    series = np.cumsum(np.isin(np.arange(rows), starts)) - 1
+    bucket_starts = bucket[np.minimum(starts, rows - 1)]
+    bar_index = (bucket - bucket_starts[series]).astype(np.int32)
+    return bars, bar_index, bucket_starts
+
+
+def resample_symbols(symbol_columns, frequency):
+    """Resample {symbol: columns} in one pass; returns ({symbol: bars}, {symbol: bar_index})"""
+    symbols = [symbol for symbol in symbol_columns if len(symbol_columns[symbol]['date'])]
+    if not symbols:
+        return {}, {}
+    names = [name for name in symbol_columns[symbols[0]] if name not in INDEX_COLUMNS.values()]
+    counts = np.array([len(symbol_columns[symbol]['date']) for symbol in symbols])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    columns = {name: np.concatenate([symbol_columns[symbol][name] for symbol in symbols]) for name in names}
+
+    bars, bar_index, bucket_starts = resample_columns(columns, frequency, starts)
+    bucket_ends = np.append(bucket_starts[1:], len(bars['date']))
+    resampled = {symbol: {name: values[bucket_starts[i]:bucket_ends[i]] for name, values in bars.items()}
+                 for i, symbol in enumerate(symbols)}
+    indices = dict(zip(symbols, np.split(bar_index, starts[1:])))
+    return resampled, indices
+
+
+def resample_frame(data, frequency='1d'):
+    """Resample a yfinance history frame (DatetimeIndex, Open/High/...) to `frequency`.
+
+    Used to turn intraday downloads into the daily bars the CSVs hold; the
+    result keeps the yfinance layout and timezone, with each daily bar
+    dated at local midnight like Yahoo's own daily bars.
+    """
+    if data.empty:
+        return data
+    index = data.index
+    local = index.tz_localize(None) if index.tz is not None else index
+    columns = {'date': local.to_numpy(dtype='datetime64[s]').astype(np.int64)}
+    names = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close',
+             'Volume': 'volume', 'Dividends': 'dividends', 'Stock Splits': 'splits'}
+    for frame_name, name in names.items():
+        if frame_name in data.columns:
+            columns[name] = data[frame_name].to_numpy(dtype=np.float64)
+
+    bars, _, _ = resample_columns(columns, frequency)
+    dates = bars.pop('date')
+    if frequency == '1d':
+        dates = dates // SECONDS_PER_DAY * SECONDS_PER_DAY
+    result_index = pd.DatetimeIndex(dates.astype('datetime64[s]'), name='Date')
+    if index.tz is not None:
+        result_index = result_index.tz_localize(index.tz)
+    frame_names = {name: frame_name for frame_name, name in names.items()}
+    result = pd.DataFrame({frame_names[name]: values for name, values in bars.items()}, index=result_index)
+    return result.astype({name: data[name].dtype for name in result.columns})
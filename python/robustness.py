@@ -0,0 +1,274 @@
+"""Bootstrap confidence intervals and walk-forward tests of DTI backtests.
+
+The conviction level of a backtest (backtest.get_conviction_level) comes
+from the win rate and trade count of one in-sample run. This module says how
+much of that result survives resampling and out-of-sample testing:
+
+- bootstrap_block() resamples the trade returns of many symbols at once,
+  with all symbols and resamples in one (symbols x resamples x trades)
+  array, and returns percentiles of total return, max drawdown, profit
+  factor and win rate plus the share of resamples that lose money;
+- walk_forward_block() optimizes a block of symbols on rolling windows
+  (optimizer.sweep_block on window k) and backtests each symbol's best
+  parameters on window k+1;
+- walk_forward_index() runs it over a whole price store on a process pool
+  and writes DATA/robustness/<index>.json.
+
+Metrics follow backtest.metrics_from_returns: returns are per-trade
+percentages, total return is their sum and drawdown is measured on the
+compounded equity curve.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from backtest import DEFAULT_PARAMS, format_date, metrics_from_returns, run_backtest
+from config import DATA_DIR
+from optimizer import DEFAULT_RANGES, collect_results, json_safe, sweep_block
+from price_store import open_store
+
+ROBUSTNESS_DIR = os.path.join(DATA_DIR, "robustness")
+
+RESAMPLES = 10000
+PERCENTILES = (5, 50, 95)
+MIN_TRADES = 2          # fewer trades than this give no meaningful resamples
+SEED = 0                # fixed so nightly results only change when the trades do
+
+# Upper bound on elements of the (symbols x resamples x trades) array per pass
+MAX_ELEMENTS = 4_000_000
+
+# Walk-forward windows in bars: optimize on TRAIN_BARS, test on the next
+# TEST_BARS; WARMUP_BARS before each window cover backtest.WARMUP_MONTHS
+TRAIN_BARS = 504
+TEST_BARS = 126
+WARMUP_BARS = 130
+WALK_FORWARD_BLOCK_SIZE = 64  # symbols per process-pool task
+
+
+def _percentiles(values):
+    """{'p5': ..., 'p50': ..., 'p95': ...} over axis 1 of (symbols x resamples)"""
+    # inverted_cdf picks actual resample values, so an infinite profit factor stays inf
+    points = np.percentile(values, PERCENTILES, axis=1, method='inverted_cdf')
+    return [{f"p{p}": float(points[i, row]) for i, p in enumerate(PERCENTILES)}
+            for row in range(values.shape[0])]
+
+
+def bootstrap_block(returns_list, resamples=RESAMPLES, seed=SEED):
+    """Bootstrap the trade returns of many symbols; one dict (or None) per symbol.
+
+    Every resample draws as many trades, with replacement, as the symbol
+    has. Shorter trade lists are padded with zero returns, which change no
+    metric.
+    """
+    results = [None] * len(returns_list)
+    rows = [i for i, returns in enumerate(returns_list) if len(returns) >= MIN_TRADES]
+    if not rows or resamples <= 0:
+        return results
+
+    counts = np.array([len(returns_list[i]) for i in rows])
+    width = int(counts.max())
+    padded = np.zeros((len(rows), width))
+    for row, i in enumerate(rows):
+        padded[row, :counts[row]] = returns_list[i]
+
+    rng = np.random.default_rng(seed)
+    per_pass = max(1, MAX_ELEMENTS // (resamples * width))
+    for start in range(0, len(rows), per_pass):
+        n = counts[start:start + per_pass]
+        block = len(n)
+        # Draw positions below each symbol's trade count; flat offsets pick its row
+        draws = (rng.random((block, resamples, width)) * n[:, None, None]).astype(np.int64)
+        draws += (np.arange(start, start + block) * width)[:, None, None]
+        in_list = np.arange(width)[None, None, :] < n[:, None, None]
+        sample = np.where(in_list, padded.ravel()[draws], 0.0)
+
+        total = sample.sum(axis=2)
+        wins = (sample > 0).sum(axis=2)
+        gross_profit = np.where(sample > 0, sample, 0).sum(axis=2)
+        gross_loss = -np.where(in_list & (sample <= 0), sample, 0).sum(axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            profit_factor = np.where(gross_loss > 0, gross_profit / gross_loss,
+                                     np.where(gross_profit > 0, np.inf, 0.0))
+        equity = np.cumprod(1 + sample / 100, axis=2)
+        peaks = np.maximum.accumulate(equity, axis=2)
+        max_drawdown = ((peaks - equity) / peaks).max(axis=2) * 100
+        win_rate = wins / n[:, None] * 100
+
+        stats = {
+            'totalReturn': _percentiles(total),
+            'maxDrawdown': _percentiles(max_drawdown),
+            'profitFactor': _percentiles(profit_factor),
+            'winRate': _percentiles(win_rate),
+        }
+        loss_share = (total < 0).mean(axis=1)
+        for row in range(block):
+            results[rows[start + row]] = dict(
+                {name: values[row] for name, values in stats.items()},
+                resamples=resamples,
+                trades=int(n[row]),
+                probabilityOfLoss=float(loss_share[row]),
+            )
+    return results
+
+
+def bootstrap_trades(trades, resamples=RESAMPLES, seed=SEED):
+    """Bootstrap one symbol's completed trades (None with fewer than MIN_TRADES)"""
+    returns = np.array([t['plPercent'] for t in trades if t.get('exitReason')], dtype=np.float64)
+    return bootstrap_block([returns], resamples, seed)[0]
+
+
+def walk_forward_windows(bars, train_bars=TRAIN_BARS, test_bars=TEST_BARS, warmup_bars=WARMUP_BARS):
+    """(warmup_start, train_start, test_start, test_end) column ranges, oldest first.
+
+    Windows are laid out backwards from the latest bar so the last test
+    window always ends on it.
+    """
+    windows = []
+    test_end = bars
+    while test_end - test_bars - train_bars - warmup_bars >= 0:
+        test_start = test_end - test_bars
+        train_start = test_start - train_bars
+        windows.append((train_start - warmup_bars, train_start, test_start, test_end))
+        test_end = test_start
+    return windows[::-1]
+
+
+def _summary(metrics):
+    return {key: metrics[key] for key in ('totalTrades', 'winRate', 'avgProfit', 'totalReturn',
+                                          'profitFactor', 'maxDrawdown')}
+
+
+def _test_trades(dates, high, low, close, params, test_start, test_end):
+    """Completed trades with the given params entered within [test_start, test_end)"""
+    valid = ~np.isnan(close)
+    backtest = run_backtest(dates[valid], high[valid], low[valid], close[valid], params)
+    first = format_date(dates[test_start])
+    last = format_date(dates[test_end]) if test_end < len(dates) else None
+    return [t for t in backtest['completedTrades']
+            if t['entryDate'] >= first and (last is None or t['entryDate'] < last)]
+
+
+def walk_forward_block(dates, high, low, close, symbols, ranges=None, train_bars=TRAIN_BARS,
+                       test_bars=TEST_BARS, warmup_bars=WARMUP_BARS, resamples=RESAMPLES,
+                       enable_7day=DEFAULT_PARAMS['enable7DayDTI']):
+    """Walk-forward test of a block of symbols given as right-aligned (symbols x bars) matrices"""
+    ranges = dict(DEFAULT_RANGES, **(ranges or {}))
+    windows = walk_forward_windows(close.shape[1], train_bars, test_bars, warmup_bars)
+    # Any row's dates label the columns; right alignment keeps calendars close across symbols
+    row_dates = [dates[row] for row in range(len(symbols))]
+
+    per_symbol = {symbol: {'windows': [], 'inSample': [], 'outOfSample': []} for symbol in symbols}
+    for warmup_start, train_start, test_start, test_end in windows:
+        # In-sample: sweep every combination on the training window
+        columns = slice(warmup_start, test_start)
+        sweeps = {}
+        for r in ranges['r']:
+            for s in ranges['s']:
+                for u in ranges['u']:
+                    sweeps[(r, s, u)] = sweep_block(dates[:, columns], high[:, columns], low[:, columns],
+                                                    close[:, columns], r, s, u, ranges, enable_7day)
+
+        for row, symbol in enumerate(symbols):
+            if np.isnan(close[row, train_start]):
+                continue  # symbol not listed for the whole training window
+            best = collect_results({key: {field: values[row] for field, values in acc.items()}
+                                    for key, acc in sweeps.items()}, ranges, include_all=False)['bestResult']
+            window = {
+                'trainStart': format_date(row_dates[row][train_start]),
+                'testStart': format_date(row_dates[row][test_start]),
+                'testEnd': format_date(row_dates[row][test_end - 1]),
+                'params': best['params'],
+            }
+            if best['params'] is not None:
+                params = dict(best['params'], enable7DayDTI=enable_7day)
+                # Out-of-sample: the chosen params on the following window, trades allowed to close later
+                tail = slice(test_start - warmup_bars, None)
+                trades = _test_trades(row_dates[row][tail], high[row, tail], low[row, tail], close[row, tail],
+                                      params, warmup_bars, test_end - test_start + warmup_bars)
+                returns = [t['plPercent'] for t in trades]
+                window['inSample'] = _summary(best['metrics'])
+                window['outOfSample'] = _summary(metrics_from_returns(
+                    np.array(returns, dtype=np.float64), np.zeros(len(returns)), include_equity_curve=False))
+                per_symbol[symbol]['inSample'].append(best['metrics']['avgProfit'])
+                per_symbol[symbol]['outOfSample'].extend(returns)
+            per_symbol[symbol]['windows'].append(window)
+
+    oos_returns = [np.array(entry['outOfSample'], dtype=np.float64) for entry in per_symbol.values()]
+    intervals = bootstrap_block(oos_returns, resamples)
+    results = {}
+    for (symbol, entry), returns, interval in zip(per_symbol.items(), oos_returns, intervals):
+        if not entry['windows']:
+            continue
+        oos = metrics_from_returns(returns, np.zeros(len(returns)), include_equity_curve=False)
+        in_sample_avg = float(np.mean(entry['inSample'])) if entry['inSample'] else 0.0
+        results[symbol] = {
+            'windows': entry['windows'],
+            'outOfSample': _summary(oos),
+            # Out-of-sample average trade as a share of the in-sample one
+            'efficiency': oos['avgProfit'] / in_sample_avg if in_sample_avg > 0 and len(returns) else None,
+            'bootstrap': interval,
+        }
+    return results
+
+
+_worker_stores = {}
+
+
+def _walk_forward_task(task):
+    """Process-pool task: walk-forward test of one block of symbols of a store"""
+    data_dir, index_folder, symbols, options = task
+    key = (data_dir, index_folder)
+    if key not in _worker_stores:
+        _worker_stores[key] = open_store(index_folder, data_dir)
+    store = _worker_stores[key]
+    matrices = [store.matrix(name, symbols) for name in ('date', 'high', 'low', 'close')]
+    return walk_forward_block(*matrices, symbols, **options)
+
+
+def walk_forward_index(index_folder, ranges=None, workers=None, data_dir=DATA_DIR, symbols=None,
+                       block_size=WALK_FORWARD_BLOCK_SIZE, **options):
+    """Walk-forward test every symbol of an index folder's price store on a process pool"""
+    store = open_store(index_folder, data_dir)
+    symbols = symbols or store.symbols
+    options = dict(options, ranges=ranges)
+    tasks = [(data_dir, index_folder, symbols[i:i + block_size], options)
+             for i in range(0, len(symbols), block_size)]
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for block in executor.map(_walk_forward_task, tasks):
+            results.update(block)
+    return results
+
+
+def write_results(index_folder, results, output_dir=ROBUSTNESS_DIR):
+    """Write walk-forward results to DATA/robustness/<index_folder>.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{index_folder}.json")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(json_safe(results), f)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Walk-forward test and bootstrap an index folder')
+    parser.add_argument('index', help='Index folder under DATA/ (e.g. ftse100, us_stocks)')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: all cores)')
+    parser.add_argument('--resamples', type=int, default=RESAMPLES, help='Bootstrap resamples per symbol')
+    parser.add_argument('--train-bars', type=int, default=TRAIN_BARS)
+    parser.add_argument('--test-bars', type=int, default=TEST_BARS)
+    parser.add_argument('--symbols', type=int, help='Only the first N symbols of the store')
+    parser.add_argument('--ranges', help='JSON object overriding parameter ranges')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    symbols = open_store(args.index).symbols[:args.symbols] if args.symbols else None
+    results = walk_forward_index(args.index, json.loads(args.ranges) if args.ranges else None, args.workers,
+                                 symbols=symbols, train_bars=args.train_bars, test_bars=args.test_bars,
+                                 resamples=args.resamples)
+    path = write_results(args.index, results)
+    print(f"✓ Walk-forward tested {len(results)} symbols in {time.perf_counter() - start:.1f}s -> {path}")
@@ -0,0 +1,202 @@
+"""Scan a whole index with the DTI strategy and rank the results.
+
+Server-side counterpart of `processStocksBatch` / `fetchAllStocksData` in
+js/dti-data.js: every symbol of an index list from js/stock-lists/registry.json
+is backtested with one parameter set, and a single ranked result file is
+written to DATA/scans/<index>.json for the browser to fetch.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import indicators
+import robustness
+from backtest import DEFAULT_PARAMS, backtest_with_active_detection, calculate_performance_metrics, format_date
+from config import DATA_DIR, STOCK_LISTS_DIR
+from optimizer import json_safe
+from price_store import STORE_FILENAME, open_store
+
+REGISTRY_FILE = os.path.join(STOCK_LISTS_DIR, "registry.json")
+SCAN_DIR = os.path.join(DATA_DIR, "scans")
+SCAN_BLOCK_SIZE = 128  # symbols per process-pool task
+INT_PARAMS = ('r', 's', 'u', 'maxHoldingDays')  # every other numeric parameter is a float
+
+# Order of the conviction sections in the active trades panel
+CONVICTION_ORDER = ['high-conviction', 'moderate-conviction', 'low-conviction', 'insufficient-data']
+
+
+def load_index_list(index_id, lists_dir=STOCK_LISTS_DIR):
+    """Return (registry entry, [{'name', 'symbol'}, ...]) of an index list"""
+    with open(os.path.join(lists_dir, "registry.json"), 'r') as f:
+        registry = json.load(f)
+    for entry in registry['lists']:
+        if entry['id'] == index_id:
+            with open(os.path.join(lists_dir, entry['file']), 'r') as f:
+                return entry, json.load(f)
+    available = ", ".join(entry['id'] for entry in registry['lists'])
+    raise ValueError(f"Unknown index '{index_id}' (available: {available})")
+
+
+def locate_symbols(symbols, data_dir=DATA_DIR):
+    """Map each symbol to the DATA/<folder> whose price store holds it"""
+    remaining = set(symbols)
+    located = {}
+    for folder in sorted(os.listdir(data_dir)):
+        if not remaining:
+            break
+        if not os.path.exists(os.path.join(data_dir, folder, STORE_FILENAME)):
+            continue
+        store = open_store(folder, data_dir)
+        for symbol in remaining & set(store.symbols):
+            located[symbol] = folder
+        remaining -= set(located)
+    return located
+
+
+def scan_symbols(store, symbols, params=None, resamples=0):
+    """Backtest `symbols` of one PriceStore, returning one summary dict per symbol.
+
+    With `resamples`, each result also gets bootstrap confidence intervals of
+    its completed trades under 'robustness' (see robustness.bootstrap_block).
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    batch = indicators.index_indicators(store, p['r'], p['s'], p['u'], symbols)
+    dates = store.matrix('date', symbols)
+
+    results = []
+    trade_returns = []
+    for row, symbol in enumerate(symbols):
+        valid = ~np.isnan(batch['close'][row])
+        if valid.sum() < 2:
+            continue
+        seven_day = {
+            'daily_7day_dti': batch['daily_7day_dti'][row][valid],
+            'previous_7day_dti': batch['previous_7day_dti'][row][valid],
+        }
+        backtest = backtest_with_active_detection(
+            dates[row][valid], batch['close'][row][valid], batch['dti'][row][valid], seven_day, p
+        )
+        metrics = calculate_performance_metrics(backtest['completedTrades'], include_equity_curve=False)
+        results.append({
+            'symbol': symbol,
+            'lastDate': format_date(dates[row][valid][-1]),
+            'lastClose': float(batch['close'][row][valid][-1]),
+            'activeTrade': backtest['activeTrade'],
+            'winRate': metrics['winRate'],
+            'profitFactor': metrics['profitFactor'],
+            'totalTrades': metrics['totalTrades'],
+            'totalReturn': metrics['totalReturn'],
+            'avgProfit': metrics['avgProfit'],
+            'maxDrawdown': metrics['maxDrawdown'],
+            'convictionLevel': metrics['convictionLevel'],
+        })
+        trade_returns.append(np.array([t['plPercent'] for t in backtest['completedTrades']], dtype=np.float64))
+
+    if resamples:
+        for result, interval in zip(results, robustness.bootstrap_block(trade_returns, resamples)):
+            result['robustness'] = interval
+    return results
+
+
+_worker_stores = {}
+
+
+def _scan_task(task):
+    """Process-pool task: scan one block of symbols of one store"""
+    data_dir, folder, symbols, params, resamples = task
+    key = (data_dir, folder)
+    if key not in _worker_stores:
+        _worker_stores[key] = open_store(folder, data_dir)
+    return folder, scan_symbols(_worker_stores[key], symbols, params, resamples)
+
+
+def rank_key(result):
+    """Active trades first, then by conviction, win rate, profit factor and trade count"""
+    return (
+        result['activeTrade'] is None,
+        CONVICTION_ORDER.index(result['convictionLevel']),
+        -result['winRate'],
+        -result['profitFactor'],
+        -result['totalTrades'],
+    )
+
+
+def scan_index(index_id, params=None, workers=None, data_dir=DATA_DIR,
+               lists_dir=STOCK_LISTS_DIR, block_size=SCAN_BLOCK_SIZE, resamples=0):
+    """Backtest every symbol of an index list in parallel and rank the results"""
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    entry, stocks = load_index_list(index_id, lists_dir)
+    names = {stock['symbol']: stock.get('name', stock['symbol']) for stock in stocks}
+    located = locate_symbols(list(names), data_dir)
+
+    by_folder = {}
+    for symbol in names:
+        if symbol in located:
+            by_folder.setdefault(located[symbol], []).append(symbol)
+    tasks = [(data_dir, folder, symbols[i:i + block_size], p, resamples)
+             for folder, symbols in sorted(by_folder.items())
+             for i in range(0, len(symbols), block_size)]
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for folder, block in executor.map(_scan_task, tasks):
+            for result in block:
+                result['name'] = names[result['symbol']]
+                result['indexFolder'] = folder
+            results.extend(block)
+    results.sort(key=rank_key)
+
+    scanned = {result['symbol'] for result in results}
+    return {
+        'index': index_id,
+        'name': entry['name'],
+        'region': entry.get('region'),
+        'generatedAt': datetime.now().isoformat(),
+        'params': p,
+        'resamples': resamples,
+        'totalSymbols': len(names),
+        'scannedSymbols': len(results),
+        'activeTrades': sum(result['activeTrade'] is not None for result in results),
+        'missingSymbols': [symbol for symbol in names if symbol not in scanned],
+        'elapsed': time.perf_counter() - start,
+        'results': results,
+    }
+
+
+def write_scan(scan, output_dir=SCAN_DIR):
+    """Write a scan to DATA/scans/<index>.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{scan['index']}.json")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(json_safe(scan), f)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Backtest every symbol of an index and rank the results')
+    parser.add_argument('index', help='Index id from js/stock-lists/registry.json (e.g. usStocks)')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: all cores)')
+    for name, default in DEFAULT_PARAMS.items():
+        if name != 'enable7DayDTI':
+            parser.add_argument(f'--{name}', type=int if name in INT_PARAMS else float, default=default)
+    parser.add_argument('--no-7day', action='store_true', help='Disable the 7-day DTI entry filter')
+    parser.add_argument('--resamples', type=int, default=robustness.RESAMPLES,
+                        help='Bootstrap resamples of each symbol\'s trades (0 to skip)')
+    args = parser.parse_args()
+
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS if name != 'enable7DayDTI'}
+    params['enable7DayDTI'] = not args.no_7day
+    scan = scan_index(args.index, params, args.workers, resamples=args.resamples)
+    path = write_scan(scan)
+    print(f"✓ Scanned {scan['scannedSymbols']}/{scan['totalSymbols']} symbols of {scan['name']} "
+          f"in {scan['elapsed']:.1f}s, {scan['activeTrades']} active trades -> {path}")
+    if scan['missingSymbols']:
+        print(f"No stored prices for {len(scan['missingSymbols'])} symbols "
+              f"(e.g. {', '.join(scan['missingSymbols'][:5])})")
@@ -1,41 +1,118 @@
-import schedule
+"""Refresh each exchange's symbols shortly after its session closes.
+
+Every exchange (NSE, LSE, NYSE) has its next refresh time in a heap, set to
+the session close plus market_calendar.REFRESH_DELAY, so weekends and
+holidays are skipped and each market is refreshed as soon as its daily bar
+is final. When an exchange is due, its stale symbols are queued by priority
+(open trades first, then the longest since their last update) and fetched
+with the bulk downloader. On startup a session whose refresh was missed is
+caught up at once.
+
+Usage: scheduled_update.py [--once] [--concurrent] [--workers=N]
+"""
+import heapq
+import logging
+import sys
 import time
 from datetime import datetime
-from batch_processor import process_all_indices
-import logging
+import market_calendar
+import metadata_store
+import metrics
+import signals_store
+import symbol_registry
+from batch_processor import process_batch, write_run_report
+from concurrent_ingest import MAX_WORKERS
+from config import configure_logging
+
+# Index lists whose symbols are refreshed; each symbol goes with its own
+# exchange's session, whichever list it appears in
+INDICES = symbol_registry.REFRESHED_LISTS
+
+# Longest sleep between checks of the queue, so clock changes are picked up
+MAX_SLEEP = 300  # seconds
+
+
+def exchange_symbols(exchange):
+    """Symbols of every index list that trade on `exchange`, without duplicates"""
+    return symbol_registry.universe(INDICES, exchange=exchange)
+
+
+def refresh_order(symbols):
+    """Symbols in refresh priority: open trades first, then least recently updated"""
+    try:
+        active = {row['symbol'] for row in signals_store.query_signals(active=True)}
+    except Exception as e:
+        logging.error(f"Could not read open trades: {e}")
+        active = set()
+    known = metadata_store.get_symbols(symbols)
+    heap = [(symbol not in active, known.get(symbol, {}).get('last_updated', ''), symbol) for symbol in symbols]
+    heapq.heapify(heap)
+    return [heapq.heappop(heap)[2] for _ in range(len(heap))]
+
+
+def update_job(exchange, concurrent=False, max_workers=MAX_WORKERS):
+    """Refresh the symbols of `exchange` that missed its latest session"""
+    logging.info(f"Starting scheduled update for {exchange}")
+    print(f"Starting scheduled update for {exchange} at {datetime.now()}")
 
-# Setup logging
-logging.basicConfig(
-    filename="/Users/DSJP/Desktop/CODE/BT/python/logs/scheduled_updates.log",
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-def update_job():
-    """Daily update job"""
-    logging.info("Starting scheduled update")
-    print(f"Starting scheduled update at {datetime.now()}")
-    
     try:
-        # Set force_update to True to force update all stocks
-        results = process_all_indices(force_update=True)
-        logging.info(f"Update completed: {results}")
+        symbols = exchange_symbols(exchange)
+        stale = metadata_store.symbols_needing_update(symbols)
+        if not stale:
+            logging.info(f"{exchange}: all {len(symbols)} symbols have the latest session")
+            print(f"{exchange}: all {len(symbols)} symbols are up-to-date")
+            return None
+        ordered = refresh_order(stale)
+        print(f"{exchange}: {len(ordered)} of {len(symbols)} symbols need the latest session")
+        result = process_batch(exchange, force_update=True, concurrent=concurrent, max_workers=max_workers,
+                               bulk=not concurrent, stocks=ordered)
+        result["total"] += len(symbols) - len(ordered)
+        result["success"] += len(symbols) - len(ordered)
+        logging.info(f"Update of {exchange} completed: {result}")
+        return result
     except Exception as e:
-        logging.error(f"Error in scheduled update: {e}")
-        
-    print(f"Update completed at {datetime.now()}")
+        logging.error(f"Error in scheduled update of {exchange}: {e}")
+        return None
+    finally:
+        print(f"Update of {exchange} completed at {datetime.now()}")
+
+
+def run(once=False, concurrent=False, max_workers=MAX_WORKERS):
+    """Refresh every exchange after each of its sessions; with once=True only catch up"""
+    now = datetime.now().astimezone()
+    # Start from each exchange's latest refresh time: stale symbols are caught up now
+    queue = [(market_calendar.last_refresh_due(exchange, now), exchange) for exchange in market_calendar.EXCHANGES]
+    heapq.heapify(queue)
+
+    while queue:
+        due, exchange = queue[0]
+        wait = (due - datetime.now().astimezone()).total_seconds()
+        if wait > 0:
+            if once:
+                break
+            time.sleep(min(wait, MAX_SLEEP))
+            continue
+
+        heapq.heappop(queue)
+        metrics.reset()
+        result = update_job(exchange, concurrent, max_workers)
+        if result is not None:
+            write_run_report({exchange: result})
+
+        next_due = market_calendar.next_refresh_due(exchange)
+        heapq.heappush(queue, (next_due, exchange))
+        logging.info(f"Next {exchange} refresh at {next_due.isoformat()}")
+        print(f"Next {exchange} refresh at {next_due:%Y-%m-%d %H:%M %Z}")
 
-# Schedule the job to run daily at 6:00 AM
-schedule.every().day.at("06:00").do(update_job)
 
 if __name__ == "__main__":
+    configure_logging("scheduled_updates.log")
+    args = sys.argv[1:]
+    max_workers = MAX_WORKERS
+    for arg in args:
+        if arg.startswith("--workers="):
+            max_workers = int(arg.split("=", 1)[1])
+
     print("Starting scheduled update service")
     logging.info("Scheduled update service started")
-    
-    # Run once at startup
-    update_job()
-    
-    # Keep running to execute scheduled jobs
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
\ No newline at end of file
+    run(once="--once" in args, concurrent="--concurrent" in args, max_workers=max_workers)
@@ -0,0 +1,406 @@
+"""Latest DTI signal of every symbol, kept in SQLite for instant screening.
+
+One row per symbol in the `signals` table of DATA/metadata.db: last close,
+last and previous DTI, current and previous 7-day DTI, and the strategy's
+active trade (entry, days in trade, P/L) under DEFAULT_PARAMS. The row is
+rewritten after each refresh of the symbol, so screening the universe is
+one query instead of downloading and backtesting every symbol in the
+browser. An ingest only replays its new bars: the DTI values come from
+indicator_state's stored series and the strategy resumes from a checkpoint
+next to it (the trade open before the latest bar, which the next download
+may revise). export_json() writes the table to DATA/signals.json for the
+frontend and for /api/signals in backend/server.js.
+
+    query_signals(signal='crossAbove', threshold=0, positive_7day=True, region='US')
+"""
+import json
+import logging
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import indicators
+import indicator_state
+import metadata_store
+import symbol_registry
+from backtest import DEFAULT_PARAMS, backtest_with_active_detection, format_date, parse_date, warmup_end
+from config import DATA_DIR
+from price_store import read_csv_columns
+
+SIGNALS_FILE = os.path.join(DATA_DIR, "signals.json")
+
+# Screens understood by query_signals and /api/signals
+SIGNAL_TYPES = ('entry', 'crossAbove')
+
+COLUMNS = ['symbol', 'index_folder', 'region', 'indices', 'params', 'last_date', 'last_close',
+           'dti', 'prev_dti', 'dti_7day', 'prev_dti_7day', 'active', 'entry_date', 'entry_price',
+           'days_in_trade', 'pl_percent', 'updated_at']
+
+# Row keys as served to the browser
+JSON_KEYS = {
+    'symbol': 'symbol', 'index_folder': 'indexFolder', 'region': 'region', 'indices': 'indices',
+    'params': 'params', 'last_date': 'lastDate', 'last_close': 'lastClose', 'dti': 'dti',
+    'prev_dti': 'prevDti', 'dti_7day': 'dti7Day', 'prev_dti_7day': 'prevDti7Day', 'active': 'active',
+    'entry_date': 'entryDate', 'entry_price': 'entryPrice', 'days_in_trade': 'daysInTrade',
+    'pl_percent': 'plPercent', 'updated_at': 'updatedAt',
+}
+
+_initialized = set()
+
+
+def get_connection(db_file=metadata_store.DB_FILE):
+    """metadata_store's connection with the signals table created"""
+    conn = metadata_store.get_connection(db_file)
+    if db_file not in _initialized:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS signals (
+                symbol TEXT PRIMARY KEY,
+                index_folder TEXT NOT NULL,
+                region TEXT,
+                indices TEXT NOT NULL,
+                params TEXT NOT NULL,
+                last_date TEXT NOT NULL,
+                last_close REAL,
+                dti REAL,
+                prev_dti REAL,
+                dti_7day REAL,
+                prev_dti_7day REAL,
+                active INTEGER NOT NULL,
+                entry_date TEXT,
+                entry_price REAL,
+                days_in_trade INTEGER,
+                pl_percent REAL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS signals_dti ON signals (dti)")
+        _initialized.add(db_file)
+    return conn
+
+
+def _value(x):
+    x = float(x)
+    return None if np.isnan(x) else x
+
+
+def checkpoint_path(symbol, index_folder, params, data_dir=DATA_DIR):
+    """Strategy checkpoint of a symbol, next to its stored DTI series for (r, s, u)"""
+    _, series_file = indicator_state.state_paths(symbol, index_folder, params, data_dir)
+    return series_file[:-len('.csv')] + '.signal.json'
+
+
+def _run(dates, closes, dti, daily_7day, previous_7day, p, trade, earliest):
+    seven_day = {'daily_7day_dti': daily_7day, 'previous_7day_dti': previous_7day}
+    return backtest_with_active_detection(dates, closes, dti, seven_day, p, trade, earliest)['activeTrade']
+
+
+def _replay(dates, closes, dti, daily_7day, previous_7day, p, split, trade=None, earliest=None):
+    """Run the strategy over the bars after dates[0], starting from `trade`.
+
+    Returns (trade open after bar `split`, trade open after the last bar).
+    """
+    if earliest is None:
+        earliest = warmup_end(dates[0])
+    end = split + 1
+    checkpoint = _run(dates[:end], closes[:end], dti[:end], daily_7day[:end], previous_7day[:end],
+                      p, trade, earliest)
+    last = _run(dates[split:], closes[split:], dti[split:], daily_7day[split:], previous_7day[split:],
+                p, checkpoint, earliest)
+    return checkpoint, last
+
+
+def _epoch(text):
+    """price_store.parse_dates of one date, without the pandas overhead"""
+    return parse_date(str(text)[:19])
+
+
+def _dti_checkpoint(symbol, index_folder, p, dates, data_dir=DATA_DIR):
+    """(position in `dates`, series offset) of the symbol's DTI checkpoint bar, or None.
+
+    Bars up to that one lie in complete 7-bar periods, so their 7-day DTI
+    no longer changes and the strategy can be checkpointed there too.
+    """
+    state = indicator_state.load_state(symbol, index_folder, (p['r'], p['s'], p['u']), data_dir)
+    if state is None or state['date'] is None:
+        return None
+    found = np.flatnonzero(np.asarray(dates) == _epoch(state['date']))
+    return (int(found[0]), state['offset']) if len(found) else None
+
+
+def _save_checkpoint(symbol, index_folder, p, earliest, dates, closes, dti, split, offset, trade,
+                     data_dir=DATA_DIR):
+    path = checkpoint_path(symbol, index_folder, (p['r'], p['s'], p['u']), data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'params': p,
+            'earliest': int(earliest),
+            'date': int(dates[split]),
+            'dti': float(dti[split]),
+            'offset': offset,  # series rows after the checkpoint bar start here
+            'trade': trade,
+            # [date, close] of the bars after the checkpoint
+            'pending': [[int(date), float(close)] for date, close in zip(dates[split + 1:], closes[split + 1:])],
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def compute_signal(symbol, index_folder, params=None, data_dir=DATA_DIR):
+    """Signal row of a symbol from its CSV, or None if it has fewer than two bars.
+
+    Also stores the strategy checkpoint that resume_signal continues from.
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    columns = read_csv_columns(os.path.join(data_dir, index_folder, f"{symbol}.csv"))
+    if len(columns['date']) < 2:
+        return None
+
+    dti = indicators.dti(columns['high'], columns['low'], p['r'], p['s'], p['u'])
+    seven_day = indicators.seven_day_dti(columns['high'], columns['low'], p['r'], p['s'], p['u'])
+    earliest = warmup_end(columns['date'][0])
+    found = _dti_checkpoint(symbol, index_folder, p, columns['date'], data_dir)
+    if found is None:
+        trade = _run(columns['date'], columns['close'], dti, seven_day['daily_7day_dti'],
+                     seven_day['previous_7day_dti'], p, None, earliest)
+        # A checkpoint of the old history must not be resumed
+        try:
+            os.remove(checkpoint_path(symbol, index_folder, (p['r'], p['s'], p['u']), data_dir))
+        except FileNotFoundError:
+            pass
+    else:
+        split, offset = found
+        checkpoint, trade = _replay(columns['date'], columns['close'], dti, seven_day['daily_7day_dti'],
+                                    seven_day['previous_7day_dti'], p, split, earliest=earliest)
+        _save_checkpoint(symbol, index_folder, p, earliest, columns['date'], columns['close'], dti, split,
+                         offset, checkpoint, data_dir)
+    return signal_row(symbol, index_folder, p, columns['date'][-1], columns['close'][-1], dti,
+                      seven_day['daily_7day_dti'], seven_day['previous_7day_dti'], trade)
+
+
+def resume_signal(symbol, index_folder, data, since, params=None, data_dir=DATA_DIR):
+    """Signal row after the bars of `data` from `since` on were merged into the CSV.
+
+    Replays only the bars after the checkpoint, with their DTI values read
+    from the end of the stored series. None when the checkpoint or series do
+    not line up with those bars (compute_signal then rereads the whole CSV).
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    try:
+        with open(checkpoint_path(symbol, index_folder, (p['r'], p['s'], p['u']), data_dir)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('params') != p:
+        return None
+
+    rows = data[data['date'] >= pd.Timestamp(since)]
+    if rows.empty or rows[['high', 'low', 'close']].isna().any().any():
+        return None
+    start = _epoch(since)
+    pending = [bar for bar in state['pending'] if bar[0] < start]
+    dates = [state['date']] + [date for date, _ in pending] + [_epoch(date) for date in rows['date']]
+    closes = [np.nan] + [close for _, close in pending] + rows['close'].tolist()
+
+    # The stored series must hold exactly these bars after the checkpoint
+    series = indicator_state.read_series(symbol, index_folder, (p['r'], p['s'], p['u']), data_dir,
+                                         offset=state['offset'])
+    if series is None or [_epoch(date) for date in series['date']] != dates[1:]:
+        return None
+    found = _dti_checkpoint(symbol, index_folder, p, dates, data_dir)
+    if found is None:
+        return None
+
+    split, offset = found
+    dti = [state['dti']] + series['dti'].tolist()
+    daily_7day = [np.nan] + series['daily_7day_dti'].tolist()
+    previous_7day = [np.nan] + series['previous_7day_dti'].tolist()
+    checkpoint, trade = _replay(dates, closes, dti, daily_7day, previous_7day, p, split,
+                                state['trade'], state['earliest'])
+    _save_checkpoint(symbol, index_folder, p, state['earliest'], dates, closes, dti, split, offset,
+                     checkpoint, data_dir)
+    return signal_row(symbol, index_folder, p, dates[-1], closes[-1], dti, daily_7day, previous_7day, trade)
+
+
+def signal_row(symbol, index_folder, p, last_date, last_close, dti, daily_7day, previous_7day, trade):
+    """Table row from the last bar's values and the open trade"""
+    info = symbol_registry.symbol_info(symbol)
+    indices = info['indices']
+    region = symbol_registry.EXCHANGE_REGIONS[info['exchange']]
+    return {
+        'symbol': symbol,
+        'index_folder': index_folder,
+        'region': region,
+        # Delimited on both ends so one LIKE finds a list id
+        'indices': ',' + ','.join(indices) + ',',
+        'params': f"{p['r']}-{p['s']}-{p['u']}",
+        'last_date': format_date(last_date),
+        'last_close': _value(last_close),
+        'dti': _value(dti[-1]),
+        'prev_dti': _value(dti[-2]),
+        'dti_7day': _value(daily_7day[-1]),
+        'prev_dti_7day': _value(previous_7day[-1]),
+        'active': int(trade is not None),
+        'entry_date': trade['entryDate'] if trade else None,
+        'entry_price': trade['entryPrice'] if trade else None,
+        'days_in_trade': trade['holdingDays'] if trade else None,
+        'pl_percent': trade['currentPlPercent'] if trade else None,
+        'updated_at': datetime.now().isoformat(),
+    }
+
+
+def set_signals(rows, db_file=metadata_store.DB_FILE):
+    """Upsert many signal rows in one transaction"""
+    conn = get_connection(db_file)
+    placeholders = ",".join("?" * len(COLUMNS))
+    updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:])
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            f"INSERT INTO signals ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(symbol) DO UPDATE SET {updates}",
+            [tuple(row[column] for column in COLUMNS) for row in rows]
+        )
+
+
+def update_signal(symbol, index_folder, data=None, since=None, params=None, data_dir=DATA_DIR,
+                  db_file=metadata_store.DB_FILE):
+    """Refresh and store one symbol's signal after its CSV changed.
+
+    `data` and `since` are as for indicator_state.update_indicators: with
+    them only the merged bars are replayed (resume_signal), without them the
+    whole CSV is recomputed.
+    """
+    try:
+        row = None
+        if since is not None and data is not None:
+            row = resume_signal(symbol, index_folder, data, since, params, data_dir)
+        if row is None:
+            row = compute_signal(symbol, index_folder, params, data_dir)
+        if row:
+            set_signals([row], db_file)
+        return row
+    except Exception as e:
+        logging.error(f"Error updating signal for {symbol}: {e}")
+        return None
+
+
+def rebuild_signals(index_folders, params=None, data_dir=DATA_DIR, db_file=metadata_store.DB_FILE):
+    """Recompute the signal of every symbol CSV in the given index folders"""
+    rows = []
+    for index_folder in index_folders:
+        folder = os.path.join(data_dir, index_folder)
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith('.csv'):
+                continue
+            try:
+                row = compute_signal(name[:-4], index_folder, params, data_dir)
+            except Exception as e:
+                logging.error(f"Error computing signal for {name[:-4]}: {e}")
+                continue
+            if row:
+                rows.append(row)
+    set_signals(rows, db_file)
+    return len(rows)
+
+
+def query_signals(signal=None, threshold=DEFAULT_PARAMS['entryThreshold'], index=None, region=None,
+                  active=None, positive_7day=False, db_file=metadata_store.DB_FILE):
+    """Screen the universe; returns matching rows ordered by DTI.
+
+    signal='entry' matches the strategy's entry rule (DTI below the
+    threshold and rising, 7-day DTI rising); 'crossAbove' matches DTI
+    crossing the threshold from below on the last bar. `index` is a DATA
+    folder or a stock list id from the registry.
+    """
+    where, args = [], []
+    if signal == 'entry':
+        where.append("dti < ? AND dti > prev_dti AND (prev_dti_7day IS NULL OR dti_7day > prev_dti_7day)")
+        args.append(threshold)
+    elif signal == 'crossAbove':
+        where.append("prev_dti < ? AND dti >= ?")
+        args.extend([threshold, threshold])
+    elif signal is not None:
+        raise ValueError(f"Unknown signal '{signal}' (expected one of {', '.join(SIGNAL_TYPES)})")
+    if index:
+        where.append("(index_folder = ? OR indices LIKE ?)")
+        args.extend([index, f"%,{index},%"])
+    if region:
+        where.append("region = ?")
+        args.append(region)
+    if active is not None:
+        where.append("active = ?")
+        args.append(int(active))
+    if positive_7day:
+        where.append("dti_7day > 0")
+
+    sql = f"SELECT {', '.join(COLUMNS)} FROM signals"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    conn = get_connection(db_file)
+    return [dict(zip(COLUMNS, row)) for row in conn.execute(sql + " ORDER BY dti", args)]
+
+
+# Columns left out of signals.json to keep it small; prices and P/L are
+# rounded, DTI values are not so the server's screens match query_signals
+EXPORT_SKIP = {'params', 'updated_at'}
+EXPORT_ROUNDED = {'last_close', 'entry_price', 'pl_percent'}
+EXPORT_DIGITS = 4
+
+
+def to_json_row(row):
+    """Signal row with browser-facing keys, rounded values and index ids as a list"""
+    out = {}
+    for column, value in row.items():
+        if column in EXPORT_SKIP or value is None:
+            continue
+        out[JSON_KEYS[column]] = round(value, EXPORT_DIGITS) if column in EXPORT_ROUNDED else value
+    out['indices'] = [i for i in row['indices'].split(',') if i]
+    out['active'] = bool(row['active'])
+    return out
+
+
+def export_json(json_path=SIGNALS_FILE, db_file=metadata_store.DB_FILE):
+    """Atomically write every signal row to signals.json"""
+    rows = query_signals(db_file=db_file)
+    params = sorted({row['params'] for row in rows})
+    rows = [to_json_row(row) for row in rows]
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'generatedAt': datetime.now().isoformat(), 'params': params, 'count': len(rows),
+                   'signals': rows}, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, json_path)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Build or query the latest-signals table')
+    parser.add_argument('--rebuild', nargs='+', metavar='FOLDER', help='Recompute signals of these DATA folders')
+    parser.add_argument('--signal', choices=SIGNAL_TYPES, help='Screen to apply')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_PARAMS['entryThreshold'])
+    parser.add_argument('--index', help='DATA folder or stock list id')
+    parser.add_argument('--region', help='US, UK or India')
+    parser.add_argument('--active', action='store_true', help='Only symbols in an active trade')
+    parser.add_argument('--positive-7day', action='store_true', help='Only symbols with 7-day DTI above 0')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        start = time.perf_counter()
+        count = rebuild_signals(args.rebuild)
+        export_json()
+        print(f"✓ Stored signals of {count} symbols in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    rows = query_signals(args.signal, args.threshold, args.index, args.region,
+                         True if args.active else None, args.positive_7day)
+    elapsed = (time.perf_counter() - start) * 1000
+    for row in rows:
+        trade = f"in trade {row['days_in_trade']}d ({row['pl_percent']:+.1f}%)" if row['active'] else ""
+        print(f"{row['symbol']:<14} {row['last_date']}  close {row['last_close']:>10.2f}  "
+              f"DTI {row['prev_dti']:7.2f} -> {row['dti']:7.2f}  7d {row['dti_7day'] or 0:7.2f}  {trade}")
+    print(f"{len(rows)} symbols matched in {elapsed:.1f} ms")
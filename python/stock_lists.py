@@ -1,40 +1,15 @@
-import json
-import os
-
-# Base path to stock lists
-BASE_PATH = "/Users/DSJP/Desktop/CODE/BT"
-
-# Add logging
 import logging
-import sys
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/Users/DSJP/Desktop/CODE/BT/python/logs/stock_update.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+import symbol_registry
 
 def get_stock_list(index_name):
     """Get a list of stock symbols for a given index"""
     try:
-        # Try to load from JSON file first (compatible with JS implementation)
-        json_path = os.path.join(BASE_PATH, "js", "stock-lists", f"{index_name}.json")
-        
-        logging.info(f"Looking for stock list at: {json_path}")
-        
-        if os.path.exists(json_path):
-            logging.info(f"Found {index_name}.json file")
-            with open(json_path, 'r') as f:
-                stock_data = json.load(f)
-                symbols = [stock['symbol'] for stock in stock_data]
-                logging.info(f"Loaded {len(symbols)} symbols from {index_name}.json")
-                return symbols
-        else:
-            logging.error(f"File not found: {json_path}")
+        # Symbol registry compiled from js/stock-lists (read once per process)
+        symbols = symbol_registry.index_symbols(index_name)
+        if symbols:
+            logging.info(f"Loaded {len(symbols)} symbols for {index_name} from the symbol registry")
+            return symbols
+        logging.error(f"No stock list named {index_name} in the symbol registry")
         
         # Fallback to hardcoded lists if JSON not available
         stock_lists = {
@@ -0,0 +1,207 @@
+"""One indexed view of js/stock-lists: symbol -> exchange, currency, data folder, indices.
+
+registry.json and the list files are compiled once into
+js/stock-lists/registry.compiled.json (rebuilt when any source file is
+newer) and loaded once per process, so every lookup is a dict access:
+
+    symbol_info('BARC.L')    # {'name', 'exchange': 'LSE', 'currency': 'GBp', 'folder': 'ftse100', 'indices': [...]}
+    index_folder('BARC.L')   # 'ftse100'
+    index_symbols('ftse250') # de-duplicated, in list order
+    universe(exchange='NSE')
+
+The exchange and currency come from the Yahoo suffix. The data folder (DATA/
+<folder> and the Firestore collection) is that of the first list, in
+registry order, whose region is the symbol's exchange, so FTSE 250 and
+Nifty Midcap symbols get their own folders; a symbol no such list holds
+stays in its exchange's folder. The backend imports this module (see
+backend/shared.py) and backend/server.js reads the same compiled file.
+"""
+import json
+import logging
+import os
+from functools import lru_cache
+from config import STOCK_LISTS_DIR
+
+COMPILED_FILENAME = "registry.compiled.json"
+COMPILED_VERSION = 1
+
+# Yahoo symbol suffix -> exchange; symbols without a listed suffix trade in the US
+SUFFIX_EXCHANGES = {'.NS': 'NSE', '.L': 'LSE'}
+DEFAULT_EXCHANGE = 'NYSE'
+
+EXCHANGE_CURRENCIES = {'NSE': 'INR', 'LSE': 'GBp', 'NYSE': 'USD'}
+EXCHANGE_REGIONS = {'NSE': 'India', 'LSE': 'UK', 'NYSE': 'US'}
+
+# Folder of symbols that no list of their exchange's region holds
+EXCHANGE_FOLDERS = {'NSE': 'nifty50', 'LSE': 'ftse100', 'NYSE': 'us_stocks'}
+
+# Lists refreshed by batch and scheduled runs
+REFRESHED_LISTS = ["nifty50", "niftyNext50", "niftyMidcap150", "ftse100", "ftse250", "usStocks"]
+
+# Lists whose symbols share a folder other than the list id
+LIST_FOLDERS = {'usStocks': 'us_stocks', 'usMidCap': 'us_stocks', 'usSmallCap': 'us_stocks'}
+
+
+def suffix_exchange(symbol):
+    for suffix, exchange in SUFFIX_EXCHANGES.items():
+        if symbol.endswith(suffix):
+            return exchange
+    return DEFAULT_EXCHANGE
+
+
+def _source_files(lists_dir):
+    with open(os.path.join(lists_dir, "registry.json"), 'r') as f:
+        registry = json.load(f)
+    return registry, [os.path.join(lists_dir, "registry.json")] + [
+        os.path.join(lists_dir, entry['file']) for entry in registry['lists']]
+
+
+def compile_registry(lists_dir=STOCK_LISTS_DIR):
+    """Build the compiled registry from registry.json and the list files"""
+    registry, sources = _source_files(lists_dir)
+    indices, symbols = {}, {}
+    placed = set()  # symbols whose folder came from a list of their own region
+    for entry in registry['lists']:
+        with open(os.path.join(lists_dir, entry['file']), 'r') as f:
+            stocks = json.load(f)
+        members = list(dict.fromkeys(stock['symbol'] for stock in stocks))
+        indices[entry['id']] = {
+            'name': entry['name'],
+            'region': entry.get('region'),
+            'folder': LIST_FOLDERS.get(entry['id'], entry['id']),
+            'symbols': members,
+        }
+        for stock in stocks:
+            symbol = stock['symbol']
+            if symbol not in symbols:
+                exchange = suffix_exchange(symbol)
+                symbols[symbol] = {'name': stock.get('name', symbol), 'exchange': exchange,
+                                   'currency': EXCHANGE_CURRENCIES[exchange],
+                                   'folder': EXCHANGE_FOLDERS[exchange], 'indices': []}
+            info = symbols[symbol]
+            if entry['id'] not in info['indices']:
+                info['indices'].append(entry['id'])
+            if symbol not in placed and entry.get('region') == EXCHANGE_REGIONS[info['exchange']]:
+                info['folder'] = indices[entry['id']]['folder']
+                placed.add(symbol)
+    folders = {}
+    for symbol, info in symbols.items():
+        folders.setdefault(info['folder'], []).append(symbol)
+    return {
+        'version': COMPILED_VERSION,
+        'sources': {os.path.basename(path): os.stat(path).st_mtime_ns for path in sources},
+        'indices': indices,
+        'folders': folders,
+        'symbols': symbols,
+    }
+
+
+def _is_current(compiled, lists_dir):
+    if compiled.get('version') != COMPILED_VERSION:
+        return False
+    try:
+        _, sources = _source_files(lists_dir)
+        return all(compiled['sources'].get(os.path.basename(path)) == os.stat(path).st_mtime_ns
+                   for path in sources)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def load_registry(lists_dir=STOCK_LISTS_DIR):
+    """The compiled registry, recompiled and rewritten if a source file changed"""
+    compiled_path = os.path.join(lists_dir, COMPILED_FILENAME)
+    try:
+        with open(compiled_path, 'r') as f:
+            compiled = json.load(f)
+        if _is_current(compiled, lists_dir):
+            return compiled
+    except (OSError, ValueError):
+        pass
+
+    try:
+        compiled = compile_registry(lists_dir)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Could not read stock lists from {lists_dir}: {e}")
+        return {'version': COMPILED_VERSION, 'sources': {}, 'indices': {}, 'folders': {}, 'symbols': {}}
+    try:
+        tmp_path = compiled_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(compiled, f, separators=(',', ':'))
+        os.replace(tmp_path, compiled_path)
+    except OSError as e:
+        logging.warning(f"Could not write {compiled_path}: {e}")
+    return compiled
+
+
+def reload():
+    """Drop the cached registry so the next lookup re-reads it"""
+    load_registry.cache_clear()
+
+
+def symbol_info(symbol):
+    """Metadata of a symbol; symbols in no list get their exchange's defaults"""
+    info = load_registry()['symbols'].get(symbol)
+    if info is None:
+        exchange = suffix_exchange(symbol)
+        info = {'name': symbol, 'exchange': exchange, 'currency': EXCHANGE_CURRENCIES[exchange],
+                'folder': EXCHANGE_FOLDERS[exchange], 'indices': []}
+    return info
+
+
+def index_folder(symbol):
+    """DATA folder (and Firestore collection) of a symbol"""
+    return symbol_info(symbol)['folder']
+
+
+def exchange(symbol):
+    return symbol_info(symbol)['exchange']
+
+
+def currency(symbol):
+    return symbol_info(symbol)['currency']
+
+
+def indices_of(symbol):
+    """Ids of the lists that hold a symbol"""
+    return symbol_info(symbol)['indices']
+
+
+def index_info(index_id):
+    """{'name', 'region', 'folder', 'symbols'} of a list, or None"""
+    return load_registry()['indices'].get(index_id)
+
+
+def index_symbols(name):
+    """Symbols of a list id, or of every symbol stored in a data folder"""
+    registry = load_registry()
+    if name in registry['indices']:
+        return list(registry['indices'][name]['symbols'])
+    return list(registry['folders'].get(name, []))
+
+
+def universe(index_ids=None, exchange=None):
+    """De-duplicated symbols of the given lists (default: all), optionally of one exchange"""
+    registry = load_registry()
+    symbols = {}
+    for index_id in index_ids or registry['indices']:
+        for symbol in registry['indices'].get(index_id, {}).get('symbols', []):
+            symbols[symbol] = True
+    if exchange:
+        return [symbol for symbol in symbols if registry['symbols'][symbol]['exchange'] == exchange]
+    return list(symbols)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    start = time.perf_counter()
+    reload()
+    registry = load_registry()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(registry['symbols'])} symbols in {len(registry['indices'])} lists, loaded in {elapsed:.1f} ms")
+    for index_id, entry in registry['indices'].items():
+        print(f"  {index_id:<16} {entry['region'] or '':<7} {len(entry['symbols']):>5} symbols  folder {entry['folder']}")
+    for symbol in sys.argv[1:]:
+        print(f"{symbol}: {symbol_info(symbol)}")